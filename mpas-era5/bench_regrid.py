@@ -0,0 +1,54 @@
+import argparse
+import time
+import numpy as np
+import xarray as xr
+from src.regridder import Regridder
+
+def column_span(weights):
+    """Mean distance between the smallest and largest source column of each row."""
+    indptr = weights.indptr
+    nonempty = np.diff(indptr) > 0
+    starts = indptr[:-1][nonempty]
+    ends = indptr[1:][nonempty] - 1
+    cols = weights.indices
+    # Indices are sorted within rows, so first/last entries give the span
+    return float(np.mean(cols[ends] - cols[starts]))
+
+def time_regrid(regridder, field, repeat):
+    regridder.regrid(field)  # warm-up
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = regridder.regrid(field)
+        times.append(time.perf_counter() - start)
+    return min(times), out.values
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark regridding with and without cell reordering")
+    parser.add_argument("map_file", help="Path to regridding mapping NetCDF file")
+    parser.add_argument("--samples", type=int, default=9, help="Number of 2-D fields regridded per call (e.g. forecast steps)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed repetitions per configuration")
+    parser.add_argument("--weights_cache", help="Directory to cache the prepared weights")
+    args = parser.parse_args()
+
+    results = {}
+    for reorder in [None, 'hilbert', 'morton']:
+        start = time.perf_counter()
+        regridder = Regridder(args.map_file, reorder=reorder, cache_dir=args.weights_cache)
+        setup = time.perf_counter() - start
+
+        n_cells = regridder.weights.shape[1]
+        rng = np.random.default_rng(0)
+        field = xr.DataArray(rng.random((args.samples, n_cells)), dims=('Time', 'nCells'))
+
+        best, values = time_regrid(regridder, field, args.repeat)
+        results[reorder] = values
+        print(f"{str(reorder):>8}: setup {setup:7.2f}s, regrid {best:7.3f}s "
+              f"({args.samples} fields), mean column span {column_span(regridder.weights):12.1f}")
+
+    for reorder in ['hilbert', 'morton']:
+        diff = np.nanmax(np.abs(results[reorder] - results[None]))
+        print(f"Max abs difference {reorder} vs original: {diff:.3e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import argparse
+import sys
+import itertools
+import numpy as np
+import xarray as xr
+from concurrent.futures import ThreadPoolExecutor
+
+# Dimensions kept whole in every block; blocks follow the store chunks along the others
+SPATIAL_DIMS = ('latitude', 'longitude')
+
+def open_store(path):
+    """Opens a Zarr store or NetCDF file lazily."""
+    if str(path).endswith('.nc'):
+        return xr.open_dataset(path, chunks={})
+    return xr.open_zarr(path, consolidated=False)
+
+def _compare_block(ref, new, atol, rtol):
+    """Error statistics of one block; NaN positions are compared, not differenced."""
+    ref = np.asarray(ref, dtype=np.float64)
+    new = np.asarray(new, dtype=np.float64)
+    ref_nan = np.isnan(ref)
+    new_nan = np.isnan(new)
+    valid = ~(ref_nan | new_nan)
+
+    diff = np.abs(new[valid] - ref[valid])
+    mag = np.abs(ref[valid])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rel = np.where(mag > 0, diff / mag, np.where(diff > 0, np.inf, 0.0))
+
+    return {
+        'count': int(diff.size),
+        'sum_sq': float(np.sum(diff ** 2)),
+        'max_abs': float(diff.max(initial=0.0)),
+        'max_rel': float(rel.max(initial=0.0)),
+        'nan_mismatch': int(np.count_nonzero(ref_nan != new_nan)),
+        'exceeding': int(np.count_nonzero(diff > atol + rtol * mag)),
+    }
+
+def _blocks(da, block_size=None):
+    """
+    Selections covering a variable block by block.
+
+    Blocks follow the store's chunk grid along the non-spatial dimensions
+    (time, forecast, level), so each chunk is read once; `block_size`
+    overrides the entries per block along those dimensions. Unchunked
+    (contiguous NetCDF) variables are split into single entries.
+    """
+    chunks = {} if da.encoding.get('contiguous') else dict(da.chunksizes)
+    axes = []
+    for dim in da.dims:
+        if dim in SPATIAL_DIMS:
+            continue
+        size = da.sizes[dim]
+        if block_size is not None:
+            steps = [block_size] * -(-size // block_size)
+        else:
+            steps = chunks.get(dim) or [1] * size
+        bounds = np.concatenate([[0], np.cumsum(steps)])
+        axes.append([(dim, slice(int(a), int(b))) for a, b in zip(bounds[:-1], bounds[1:])])
+    return [dict(selection) for selection in itertools.product(*axes)]
+
+def _merge(total, part):
+    total['count'] += part['count']
+    total['sum_sq'] += part['sum_sq']
+    total['max_abs'] = max(total['max_abs'], part['max_abs'])
+    total['max_rel'] = max(total['max_rel'], part['max_rel'])
+    total['nan_mismatch'] += part['nan_mismatch']
+    total['exceeding'] += part['exceeding']
+
+def compare_stores(ref_path, new_path, variables=None, atol=0.0, rtol=0.0, workers=4, block_size=None):
+    """
+    Compares two converted stores block by block in bounded memory.
+
+    Variables are walked along the reference store's chunk grid over their
+    non-spatial dimensions (see _blocks); blocks are read and compared in a
+    thread pool so at most `workers` blocks of each store are in memory at once.
+
+    Returns:
+        dict: variable -> statistics (max_abs, max_rel, rmse, nan_mismatch,
+              exceeding, passed) or {'error': ...} for structural mismatches.
+    """
+    ref_ds = open_store(ref_path)
+    new_ds = open_store(new_path)
+    if variables is None:
+        variables = sorted(set(ref_ds.data_vars) | set(new_ds.data_vars))
+
+    results = {}
+    tasks = []
+    for name in variables:
+        if name not in ref_ds or name not in new_ds:
+            results[name] = {'error': 'missing in ' + ('reference' if name not in ref_ds else 'new')}
+            continue
+        ref_da, new_da = ref_ds[name], new_ds[name]
+        if ref_da.dims != new_da.dims or ref_da.shape != new_da.shape:
+            results[name] = {'error': f"shape mismatch {dict(ref_da.sizes)} vs {dict(new_da.sizes)}"}
+            continue
+        results[name] = {
+            'count': 0, 'sum_sq': 0.0, 'max_abs': 0.0, 'max_rel': 0.0,
+            'nan_mismatch': 0, 'exceeding': 0,
+        }
+        for sel in _blocks(ref_da, block_size):
+            tasks.append((name, ref_da.isel(sel), new_da.isel(sel)))
+
+    def run(task):
+        name, ref_block, new_block = task
+        return name, _compare_block(ref_block.values, new_block.values, atol, rtol)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for name, part in pool.map(run, tasks):
+            _merge(results[name], part)
+
+    for stats in results.values():
+        if 'error' in stats:
+            continue
+        stats['rmse'] = float(np.sqrt(stats.pop('sum_sq') / max(stats['count'], 1)))
+        stats['passed'] = stats['exceeding'] == 0 and stats['nan_mismatch'] == 0
+
+    ref_ds.close()
+    new_ds.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two converted Zarr/NetCDF outputs chunk by chunk")
+    parser.add_argument("reference", help="Reference store (e.g. ncremap product or previous run)")
+    parser.add_argument("new", help="Store to validate")
+    parser.add_argument("--variables", help="Comma-separated variables to compare (default: all)")
+    parser.add_argument("--atol", type=float, default=0.0, help="Absolute tolerance")
+    parser.add_argument("--rtol", type=float, default=0.0, help="Relative tolerance")
+    parser.add_argument("--workers", type=int, default=4, help="Blocks compared in parallel")
+    parser.add_argument("--block_size", type=int, help="Entries per block along time/forecast/level (default: the store chunks)")
+    args = parser.parse_args()
+
+    variables = args.variables.split(',') if args.variables else None
+    results = compare_stores(args.reference, args.new, variables, args.atol, args.rtol, args.workers, args.block_size)
+
+    failed = False
+    for name, s in results.items():
+        if 'error' in s:
+            print(f"{name:>8}: ERROR {s['error']}")
+            failed = True
+            continue
+        status = 'OK' if s['passed'] else 'FAIL'
+        failed = failed or not s['passed']
+        print(f"{name:>8}: {status:4} max_abs {s['max_abs']:.3e} max_rel {s['max_rel']:.3e} "
+              f"rmse {s['rmse']:.3e} nan_mismatch {s['nan_mismatch']} exceeding {s['exceeding']}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
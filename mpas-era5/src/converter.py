@@ -2,12 +2,52 @@ import xarray as xr
 import numpy as np
 import pandas as pd
 import os
+import json
 from .loader import load_mpas_dataset
 from .regridder import Regridder
+from .encoding import encode_dataset
+from .qa import quality_summary
+from .vertical import (
+    NATIVE_VARIABLES, native_pressure, native_pressure_variables, interp_to_pressure,
+    theta_to_temperature, mixing_ratio_to_specific_humidity,
+)
 
 # Constants
 G = 9.80665
 
+# Pressure levels (hPa) pre-interpolated by MPAS
+LEVELS = [50, 100, 200, 250, 500, 700, 850, 925]
+
+# ERA5 variable <- MPAS variable, regridded as is
+SURFACE_VARIABLES = [
+    ('SP', 'mslp'),
+    ('t2m', 't2m'),
+    ('U500', 'uzonal_500hPa'),
+    ('V500', 'umeridional_500hPa'),
+    ('T500', 'temperature_500hPa'),
+]
+
+# ERA5 3D variable <- MPAS per-level variable prefix (Q is derived from relhum and temperature)
+LEVEL_VARIABLES = [
+    ('U', 'uzonal'),
+    ('V', 'umeridional'),
+    ('T', 'temperature'),
+    ('Q', 'relhum'),
+]
+
+# MPAS variables read by the conversion
+INPUT_VARIABLES = ['mslp', 't2m'] + [
+    f"{prefix}_{lvl}hPa"
+    for prefix in ('uzonal', 'umeridional', 'temperature', 'relhum', 'height')
+    for lvl in LEVELS
+]
+
+# Dataset attribute marking that nCells is already in the regridder's cell order
+CELL_ORDER_ATTR = 'regrid_cell_order'
+
+# Native-level MPAS variables read when interpolating to arbitrary pressure levels
+NATIVE_INPUT_VARIABLES = [mpas_var for _, mpas_var in NATIVE_VARIABLES] + ['pressure', 'pressure_p', 'pressure_base']
+
 def calculate_specific_humidity(relhum_percent, temp_k, pressure_pa):
     """
     Approximates specific humidity from relative humidity, temperature, and pressure.
@@ -23,124 +63,265 @@ def calculate_specific_humidity(relhum_percent, temp_k, pressure_pa):
     return q
 
 class Converter:
-    def __init__(self, map_file, output_dir):
-        self.regridder = Regridder(map_file)
+    def __init__(self, map_file, output_dir, sketch=None, regridder=None, pressure_levels=None, time_chunk=1,
+                 encoding='none', extrapolate=False):
+        # A pre-configured Regridder (e.g. reordered/cached weights) may be passed in
+        self.regridder = regridder if regridder is not None else Regridder(map_file)
         self.output_dir = output_dir
+        # Optional stats.HistogramSketch updated with every file written
+        self.sketch = sketch
+        # Pressure levels (hPa) to interpolate U/V/T/Q to from native model
+        # levels; None keeps the levels pre-interpolated by MPAS
+        self.pressure_levels = pressure_levels
+        # Forecast steps of native-level fields held in memory at once
+        self.time_chunk = time_chunk
+        # Extrapolate to pressure levels above the model top / below ground
+        # (otherwise NaN there, which the regridding spreads to neighbours)
+        self.extrapolate = extrapolate
+        # Storage encoding: 'none', 'packed' (int16) or 'bitround' (see encoding.py)
+        self.encoding = encoding
         
-    def process_file(self, input_file, output_format='zarr'):
-        ds = load_mpas_dataset(input_file)
+    def read_input(self, input_file):
+        """
+        Reads the MPAS variables used by the conversion fully into memory.
         
-        # We keep all time steps as 'forecast' steps
-        # The 'time' dimension will be the initialization time (first step)
+        This is the I/O-bound stage of the conversion; only the variables
+        listed in INPUT_VARIABLES are loaded so that prefetching a file does
+        not pull the unused fields (vorticity, w, dewpoint, ...) off disk.
+        """
+        ds = load_mpas_dataset(input_file)
+        keep = [v for v in INPUT_VARIABLES if v in ds]
+        loaded = ds[keep].load()
         
-        # ... (rest of logic is same until save) ...
+        if self.regridder.cell_order is not None:
+            # Permute the cells into the weight column order once here, in
+            # the I/O stage, instead of gathering in every regrid call
+            for name, da in loaded.data_vars.items():
+                if 'nCells' in da.dims:
+                    loaded[name] = da.copy(data=self.regridder.to_cell_order(da.values, axis=da.dims.index('nCells')))
+            loaded.attrs[CELL_ORDER_ATTR] = 1
         
-        # Define mappings and derivations
-        # ...
+        if self.pressure_levels is not None:
+            # Native-level fields stay lazy; convert() reads them one time chunk at a time
+            native = [v for v in NATIVE_INPUT_VARIABLES if v in ds]
+            loaded = loaded.assign({v: ds[v] for v in native})
+            
+        return loaded
         
-        out_ds = xr.Dataset()
+    def convert(self, ds):
+        """
+        Regrids and derives the ERA5 variables from an in-memory MPAS dataset.
         
-        # 1. Surface Variables
-        if 'mslp' in ds:
-            out_ds['SP'] = self.regridder.regrid(ds['mslp'])
+        Returns:
+            tuple: (out_ds, init_time)
+        """
+        # We keep all time steps as 'forecast' steps
+        # The 'time' dimension will be the initialization time (first step)
+        n_time = ds.sizes['Time']
+        lat = self.regridder.latitude
+        lon = self.regridder.longitude
         
-        if 't2m' in ds:
-            out_ds['t2m'] = self.regridder.regrid(ds['t2m'])
+        # Every output variable is allocated once in its final
+        # (time, forecast, [level,] latitude, longitude) layout and the regrid
+        # kernel writes straight into its slices, so no concat/expand_dims/
+        # transpose copies are made.
+        def allocate(n_levels=None):
+            level_shape = (n_levels,) if n_levels is not None else ()
+            return np.empty((1, n_time) + level_shape + (len(lat), len(lon)))
             
-        # 2. 500hPa Variables
-        if 'uzonal_500hPa' in ds:
-            out_ds['U500'] = self.regridder.regrid(ds['uzonal_500hPa'])
+        ordered = bool(ds.attrs.get(CELL_ORDER_ATTR))
+        
+        def regrid_into(mpas_var, out=None):
+            values = ds[mpas_var].transpose('Time', 'nCells').values
+            return self.regridder.regrid_values(values, out=out, ordered=ordered)
             
-        if 'umeridional_500hPa' in ds:
-            out_ds['V500'] = self.regridder.regrid(ds['umeridional_500hPa'])
+        # Regridded temperature per level, reused to derive Q
+        temperature = {}
+        
+        def temperature_at(lvl):
+            if lvl not in temperature:
+                temperature[lvl] = regrid_into(f"temperature_{lvl}hPa")
+            return temperature[lvl]
             
-        if 'temperature_500hPa' in ds:
-            out_ds['T500'] = self.regridder.regrid(ds['temperature_500hPa'])
+        surface_vars = {}
+        level_vars = {}
+        
+        # 1. Surface and 500hPa Variables
+        for var_name, mpas_var in SURFACE_VARIABLES:
+            if mpas_var in ds:
+                out = allocate()
+                regrid_into(mpas_var, out[0])
+                surface_vars[var_name] = out
+                
+        if 'T500' in surface_vars:
+            temperature[500] = surface_vars['T500'][0]
             
         if 'height_500hPa' in ds:
             # Z = H * g
-            h500 = self.regridder.regrid(ds['height_500hPa'])
-            out_ds['Z500'] = h500 * G
+            out = allocate()
+            regrid_into('height_500hPa', out[0])
+            out *= G
+            surface_vars['Z500'] = out
             
         if 'relhum_500hPa' in ds and 'temperature_500hPa' in ds:
-            rh = self.regridder.regrid(ds['relhum_500hPa'])
-            t = self.regridder.regrid(ds['temperature_500hPa'])
-            out_ds['Q500'] = calculate_specific_humidity(rh, t, 50000.0)
-            
-        # 3. "U", "V", "T", "Q" (All levels)
-        levels = [50, 100, 200, 250, 500, 700, 850, 925]
-        
-        for var_name, mpas_prefix, is_derived_q in [
-            ('U', 'uzonal', False),
-            ('V', 'umeridional', False),
-            ('T', 'temperature', False),
-            ('Q', 'relhum', True) 
-        ]:
-            var_levels = []
-            valid_levels = []
+            out = allocate()
+            regrid_into('relhum_500hPa', out[0])
+            out[0] = calculate_specific_humidity(out[0], temperature_at(500), 50000.0)
+            surface_vars['Q500'] = out
             
-            for lvl in levels:
-                mpas_var = f"{mpas_prefix}_{lvl}hPa"
-                if mpas_var in ds:
-                    regridded = self.regridder.regrid(ds[mpas_var])
+        # 2. "U", "V", "T", "Q" (All levels)
+        if self.pressure_levels is not None:
+            # The pre-interpolated LEVELS are a different level set: never fall back to them
+            missing = []
+            if native_pressure_variables(ds) is None:
+                missing.append("'pressure' (or 'pressure_p' and 'pressure_base')")
+            if not any(mpas_var in ds for _, mpas_var in NATIVE_VARIABLES):
+                missing.append(f"any of {', '.join(repr(v) for _, v in NATIVE_VARIABLES)}")
+            if missing:
+                raise ValueError(f"Interpolation to pressure levels needs native model-level fields; "
+                                 f"input lacks {' and '.join(missing)}")
+            level_vars = self._interpolate_native_levels(ds, allocate)
+        else:
+            for var_name, mpas_prefix in LEVEL_VARIABLES:
+                valid_levels = [lvl for lvl in LEVELS if f"{mpas_prefix}_{lvl}hPa" in ds]
+                if var_name == 'Q':
+                    valid_levels = [lvl for lvl in valid_levels if f"temperature_{lvl}hPa" in ds]
+                if not valid_levels:
+                    continue
+                    
+                out = allocate(len(valid_levels))
+                for k, lvl in enumerate(valid_levels):
+                    level_out = out[0, :, k]
+                    regrid_into(f"{mpas_prefix}_{lvl}hPa", level_out)
                     
-                    if is_derived_q:
-                        t_var = f"temperature_{lvl}hPa"
-                        if t_var in ds:
-                            t_regridded = self.regridder.regrid(ds[t_var])
-                            regridded = calculate_specific_humidity(regridded, t_regridded, lvl * 100.0)
-                        else:
-                            continue
-                            
-                    var_levels.append(regridded)
-                    valid_levels.append(lvl)
+                    if var_name == 'T':
+                        temperature.setdefault(lvl, level_out)
+                    elif var_name == 'Q':
+                        level_out[...] = calculate_specific_humidity(level_out, temperature_at(lvl), lvl * 100.0)
+                    
+                level_vars[var_name] = (out, valid_levels)
+                
+        # Capture initialization time from the parsed MPAS times; forecast steps
+        # are standardized to integers (0, 1, 2, ...) so that files with different
+        # absolute times align when combined along 'time'.
+        init_time = ds['Time'].values[0]
+        
+        out_ds = xr.Dataset(coords={
+            'time': [init_time],
+            'forecast': np.arange(n_time),
+            'latitude': lat,
+            'longitude': lon,
+        })
+        
+        # 2D Variables: (time, forecast, latitude, longitude)
+        for var_name, out in surface_vars.items():
+            out_ds[var_name] = (('time', 'forecast', 'latitude', 'longitude'), out)
             
-            if var_levels:
-                combined = xr.concat(var_levels, dim='level')
-                combined = combined.assign_coords(level=valid_levels)
-                out_ds[var_name] = combined
+        # 3D Variables: (time, forecast, level, latitude, longitude)
+        for var_name, (out, valid_levels) in level_vars.items():
+            out_ds[var_name] = xr.DataArray(
+                out,
+                dims=('time', 'forecast', 'level', 'latitude', 'longitude'),
+                coords={'level': valid_levels},
+            )
 
-        # Handle Dimensions: (time, forecast, level, latitude, longitude)
+        return out_ds, init_time
+
+    def _interpolate_native_levels(self, ds, allocate):
+        """
+        Builds U/V/T/Q on self.pressure_levels from native model-level fields.
+        
+        Fields are read and vertically interpolated self.time_chunk forecast
+        steps at a time (all columns at once), and each interpolated level is
+        regridded straight into its slice of the preallocated output.
+        """
+        native = [(var_name, mpas_var) for var_name, mpas_var in NATIVE_VARIABLES if mpas_var in ds]
+        levels_pa = [lvl * 100.0 for lvl in self.pressure_levels]
+        outputs = {var_name: allocate(len(levels_pa)) for var_name, _ in native}
         
-        # 1. Rename 'Time' (from MPAS) to 'forecast'
-        if 'Time' in out_ds.dims:
-            # Capture initialization time BEFORE we standardize the Time dimension to integers
-            # This fixes the bug where everything became 1970-01-01
-            init_time = out_ds.Time.values[0]
+        def column_values(da, chunk):
+            # Native-level fields are read lazily, so their cells are put in
+            # weight column order here, once per chunk
+            values = da.isel(Time=chunk).transpose('Time', 'nCells', 'nVertLevels').values
+            return self.regridder.to_cell_order(values, axis=1)
             
-            # Standardize Time to integer steps (0, 1, 2, ...) to ensure alignment across files
-            # This prevents dimension expansion when combining multiple files with different absolute times
-            out_ds = out_ds.assign_coords(Time=np.arange(out_ds.sizes['Time']))
-            out_ds = out_ds.rename({'Time': 'forecast'})
+        n_time = ds.sizes['Time']
+        for t0 in range(0, n_time, self.time_chunk):
+            chunk = slice(t0, min(t0 + self.time_chunk, n_time))
+            p = self.regridder.to_cell_order(native_pressure(ds, chunk), axis=1)
+            n_steps, n_cells, n_vert = p.shape
+            p = p.reshape(-1, n_vert)
             
-        # 2. Add 'time' dimension (Initialization time)
-        # We take the first time value as the initialization time
-        if 'forecast' in out_ds.dims:
-            # init_time was captured above
-            out_ds = out_ds.expand_dims(time=[init_time])
+            fields = {}
+            for var_name, mpas_var in native:
+                values = column_values(ds[mpas_var], chunk).reshape(-1, n_vert)
+                if var_name == 'T':
+                    values = theta_to_temperature(values, p)
+                elif var_name == 'Q':
+                    values = mixing_ratio_to_specific_humidity(values)
+                fields[var_name] = values
+                
+            interpolated = interp_to_pressure(fields, p, levels_pa, extrapolate=self.extrapolate)
             
-        # 3. Transpose dimensions
-        # 3D Variables: (time, forecast, level, latitude, longitude)
-        # 2D Variables: (time, forecast, latitude, longitude)
-        
-        for var in out_ds.data_vars:
-            dims = out_ds[var].dims
-            if 'level' in dims:
-                out_ds[var] = out_ds[var].transpose('time', 'forecast', 'level', 'latitude', 'longitude')
-            else:
-                out_ds[var] = out_ds[var].transpose('time', 'forecast', 'latitude', 'longitude')
+            for var_name, values in interpolated.items():
+                for k in range(len(levels_pa)):
+                    self.regridder.regrid_values(
+                        values[k].reshape(n_steps, n_cells), out=outputs[var_name][0, chunk, k], ordered=True
+                    )
+                    
+        return {var_name: (out, list(self.pressure_levels)) for var_name, out in outputs.items()}
 
-        # Save
+    def convert_and_check(self, ds):
+        """
+        Runs convert() and summarizes the data quality of the in-memory result.
+        
+        Returns:
+            tuple: (out_ds, init_time, qa) with qa from qa.quality_summary()
+        """
+        out_ds, init_time = self.convert(ds)
+        return out_ds, init_time, quality_summary(out_ds, ds['Time'].values)
+        
+    def write(self, out_ds, init_time, output_format='zarr', qa=None):
+        """Writes a converted dataset (and its optional QA summary) to the output directory."""
         time_str = pd.to_datetime(init_time).strftime('%Y%m%d%H')
         
+        # Accumulate quantile/histogram statistics while the data is in memory,
+        # before encoding replaces it with bit-rounded or packed values
+        if self.sketch is not None:
+            self.sketch.update_dataset(out_ds)
+            
+        out_ds, encoding, report = encode_dataset(out_ds, self.encoding, output_format)
+        
         if output_format == 'zarr':
             output_path = os.path.join(self.output_dir, f"era5_converted_{time_str}.zarr")
-            out_ds.to_zarr(output_path, mode='w', consolidated=False)
+            out_ds.to_zarr(output_path, mode='w', consolidated=False, encoding=encoding)
         elif output_format == 'netcdf':
             output_path = os.path.join(self.output_dir, f"era5_converted_{time_str}.nc")
-            out_ds.to_netcdf(output_path)
+            out_ds.to_netcdf(output_path, encoding=encoding)
         else:
             raise ValueError(f"Unknown output format: {output_format}")
             
+        if report:
+            # Round-trip error of the reduced-precision encoding, per variable
+            report_path = os.path.join(self.output_dir, f"era5_converted_{time_str}.encoding.json")
+            with open(report_path, 'w') as f:
+                json.dump(report, f, indent=2)
+            for name, r in report.items():
+                if not r['within_precision']:
+                    print(f"Warning: {name} max error {r['max_abs_error']:.3g} "
+                          f"({r['clipped']} clipped) exceeds target precision {r['target_precision']}")
+            
+        if qa is not None:
+            qa_path = os.path.join(self.output_dir, f"era5_converted_{time_str}.qa.json")
+            with open(qa_path, 'w') as f:
+                json.dump(qa, f, indent=2)
+            if qa['status'] != 'ok':
+                print(f"QA {qa['status']} for {time_str}: {'; '.join(qa['issues'])}")
+            
         print(f"Saved {output_path}")
         return output_path
+
+    def process_file(self, input_file, output_format='zarr'):
+        ds = self.read_input(input_file)
+        out_ds, init_time, qa = self.convert_and_check(ds)
+        return self.write(out_ds, init_time, output_format, qa=qa)
@@ -0,0 +1,167 @@
+import numpy as np
+
+# Per output variable: (valid_min, valid_max, target_precision), in the units
+# of the variable. Ranges are fixed (not derived from the data) so every file
+# gets the same scale_factor/add_offset and the parts can be combined.
+PRECISION = {
+    'SP': (85000.0, 110000.0, 1.0),
+    't2m': (170.0, 350.0, 0.01),
+    'U500': (-150.0, 150.0, 0.01),
+    'V500': (-150.0, 150.0, 0.01),
+    'T500': (170.0, 330.0, 0.01),
+    'Z500': (40000.0, 62000.0, 1.0),
+    'Q500': (0.0, 0.05, 1e-6),
+    'U': (-200.0, 200.0, 0.01),
+    'V': (-200.0, 200.0, 0.01),
+    'T': (150.0, 350.0, 0.01),
+    'Q': (0.0, 0.05, 1e-6),
+}
+
+ENCODINGS = ['none', 'packed', 'bitround']
+
+# int16 packing: -32768 is reserved for _FillValue
+PACKED_FILL = -32768
+PACKED_MAX = 32767
+
+def packing_parameters(name):
+    """
+    Returns (scale_factor, add_offset) packing a variable's range into int16.
+
+    Raises:
+        ValueError: If the range cannot be packed at the target precision.
+    """
+    vmin, vmax, precision = PRECISION[name]
+    scale = (vmax - vmin) / (2 * PACKED_MAX)
+    if scale / 2 > precision:
+        raise ValueError(
+            f"Range {vmin}..{vmax} of {name} cannot be packed into int16 at precision {precision}"
+        )
+    return scale, (vmax + vmin) / 2
+
+def keepbits_for(name):
+    """Mantissa bits to keep so bit-rounding stays within the target precision."""
+    vmin, vmax, precision = PRECISION[name]
+    magnitude = max(abs(vmin), abs(vmax))
+    # Bit-rounding to k bits has a relative error of at most 2**-(k + 1)
+    keepbits = int(np.ceil(np.log2(magnitude / precision))) - 1
+    return int(np.clip(keepbits, 1, 23))
+
+def bitround(values, keepbits):
+    """
+    Rounds float32 values to `keepbits` mantissa bits (round to nearest, ties to even).
+
+    The trailing zero bits make the data far more compressible. NaNs are preserved.
+    """
+    values = np.array(values, dtype=np.float32)
+    maskbits = 23 - keepbits
+    if maskbits <= 0:
+        return values
+    nan = np.isnan(values)
+    bits = values.view(np.uint32)
+    mask = np.uint32((0xFFFFFFFF >> maskbits) << maskbits)
+    half_quantum = np.uint32((1 << (maskbits - 1)) - 1)
+    bits += ((bits >> np.uint32(maskbits)) & np.uint32(1)) + half_quantum
+    bits &= mask
+    values[nan] = np.nan
+    return values
+
+def _packed_roundtrip(values, scale, offset):
+    """Values as they decode after packing (after clipping to the packable range)."""
+    packed = np.round((values - offset) / scale)
+    np.clip(packed, -PACKED_MAX, PACKED_MAX, out=packed)
+    return packed * scale + offset
+
+def encode_dataset(out_ds, mode, output_format='zarr'):
+    """
+    Prepares a converted dataset for storage with reduced-precision encodings.
+
+    Args:
+        out_ds (xr.Dataset): Converted dataset (time, forecast, [level,] lat, lon).
+        mode (str): 'none', 'packed' (int16 scale_factor/add_offset) or
+            'bitround' (float32 with mantissa bits rounded off before compression).
+        output_format (str): 'zarr' or 'netcdf'.
+
+    Returns:
+        tuple: (out_ds, encoding, report) where encoding is passed to
+               to_zarr/to_netcdf and report holds the round-trip error per variable.
+    """
+    if mode not in ENCODINGS:
+        raise ValueError(f"Unknown encoding: {mode}")
+    encoding = {}
+    report = {}
+    if mode == 'none':
+        return out_ds, encoding, report
+
+    for name in list(out_ds.data_vars):
+        if name not in PRECISION:
+            continue
+        da = out_ds[name]
+        values = da.values
+        precision = PRECISION[name][2]
+        max_error = 0.0
+        sum_sq = 0.0
+        n_clipped = 0
+
+        if mode == 'packed':
+            scale, offset = packing_parameters(name)
+            # Out-of-range values would wrap around in the int16 cast: clip
+            # the data that is written, not just the round-trip check
+            low, high = offset - PACKED_MAX * scale, offset + PACKED_MAX * scale
+            written = np.empty_like(values)
+            # Round-trip one forecast step at a time to keep temporaries small
+            for idx in np.ndindex(*values.shape[:2]):
+                step = values[idx]
+                n_clipped += int(np.count_nonzero((step < low) | (step > high)))
+                np.clip(step, low, high, out=written[idx])
+                err = np.abs(_packed_roundtrip(written[idx], scale, offset) - step)
+                max_error = max(max_error, float(np.nanmax(err, initial=0.0)))
+                sum_sq += float(np.nansum(err ** 2))
+            out_ds[name] = da.copy(data=written)
+            encoding[name] = {
+                'dtype': 'int16',
+                'scale_factor': scale,
+                'add_offset': offset,
+                '_FillValue': PACKED_FILL,
+            }
+        else:
+            keepbits = keepbits_for(name)
+            rounded = bitround(values, keepbits)
+            err = np.abs(rounded.astype(values.dtype) - values)
+            max_error = float(np.nanmax(err, initial=0.0))
+            sum_sq = float(np.nansum(err ** 2))
+            del err
+            out_ds[name] = da.copy(data=rounded)
+            encoding[name] = {'dtype': 'float32'}
+            if output_format == 'netcdf':
+                encoding[name].update({'zlib': True, 'complevel': 4})
+
+        n = max(np.count_nonzero(~np.isnan(values)), 1)
+        report[name] = {
+            'mode': mode,
+            'count': int(n),
+            'target_precision': precision,
+            'max_abs_error': max_error,
+            'rmse': float(np.sqrt(sum_sq / n)),
+            'clipped': int(n_clipped),
+            'within_precision': bool(max_error <= precision and n_clipped == 0),
+        }
+
+    return out_ds, encoding, report
+
+def summarize_reports(reports):
+    """Merges per-file round-trip reports into one report per variable."""
+    summary = {}
+    for report in reports:
+        for name, r in report.items():
+            s = summary.setdefault(name, {
+                'mode': r['mode'], 'count': 0, 'target_precision': r['target_precision'],
+                'max_abs_error': 0.0, 'sum_sq': 0.0, 'clipped': 0,
+            })
+            s['count'] += r['count']
+            s['max_abs_error'] = max(s['max_abs_error'], r['max_abs_error'])
+            s['sum_sq'] += r['rmse'] ** 2 * r['count']
+            s['clipped'] += r['clipped']
+    for s in summary.values():
+        s['rmse'] = float(np.sqrt(s.pop('sum_sq') / max(s['count'], 1)))
+        s['within_precision'] = bool(s['max_abs_error'] <= s['target_precision'] and s['clipped'] == 0)
+    return summary
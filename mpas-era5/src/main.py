@@ -1,10 +1,45 @@
 import argparse
 import os
+import json
 import glob
 import xarray as xr
 import pandas as pd
 from .converter import Converter
-from .stats import compute_stats
+from .pipeline import ConversionPipeline
+from .regridder import Regridder
+from .vertical import ERA5_LEVELS
+from .encoding import ENCODINGS, summarize_reports
+from .qa import summarize_qa
+from .stats import compute_stats, compute_quantiles, HistogramSketch
+from .planner import inspect_input, inspect_map, plan_resources, format_plan
+from concurrent.futures import ProcessPoolExecutor
+
+# Converter of a worker process, built once by _init_worker
+_worker_converter = None
+
+def _init_worker(converter_args, regridder_args):
+    global _worker_converter
+    map_file, output_dir, kwargs = converter_args
+    regridder = Regridder(map_file, **regridder_args)
+    _worker_converter = Converter(map_file, output_dir, regridder=regridder, **kwargs)
+
+def _convert_in_worker(input_file):
+    try:
+        return input_file, _worker_converter.process_file(input_file), None
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return input_file, None, str(e)
+
+def _load_sidecars(paths, suffix):
+    """Reads the JSON sidecar (e.g. '.qa.json') written next to each converted file, keyed by file."""
+    sidecars = {}
+    for path in paths:
+        sidecar_path = os.path.splitext(path)[0] + suffix
+        if os.path.exists(sidecar_path):
+            with open(sidecar_path) as f:
+                sidecars[path] = json.load(f)
+    return sidecars
 
 def main():
     parser = argparse.ArgumentParser(description="Convert MPAS NetCDF to ERA5 Zarr")
@@ -12,39 +47,111 @@ def main():
     parser.add_argument("--map_file", required=True, help="Path to regridding mapping NetCDF file")
     parser.add_argument("--output_dir", required=True, help="Directory to save output Zarr files")
     parser.add_argument("--skip_conversion", action="store_true", help="Skip conversion and only combine existing files in temp_parts")
+    parser.add_argument("--pipeline", action="store_true", help="Overlap reading, regridding and writing of consecutive files")
+    parser.add_argument("--queue_depth", type=int, default=2, help="Files buffered between pipeline stages (with --pipeline)")
+    parser.add_argument("--reorder", choices=["hilbert", "morton"], help="Reorder MPAS cells along a space-filling curve for regrid locality")
+    parser.add_argument("--prune_tol", type=float, help="Drop regridding weights below this magnitude and renormalize rows")
+    parser.add_argument("--weights_cache", help="Directory to cache the prepared regridding weights")
+    parser.add_argument("--pressure_levels", help="Interpolate U/V/T/Q from native model levels: 'era5' (37 levels) or comma-separated hPa values")
+    parser.add_argument("--extrapolate", action="store_true", help="Extrapolate to pressure levels outside the model column (the 'era5' levels above the model top "
+                                                                  "and below ground are NaN otherwise)")
+    parser.add_argument("--time_chunk", type=int, help="Forecast steps of native-level fields interpolated at once (default: planned)")
+    parser.add_argument("--workers", type=int, help="Files converted concurrently in separate processes (default: planned)")
+    parser.add_argument("--memory_budget", type=float, help="Memory (GiB) the conversion may use (default: 80%% of available)")
+    parser.add_argument("--dry-run", dest="dry_run", action="store_true", help="Print the resource plan and exit")
+    parser.add_argument("--encoding", choices=ENCODINGS, default="none", help="Reduced-precision storage: int16 packing or float32 bit-rounding")
     
     args = parser.parse_args()
     
+    sketch = HistogramSketch()
+    pressure_levels = None
+    if args.pressure_levels == 'era5':
+        pressure_levels = ERA5_LEVELS
+        if not args.extrapolate:
+            print("Note: ERA5 levels outside the model column (e.g. 1-7 hPa, 1000 hPa) will be NaN; use --extrapolate to fill them")
+    elif args.pressure_levels:
+        pressure_levels = [float(p) for p in args.pressure_levels.split(',')]
+        
+    files = sorted(glob.glob(os.path.join(args.input_dir, "*.nc")))
+    
+    # Size workers, regrid threads and time chunks from the first input and the map
+    plan = None
+    if files and not args.skip_conversion:
+        plan = plan_resources(
+            inspect_input(files[0]), inspect_map(args.map_file), len(files),
+            n_pressure_levels=len(pressure_levels) if pressure_levels is not None else None,
+            memory_budget=int(args.memory_budget * 1024 ** 3) if args.memory_budget else None,
+            workers=1 if args.pipeline else args.workers, time_chunk=args.time_chunk,
+            queue_depth=args.queue_depth if args.pipeline else None,
+        )
+        print("Resource plan:")
+        print(format_plan(plan))
+    if args.dry_run:
+        return
+        
     if not os.path.exists(args.output_dir):
         os.makedirs(args.output_dir)
         
-    converter = Converter(args.map_file, args.output_dir)
+    regridder_args = {
+        'reorder': args.reorder, 'cache_dir': args.weights_cache, 'prune_tol': args.prune_tol,
+        'threads': plan['regrid_threads'] if plan else 1,
+    }
+    converter_kwargs = {
+        'pressure_levels': pressure_levels,
+        'time_chunk': plan['time_chunk'] if plan else (args.time_chunk or 1),
+        'encoding': args.encoding,
+        'extrapolate': args.extrapolate,
+    }
     
     # Create temp dir for intermediate files
     temp_dir = os.path.join(args.output_dir, "temp_parts")
     if not os.path.exists(temp_dir):
         os.makedirs(temp_dir)
+        
+    def in_process_converter():
+        # Only built for in-process conversion: worker processes build their own
+        # regridder, and a second weight matrix here is not in the memory plan
+        regridder = Regridder(args.map_file, **regridder_args)
+        return Converter(args.map_file, temp_dir, sketch=sketch, regridder=regridder, **converter_kwargs)
 
     zarr_paths = []
     
     if not args.skip_conversion:
-        # Find files
-        files = sorted(glob.glob(os.path.join(args.input_dir, "*.nc")))
         if not files:
             print(f"No .nc files found in {args.input_dir}")
             return
 
-        for f in files:
-            print(f"Processing {f}...")
-            try:
-                # We temporarily save to temp_dir
-                converter.output_dir = temp_dir
-                out_path = converter.process_file(f)
-                zarr_paths.append(out_path)
-            except Exception as e:
-                print(f"Failed to process {f}: {e}")
-                import traceback
-                traceback.print_exc()
+        # Parts are written to temp_dir and combined below
+        if args.pipeline:
+            print(f"Processing {len(files)} files with pipeline (queue depth {args.queue_depth})...")
+            pipeline = ConversionPipeline(in_process_converter(), queue_depth=args.queue_depth)
+            for f, out_path, error in pipeline.run(files):
+                if error is None:
+                    zarr_paths.append(out_path)
+        elif plan['workers'] > 1:
+            # Worker processes do not share the sketch; quantiles are then
+            # computed by streaming over the combined store instead
+            print(f"Processing {len(files)} files with {plan['workers']} worker processes...")
+            with ProcessPoolExecutor(
+                max_workers=plan['workers'], initializer=_init_worker,
+                initargs=((args.map_file, temp_dir, converter_kwargs), regridder_args),
+            ) as pool:
+                for f, out_path, error in pool.map(_convert_in_worker, files):
+                    if error is None:
+                        zarr_paths.append(out_path)
+                    else:
+                        print(f"Failed to process {f}: {error}")
+        else:
+            converter = in_process_converter()
+            for f in files:
+                print(f"Processing {f}...")
+                try:
+                    out_path = converter.process_file(f)
+                    zarr_paths.append(out_path)
+                except Exception as e:
+                    print(f"Failed to process {f}: {e}")
+                    import traceback
+                    traceback.print_exc()
     else:
         print(f"Skipping conversion. Looking for existing files in {temp_dir}...")
         zarr_paths = sorted(glob.glob(os.path.join(temp_dir, "*.zarr")))
@@ -53,6 +160,32 @@ def main():
             return
             
     if zarr_paths:
+        # Reports are aggregated before combining, so they are written even
+        # when the combine fails (e.g. on the bad time axis QA flags)
+        
+        # Aggregate the per-file round-trip error reports of reduced-precision encodings
+        reports = _load_sidecars(zarr_paths, ".encoding.json")
+        if reports:
+            summary = summarize_reports(reports.values())
+            with open(os.path.join(args.output_dir, "encoding_report.json"), 'w') as f:
+                json.dump(summary, f, indent=2)
+            for name, r in summary.items():
+                print(f"Encoding {name}: max abs error {r['max_abs_error']:.3g}, rmse {r['rmse']:.3g} "
+                      f"(target {r['target_precision']}, clipped {r['clipped']})")
+        
+        # Aggregate the per-file QA summaries computed during conversion
+        qa_reports = _load_sidecars(zarr_paths, ".qa.json")
+        if qa_reports:
+            qa_summary = summarize_qa(qa_reports)
+            with open(os.path.join(args.output_dir, "qa_report.json"), 'w') as f:
+                json.dump(qa_summary, f, indent=2)
+            print(f"QA: {qa_summary['status']['ok']} ok, {qa_summary['status']['warning']} warning, "
+                  f"{qa_summary['status']['fail']} failed of {qa_summary['n_files']} files")
+            for path, issues in qa_summary['files_with_issues'].items():
+                print(f"  {os.path.basename(path)}: {'; '.join(issues)}")
+            for issue in qa_summary['init_time_issues']:
+                print(f"  init times: {issue}")
+        
         try:
             print("Combining files...")
             # Combine all processed files
@@ -82,6 +215,9 @@ def main():
             # Re-open the combined zarr to ensure we compute stats on the final artifact
             ds_final = xr.open_zarr(output_path)
             compute_stats(ds_final, args.output_dir)
+            # Quantiles come from the sketch filled during conversion; with
+            # --skip_conversion it is built by streaming over the store.
+            compute_quantiles(ds_final, args.output_dir, sketch=sketch)
             print("Statistics computed and saved.")
             
             # Optional: Clean up temp_parts? 
@@ -0,0 +1,108 @@
+import queue
+import threading
+import time
+import traceback
+
+# Sentinel passed down the queues once the input list is exhausted
+_DONE = object()
+
+
+class ConversionPipeline:
+    """
+    Overlaps the read, regrid and write stages of a Converter across files.
+
+    Each stage runs in its own thread and hands work to the next one through
+    a bounded queue, so while file N is being regridded file N+1 is already
+    being read and file N-1 is being written. The queue depth bounds how many
+    in-memory datasets can be waiting between two stages (and therefore the
+    peak memory), and per-file wall time approaches the slowest stage rather
+    than the sum of all three.
+    """
+
+    def __init__(self, converter, queue_depth=2, output_format='zarr'):
+        """
+        Args:
+            converter (Converter): Converter providing read_input/convert/write.
+            queue_depth (int): Maximum number of items buffered between stages.
+            output_format (str): 'zarr' or 'netcdf'.
+        """
+        if queue_depth < 1:
+            raise ValueError("queue_depth must be at least 1")
+        self.converter = converter
+        self.queue_depth = queue_depth
+        self.output_format = output_format
+        self.stage_seconds = {'read': 0.0, 'regrid': 0.0, 'write': 0.0}
+
+    def _stage(self, name, func, in_q, out_q):
+        """Runs one stage: pulls (file, payload) items, applies func, pushes results."""
+        while True:
+            item = in_q.get()
+            if item is _DONE:
+                out_q.put(_DONE)
+                return
+
+            input_file, payload, error = item
+            if error is None:
+                start = time.perf_counter()
+                try:
+                    payload = func(payload)
+                except Exception as e:
+                    print(f"Failed to {name} {input_file}: {e}")
+                    traceback.print_exc()
+                    payload, error = None, e
+                self.stage_seconds[name] += time.perf_counter() - start
+            out_q.put((input_file, payload, error))
+
+    def run(self, files):
+        """
+        Converts the given files through the staged pipeline.
+
+        Args:
+            files (list): Input MPAS files, processed in order.
+
+        Returns:
+            list: (input_file, output_path, error) tuples in input order.
+                  output_path is None and error is set if any stage failed.
+        """
+        files_q = queue.Queue()
+        read_q = queue.Queue(maxsize=self.queue_depth)
+        regrid_q = queue.Queue(maxsize=self.queue_depth)
+        results_q = queue.Queue()
+
+        for f in files:
+            files_q.put((f, f, None))
+        files_q.put(_DONE)
+
+        converter = self.converter
+        output_format = self.output_format
+        stages = [
+            ('read', converter.read_input, files_q, read_q),
+            ('regrid', converter.convert_and_check, read_q, regrid_q),
+            ('write', lambda out: converter.write(out[0], out[1], output_format, qa=out[2]), regrid_q, results_q),
+        ]
+
+        start = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._stage, args=stage, name=f"pipeline-{stage[0]}", daemon=True)
+            for stage in stages
+        ]
+        for t in threads:
+            t.start()
+
+        results = []
+        while True:
+            item = results_q.get()
+            if item is _DONE:
+                break
+            results.append(item)
+
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - start
+
+        print(
+            "Pipeline stage times: "
+            + ", ".join(f"{k} {v:.1f}s" for k, v in self.stage_seconds.items())
+            + f" (wall {wall:.1f}s for {len(results)} files)"
+        )
+        return results
@@ -0,0 +1,202 @@
+import os
+import xarray as xr
+from .converter import LEVELS, SURFACE_VARIABLES, LEVEL_VARIABLES, INPUT_VARIABLES, NATIVE_INPUT_VARIABLES
+
+# Bytes per value of the in-memory arrays (inputs are loaded and outputs allocated as float64)
+VALUE_BYTES = 8
+
+# Temporaries of the vertical interpolation per native value held
+# (pressure, log-pressure, bracketing indices and weights)
+NATIVE_OVERHEAD = 4
+
+# ConversionPipeline stages on either side of each of its two bounded queues
+# (read -> regrid for inputs, regrid -> write for outputs), each holding one
+# item in flight besides the queued ones
+PIPELINE_STAGES_PER_QUEUE = 2
+
+def available_memory():
+    """Bytes of memory available to new work (MemAvailable, falling back to free pages)."""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def available_cores():
+    """Cores this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def inspect_input(input_file):
+    """
+    Reads the dimensions relevant for sizing from one MPAS file (metadata only).
+
+    Returns:
+        dict: n_cells, n_time, n_vert_levels, n_input_vars, n_native_vars
+    """
+    with xr.open_dataset(input_file) as ds:
+        return {
+            'n_cells': int(ds.sizes.get('nCells', 0)),
+            'n_time': int(ds.sizes.get('Time', 1)),
+            'n_vert_levels': int(ds.sizes.get('nVertLevels', 0)),
+            'n_input_vars': sum(1 for v in INPUT_VARIABLES if v in ds),
+            'n_native_vars': sum(1 for v in NATIVE_INPUT_VARIABLES if v in ds),
+        }
+
+def inspect_map(map_file):
+    """
+    Reads the size of the regridding matrix from an ESMF mapping file.
+
+    Returns:
+        dict: nnz, n_src, n_dst
+    """
+    with xr.open_dataset(map_file) as ds:
+        return {
+            'nnz': int(ds['S'].size),
+            'n_src': int(ds.sizes.get('n_a', 0)),
+            'n_dst': int(ds.sizes.get('n_b', ds['yc_b'].size)),
+        }
+
+def pipeline_resident_items(queue_depth):
+    """
+    Datasets of each kind (loaded inputs, converted outputs) a ConversionPipeline
+    can hold at once: a full queue plus the item in flight in the stages on
+    either side of it.
+    """
+    return queue_depth + PIPELINE_STAGES_PER_QUEUE
+
+def estimate_memory(input_info, map_info, n_pressure_levels=None, time_chunk=1, resident_items=1):
+    """
+    Estimates the peak bytes one conversion worker needs.
+
+    Args:
+        resident_items (int): Input and output datasets held at once (1 for a
+            plain worker, see pipeline_resident_items() for the pipeline).
+
+    Returns:
+        dict: weights, input, output, native (per time_chunk) and total bytes
+    """
+    n_time = input_info['n_time']
+    n_dst = map_info['n_dst']
+
+    # CSR matrix: data (float64) + indices (int32) per nonzero, plus row pointers
+    weights = map_info['nnz'] * (VALUE_BYTES + 4) + (n_dst + 1) * 4
+    inputs = input_info['n_input_vars'] * n_time * input_info['n_cells'] * VALUE_BYTES
+
+    n_levels = n_pressure_levels if n_pressure_levels is not None else len(LEVELS)
+    n_output_fields = len(SURFACE_VARIABLES) + 2 + len(LEVEL_VARIABLES) * n_levels
+    output = n_output_fields * n_time * n_dst * VALUE_BYTES
+    # Regridded temperature kept per level to derive Q, and the encoding round trip of one variable
+    output += (n_levels + 1) * n_time * n_dst * VALUE_BYTES
+
+    native = 0
+    if n_pressure_levels is not None:
+        native = (input_info['n_native_vars'] * NATIVE_OVERHEAD * time_chunk
+                  * input_info['n_vert_levels'] * input_info['n_cells'] * VALUE_BYTES)
+
+    # The weights and the native-level temporaries of the one converting stage are not duplicated
+    inputs *= resident_items
+    output *= resident_items
+
+    return {
+        'weights': weights,
+        'input': inputs,
+        'output': output,
+        'native': native,
+        'total': weights + inputs + output + native,
+    }
+
+def plan_resources(input_info, map_info, n_files, n_pressure_levels=None, memory_budget=None, cores=None,
+                   workers=None, time_chunk=None, queue_depth=None):
+    """
+    Chooses worker count, regrid threads and time-chunk size that fit a memory budget.
+
+    Workers are added while another full conversion still fits the budget
+    and a core is free; the cores left over go to regrid threads, and the
+    memory left per worker grows the native-level time chunk.
+
+    Args:
+        input_info (dict): From inspect_input().
+        map_info (dict): From inspect_map().
+        n_files (int): Number of files to convert.
+        n_pressure_levels (int): Target pressure levels when interpolating from native levels.
+        memory_budget (int): Bytes usable in total (default: 80% of available memory).
+        cores (int): Cores usable (default: available_cores()).
+        workers, time_chunk (int): Fixed values that override the planner.
+        queue_depth (int): Queue depth of a ConversionPipeline, which runs in a
+            single worker but holds several datasets at once (None: no pipeline).
+
+    Returns:
+        dict: The plan, including the estimate it is based on and whether it fits.
+    """
+    cores = cores or available_cores()
+    if memory_budget is None:
+        available = available_memory()
+        memory_budget = int(0.8 * available) if available else None
+
+    n_time = max(input_info['n_time'], 1)
+    resident = 1
+    if queue_depth is not None:
+        workers = 1
+        resident = pipeline_resident_items(queue_depth)
+    base = estimate_memory(input_info, map_info, n_pressure_levels, time_chunk=1, resident_items=resident)
+    per_step_native = base['native']
+    per_worker_min = base['total']
+
+    if workers is None:
+        workers = max(1, min(cores, n_files))
+        if memory_budget is not None:
+            workers = max(1, min(workers, memory_budget // max(per_worker_min, 1)))
+    workers = int(workers)
+
+    if time_chunk is None:
+        time_chunk = 1
+        if n_pressure_levels is not None and memory_budget is not None and per_step_native > 0:
+            spare = memory_budget // workers - (per_worker_min - per_step_native)
+            time_chunk = int(min(max(spare // per_step_native, 1), n_time))
+    time_chunk = int(time_chunk)
+
+    estimate = estimate_memory(input_info, map_info, n_pressure_levels, time_chunk, resident_items=resident)
+    peak = workers * estimate['total']
+    return {
+        'workers': workers,
+        'queue_depth': queue_depth,
+        'resident_items': resident,
+        'regrid_threads': max(1, cores // workers),
+        'time_chunk': time_chunk,
+        'cores': cores,
+        'memory_budget': memory_budget,
+        'per_worker_bytes': estimate,
+        'peak_bytes': peak,
+        'fits': memory_budget is None or peak <= memory_budget,
+    }
+
+def format_plan(plan):
+    """Human-readable summary of a plan for --dry-run."""
+    gib = 1024 ** 3
+    est = plan['per_worker_bytes']
+    budget = plan['memory_budget']
+    workers = f"{plan['workers']} (of {plan['cores']} cores)"
+    if plan.get('queue_depth') is not None:
+        workers += (f", pipeline with queue depth {plan['queue_depth']} "
+                    f"({plan['resident_items']} inputs and outputs held at once)")
+    lines = [
+        f"Workers:        {workers}",
+        f"Regrid threads: {plan['regrid_threads']} per worker",
+        f"Time chunk:     {plan['time_chunk']}",
+        f"Per worker:     {est['total'] / gib:.2f} GiB (weights {est['weights'] / gib:.2f}, "
+        f"input {est['input'] / gib:.2f}, output {est['output'] / gib:.2f}, native {est['native'] / gib:.2f})",
+        f"Peak estimate:  {plan['peak_bytes'] / gib:.2f} GiB of "
+        + (f"{budget / gib:.2f} GiB budget" if budget is not None else "unknown budget"),
+    ]
+    if not plan['fits']:
+        lines.append("WARNING: the estimated peak exceeds the memory budget")
+    return "\n".join(lines)
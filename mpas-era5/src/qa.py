@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+
+def variable_summary(values):
+    """Min/max/mean and NaN count of an in-memory array (NaNs excluded from the moments)."""
+    values = np.asarray(values)
+    nan = np.isnan(values)
+    n_nan = int(np.count_nonzero(nan))
+    count = int(values.size - n_nan)
+    if count == 0:
+        return {'count': 0, 'nan_count': n_nan, 'min': None, 'max': None, 'mean': None}
+    valid = values[~nan] if n_nan else values
+    return {
+        'count': count,
+        'nan_count': n_nan,
+        'min': float(valid.min()),
+        'max': float(valid.max()),
+        'mean': float(valid.mean()),
+    }
+
+def check_time_axis(times, expected_step_hours=None):
+    """
+    Checks the valid times of one input file.
+
+    Returns:
+        tuple: (step_hours or None, list of issue strings)
+    """
+    issues = []
+    times = np.asarray(times)
+    if not np.issubdtype(times.dtype, np.datetime64):
+        return None, ["time axis is not parsed as datetimes (bad xtime?)"]
+    if times.size < 2:
+        return None, issues
+
+    steps = np.diff(times) / np.timedelta64(1, 'h')
+    if np.any(steps == 0):
+        issues.append("duplicate times")
+    if np.any(steps < 0):
+        issues.append("times are not increasing")
+    step = float(np.median(steps))
+    if not np.allclose(steps, step):
+        issues.append(f"irregular time steps: {sorted(set(steps.tolist()))} h")
+    if expected_step_hours is not None and not np.isclose(step, expected_step_hours):
+        issues.append(f"time step {step} h, expected {expected_step_hours} h")
+    return step, issues
+
+def quality_summary(out_ds, times, expected_step_hours=None):
+    """
+    Data-quality summary of one converted file from the arrays already in memory.
+
+    Args:
+        out_ds (xr.Dataset): Converted dataset (before storage encoding).
+        times (array): Valid times of the input file (MPAS 'Time').
+        expected_step_hours (float): Optional required spacing of the time axis.
+
+    Returns:
+        dict: init_time, n_forecast, time_step_hours, per-variable statistics,
+              issues and status ('ok', 'warning' or 'fail').
+    """
+    step, issues = check_time_axis(times, expected_step_hours)
+    fatal = bool(issues)
+    warnings = []
+
+    variables = {}
+    for name, da in out_ds.data_vars.items():
+        summary = variable_summary(da.values)
+        if 'level' in da.dims:
+            # NaNs per level point at a single bad input field
+            axis = tuple(i for i, d in enumerate(da.dims) if d != 'level')
+            summary['nan_count_per_level'] = dict(zip(
+                (str(lvl) for lvl in da['level'].values),
+                np.count_nonzero(np.isnan(da.values), axis=axis).tolist(),
+            ))
+        variables[name] = summary
+        if summary['count'] == 0:
+            issues.append(f"{name} is all NaN")
+            fatal = True
+        elif summary['nan_count']:
+            warnings.append(f"{name} has {summary['nan_count']} NaNs")
+
+    if not variables:
+        issues.append("no variables converted")
+        fatal = True
+
+    return {
+        'init_time': str(pd.to_datetime(out_ds['time'].values[0])) if 'time' in out_ds.coords else None,
+        'n_forecast': int(out_ds.sizes.get('forecast', 0)),
+        'time_step_hours': step,
+        'variables': variables,
+        'issues': issues + warnings,
+        'status': 'fail' if fatal else ('warning' if warnings else 'ok'),
+    }
+
+def summarize_qa(reports):
+    """
+    Aggregates per-file QA summaries into one report.
+
+    Args:
+        reports (dict): file path -> QA summary of that file.
+
+    Returns:
+        dict: file counts by status, files with issues (by path), per-variable
+              extremes, count-weighted means and NaN totals, and init-time
+              spacing checks.
+    """
+    status = {'ok': 0, 'warning': 0, 'fail': 0}
+    files = {}
+    variables = {}
+    for path, report in reports.items():
+        status[report['status']] += 1
+        if report['issues']:
+            # Keyed by file: duplicate init times must not hide each other
+            files[path] = report['issues']
+        for name, s in report['variables'].items():
+            v = variables.setdefault(name, {'count': 0, 'nan_count': 0, 'min': None, 'max': None, 'sum': 0.0})
+            v['nan_count'] += s['nan_count']
+            if s['count'] == 0:
+                continue
+            v['count'] += s['count']
+            v['sum'] += s['mean'] * s['count']
+            v['min'] = s['min'] if v['min'] is None else min(v['min'], s['min'])
+            v['max'] = s['max'] if v['max'] is None else max(v['max'], s['max'])
+    for v in variables.values():
+        total = v.pop('sum')
+        v['mean'] = total / v['count'] if v['count'] else None
+
+    init_times = [r['init_time'] for r in reports.values() if r['init_time'] is not None]
+    step, time_issues = check_time_axis(np.array(sorted(init_times), dtype='datetime64[ns]'))
+    return {
+        'n_files': len(reports),
+        'status': status,
+        'init_time_step_hours': step,
+        'init_time_issues': time_issues,
+        'files_with_issues': files,
+        'variables': variables,
+    }
@@ -1,18 +1,205 @@
 import xarray as xr
 import numpy as np
 import scipy.sparse as sp
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    # y += A x for CSR arrays, writing into an existing output vector
+    from scipy.sparse._sparsetools import csr_matvec
+except ImportError:
+    csr_matvec = None
+
+def morton_keys(ix, iy, bits=16):
+    """Interleaves the bits of two integer coordinate arrays (Z-order)."""
+    key = np.zeros(ix.shape, dtype=np.uint64)
+    ix = ix.astype(np.uint64)
+    iy = iy.astype(np.uint64)
+    for b in range(bits):
+        key |= ((ix >> np.uint64(b)) & np.uint64(1)) << np.uint64(2 * b)
+        key |= ((iy >> np.uint64(b)) & np.uint64(1)) << np.uint64(2 * b + 1)
+    return key
+
+def hilbert_keys(ix, iy, bits=16):
+    """Distance along a Hilbert curve of order `bits` for integer coordinates."""
+    x = ix.astype(np.int64).copy()
+    y = iy.astype(np.int64).copy()
+    key = np.zeros(x.shape, dtype=np.int64)
+    s = 1 << (bits - 1)
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        key += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant so the curve stays continuous
+        flip = ~ry & rx
+        x = np.where(flip, s - 1 - x, x)
+        y = np.where(flip, s - 1 - y, y)
+        swap = ~ry
+        x, y = np.where(swap, y, x), np.where(swap, x, y)
+        s >>= 1
+    return key
+
+def cell_order(lat, lon, method='hilbert', bits=16):
+    """
+    Returns the permutation sorting cells along a space-filling curve.
+    
+    Args:
+        lat, lon (np.ndarray): Cell centers (any consistent unit).
+        method (str): 'hilbert' or 'morton'.
+    """
+    n = (1 << bits) - 1
+    ix = np.round((lon - lon.min()) / max(np.ptp(lon), 1e-12) * n).astype(np.int64)
+    iy = np.round((lat - lat.min()) / max(np.ptp(lat), 1e-12) * n).astype(np.int64)
+    if method == 'hilbert':
+        keys = hilbert_keys(ix, iy, bits)
+    elif method == 'morton':
+        keys = morton_keys(ix, iy, bits)
+    else:
+        raise ValueError(f"Unknown reorder method: {method}")
+    return np.argsort(keys, kind='stable')
 
 class Regridder:
-    def __init__(self, map_file_path):
+    def __init__(self, map_file_path, reorder=None, cache_dir=None, prune_tol=None, threads=1):
         """
         Initializes the regridder with a mapping file.
         
         Args:
             map_file_path (str): Path to the NetCDF mapping file.
+            reorder (str): Optional space-filling-curve ordering of the source
+                cells ('hilbert' or 'morton') to improve locality of the
+                sparse gather. Input fields are permuted consistently.
+            cache_dir (str): Optional directory where the (reordered) weight
+                matrix is cached, keyed on the map file and options.
+            prune_tol (float): Optional threshold below which weights are
+                dropped; each destination row is renormalized to its
+                original sum. The effect is reported in `prune_report`.
+            threads (int): Threads sharing the samples of one regrid_values
+                call (the sparse product releases the GIL).
         """
+        self.map_file_path = map_file_path
         self.map_ds = xr.open_dataset(map_file_path)
-        self._init_weights()
+        self.reorder = reorder
+        self.cache_dir = cache_dir
+        self.prune_tol = prune_tol
+        self.threads = max(1, int(threads))
+        self.cell_order = None
+        self.prune_report = None
+        
+        if not self._load_cache():
+            self._init_weights()
+            if prune_tol:
+                self._prune_weights()
+            if reorder:
+                self._reorder_weights()
+            self._save_cache()
+        self._init_coords()
+            
+    def _cache_path(self):
+        if not self.cache_dir:
+            return None
+        st = os.stat(self.map_file_path)
+        key = f"{os.path.abspath(self.map_file_path)}:{st.st_size}:{st.st_mtime_ns}:{self.reorder}:{self.prune_tol}"
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"weights_{digest}.npz")
+        
+    def _load_cache(self):
+        """Loads weights (and cell order) from the cache. Returns True on a hit."""
+        path = self._cache_path()
+        if path is None or not os.path.exists(path):
+            return False
+        with np.load(path) as f:
+            self.weights = sp.csr_matrix((f['data'], f['indices'], f['indptr']), shape=tuple(f['shape']))
+            self.dst_shape = tuple(int(d) for d in f['dst_shape'])
+            if 'cell_order' in f:
+                self.cell_order = f['cell_order']
+            if 'prune_report' in f:
+                self.prune_report = json.loads(str(f['prune_report']))
+        print(f"Loaded cached weights from {path}")
+        return True
+        
+    def _save_cache(self):
+        path = self._cache_path()
+        if path is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        arrays = {
+            'data': self.weights.data,
+            'indices': self.weights.indices,
+            'indptr': self.weights.indptr,
+            'shape': np.array(self.weights.shape),
+            'dst_shape': np.array(self.dst_shape),
+        }
+        if self.cell_order is not None:
+            arrays['cell_order'] = self.cell_order
+        if self.prune_report is not None:
+            arrays['prune_report'] = np.array(json.dumps(self.prune_report))
+        # Write to a temporary file first so concurrent readers never see a partial cache
+        tmp_path = path + f".{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+        
+    def _reorder_weights(self):
+        """Permutes the weight columns so source cells follow a space-filling curve."""
+        if 'yc_a' not in self.map_ds or 'xc_a' not in self.map_ds:
+            raise ValueError("Mapping file has no source cell centers (yc_a/xc_a) to reorder by")
+        lat = self.map_ds['yc_a'].values
+        lon = self.map_ds['xc_a'].values
+        self.cell_order = cell_order(lat, lon, self.reorder)
+        # Column j of the new matrix is source cell cell_order[j]
+        self.weights = self.weights[:, self.cell_order].tocsr()
+        self.weights.sort_indices()
+        
+    def _test_field(self):
+        """Smooth field on the source cells used to measure the pruning error."""
+        if 'yc_a' in self.map_ds and 'xc_a' in self.map_ds:
+            lat = self.map_ds['yc_a'].values
+            lon = self.map_ds['xc_a'].values
+            if self.map_ds['yc_a'].attrs.get('units', 'radians') == 'degrees':
+                lat, lon = np.deg2rad(lat), np.deg2rad(lon)
+            return 2.0 + np.cos(lat) * np.cos(lon) + 0.5 * np.sin(2 * lat)
+        return np.cos(np.linspace(0, np.pi, self.weights.shape[1]))
+
+    def _prune_weights(self):
+        """
+        Drops weights whose magnitude is below `prune_tol` and rescales each
+        destination row back to its original sum. The largest weight of a row
+        is always kept so no destination cell loses all of its sources.
+        """
+        original = self.weights
+        row_sum = np.asarray(original.sum(axis=1)).ravel()
+        
+        w = original.tocoo()
+        keep = np.abs(w.data) >= self.prune_tol
+        # Keep the row maximum even if it falls below the tolerance
+        order = np.lexsort((-np.abs(w.data), w.row))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = w.row[order][1:] != w.row[order][:-1]
+        keep[order[first]] = True
         
+        pruned = sp.csr_matrix((w.data[keep], (w.row[keep], w.col[keep])), shape=original.shape)
+        new_sum = np.asarray(pruned.sum(axis=1)).ravel()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = np.where(new_sum != 0, row_sum / new_sum, 1.0)
+        pruned = sp.diags(scale).dot(pruned).tocsr()
+        pruned.sort_indices()
+        
+        field = self._test_field()
+        err = np.abs(pruned.dot(field) - original.dot(field))
+        self.prune_report = {
+            'tolerance': float(self.prune_tol),
+            'nnz_before': int(original.nnz),
+            'nnz_after': int(pruned.nnz),
+            'nnz_reduction': float(1.0 - pruned.nnz / max(original.nnz, 1)),
+            'max_abs_error': float(err.max(initial=0.0)),
+            'max_rel_error': float(err.max(initial=0.0) / max(np.ptp(field), 1e-12)),
+        }
+        self.weights = pruned
+        print(f"Pruned weights below {self.prune_tol}: nnz {original.nnz} -> {pruned.nnz} "
+              f"({self.prune_report['nnz_reduction']:.1%} fewer), "
+              f"max error on test field {self.prune_report['max_abs_error']:.3e}")
+
     def _init_weights(self):
         """Reads weights and creates a sparse matrix."""
         # Load mapping data
@@ -56,63 +243,104 @@ class Regridder:
              dims = self.map_ds.attrs['dst_grid_dims']
              self.dst_shape = (dims[0], dims[1])
 
-    def regrid(self, data_array):
+    def _init_coords(self):
+        """Reads the destination latitude/longitude axes from the mapping file."""
+        # The map file has yc_b (lat) and xc_b (lon) as 1D arrays of size n_b
+        # Assuming row-major ordering for the grid
+        lat_1d = self.map_ds['yc_b'].values
+        lon_1d = self.map_ds['xc_b'].values
+        self.latitude = lat_1d.reshape(self.dst_shape)[:, 0]
+        self.longitude = lon_1d.reshape(self.dst_shape)[0, :]
+
+    def to_cell_order(self, values, axis=-1):
         """
-        Regrids a DataArray from MPAS to ERA5 grid.
+        Permutes an array along its nCells axis into the order of the weight
+        columns (see `reorder`). Doing this once when the input is read lets
+        regrid_values(ordered=True) skip its per-call gather.
+        """
+        if self.cell_order is None:
+            return values
+        return np.take(values, self.cell_order, axis=axis)
+
+    def regrid_values(self, values, out=None, ordered=False):
+        """
+        Regrids a NumPy array from MPAS cells to the ERA5 grid.
         
         Args:
-            data_array (xr.DataArray): Input data with dimension (..., nCells)
-            
+            values (np.ndarray): Input data with shape (..., nCells)
+            out (np.ndarray): Optional array of shape (..., lat, lon) to write
+                the result into, e.g. a slice of a preallocated output variable.
+            ordered (bool): `values` are already in weight column order
+                (see to_cell_order); otherwise they are permuted here.
+                
         Returns:
-            xr.DataArray: Regridded data with dimensions (..., lat, lon)
+            np.ndarray: `out` (or a new array) with shape (..., lat, lon)
         """
-        # Ensure the last dimension is nCells
-        if data_array.dims[-1] != 'nCells':
-            raise ValueError("Last dimension of input data must be 'nCells'")
-            
-        # Flatten input data to (N, nCells) where N is product of other dims
-        input_data = data_array.values
-        original_shape = input_data.shape
-        n_cells = original_shape[-1]
+        values = np.asarray(values)
+        leading_shape = values.shape[:-1]
+        n_cells = values.shape[-1]
         
         if n_cells != self.weights.shape[1]:
              raise ValueError(f"Input nCells ({n_cells}) does not match mapping source size ({self.weights.shape[1]})")
+             
+        if out is None:
+            out = np.empty(leading_shape + self.dst_shape, dtype=np.result_type(values.dtype, self.weights.dtype))
+        elif out.shape != leading_shape + self.dst_shape:
+            raise ValueError(f"Output shape {out.shape} does not match {leading_shape + self.dst_shape}")
 
         # Reshape to 2D for matrix multiplication: (Samples, nCells)
-        input_flat = input_data.reshape(-1, n_cells)
+        input_flat = values.reshape(-1, n_cells)
         
-        # Apply weights: (Samples, n_b) = (Samples, n_a) * (n_a, n_b)^T 
-        # Or rather: Output = Weights * Input^T ? 
-        # Weights is (n_b, n_a). Input is (Samples, n_a).
-        # We want (Samples, n_b).
-        # So: (Weights * Input.T).T -> (n_b, Samples).T -> (Samples, n_b)
-        # Or: Input * Weights.T -> (Samples, n_a) * (n_a, n_b) -> (Samples, n_b)
+        # Apply the same cell permutation as the weight columns
+        if self.cell_order is not None and not ordered:
+            input_flat = input_flat[:, self.cell_order]
         
-        output_flat = self.weights.dot(input_flat.T).T
+        samples = list(np.ndindex(*leading_shape))
+        w = self.weights
         
-        # Reshape back to original dimensions + lat, lon
-        new_shape = original_shape[:-1] + self.dst_shape
-        output_data = output_flat.reshape(new_shape)
+        def regrid_range(lo, hi):
+            # One SpMV per sample (field), written straight into its (lat, lon)
+            # slice of `out`, so no temporary the size of the output is made
+            for i in range(lo, hi):
+                target = out[samples[i]]
+                if csr_matvec is not None and target.flags.c_contiguous and target.dtype == w.dtype:
+                    flat = target.reshape(-1)
+                    flat[...] = 0
+                    x = np.ascontiguousarray(input_flat[i], dtype=w.dtype)
+                    csr_matvec(w.shape[0], w.shape[1], w.indptr, w.indices, w.data, x, flat)
+                else:
+                    # Non-contiguous view (a reshape would silently copy) or other dtype
+                    target[...] = w.dot(input_flat[i]).reshape(self.dst_shape)
+                
+        n_threads = min(self.threads, len(samples))
+        if n_threads > 1:
+            bounds = np.linspace(0, len(samples), n_threads + 1).astype(int)
+            with ThreadPoolExecutor(max_workers=n_threads) as pool:
+                list(pool.map(regrid_range, bounds[:-1], bounds[1:]))
+        else:
+            regrid_range(0, len(samples))
+            
+        return out
+
+    def regrid(self, data_array):
+        """
+        Regrids a DataArray from MPAS to ERA5 grid.
         
-        # Create new coordinates
-        # We might want to attach lat/lon coords from the mapping file if available
-        # For now, returning a DataArray with generic dims or copying coords if possible
+        Args:
+            data_array (xr.DataArray): Input data with dimension (..., nCells)
+            
+        Returns:
+            xr.DataArray: Regridded data with dimensions (..., lat, lon)
+        """
+        # Ensure the last dimension is nCells
+        if data_array.dims[-1] != 'nCells':
+            raise ValueError("Last dimension of input data must be 'nCells'")
+            
+        output_data = self.regrid_values(data_array.values)
         
         coords = {k: v for k, v in data_array.coords.items() if 'nCells' not in v.dims}
-        
-        # Add lat/lon coords if we can extract them from map file or generate them
-        # The map file has yc_b (lat) and xc_b (lon) as 1D arrays of size n_b
-        # We can reshape them to (lat, lon)
-        
-        lat_1d = self.map_ds['yc_b'].values
-        lon_1d = self.map_ds['xc_b'].values
-        
-        # Assuming row-major ordering for the grid
-        lat = lat_1d.reshape(self.dst_shape)[:, 0]
-        lon = lon_1d.reshape(self.dst_shape)[0, :]
-        
-        coords['latitude'] = lat
-        coords['longitude'] = lon
+        coords['latitude'] = self.latitude
+        coords['longitude'] = self.longitude
         
         dims = list(data_array.dims[:-1]) + ['latitude', 'longitude']
         
@@ -53,3 +53,202 @@ def compute_stats(input_data, output_dir):
             name='latitude_weight'
         )
         weights_2d.to_netcdf(os.path.join(output_dir, 'era5_static.nc'))
+
+# Default quantiles written to era5_quantiles.nc
+QUANTILES = [0.001, 0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99, 0.999]
+
+# Fixed histogram ranges per output variable. Values outside the range are
+# still counted (in under/overflow bins) and quantiles falling there are
+# interpolated towards the tracked min/max.
+HISTOGRAM_RANGES = {
+    'SP': (85000.0, 110000.0),
+    't2m': (180.0, 340.0),
+    'U500': (-100.0, 100.0),
+    'V500': (-100.0, 100.0),
+    'T500': (200.0, 290.0),
+    'Z500': (45000.0, 60000.0),
+    'Q500': (0.0, 0.01),
+    'U': (-150.0, 150.0),
+    'V': (-150.0, 150.0),
+    'T': (170.0, 330.0),
+    'Q': (0.0, 0.04),
+}
+
+class HistogramSketch:
+    """
+    Mergeable fixed-bin histograms per variable and level.
+    
+    The sketch is updated with arrays that are already in memory (e.g. each
+    converted file) so percentiles and histograms of the full record can be
+    produced without re-reading the combined store. Two sketches with the same
+    bins can be merged, which makes it usable across files or processes.
+    """
+    
+    def __init__(self, n_bins=2048, ranges=None):
+        self.n_bins = n_bins
+        self.ranges = dict(HISTOGRAM_RANGES)
+        if ranges:
+            self.ranges.update(ranges)
+        # name -> dict(levels, edges, counts, vmin, vmax, n_nan)
+        self.variables = {}
+        
+    def is_empty(self):
+        return not self.variables
+        
+    def _get_state(self, name, levels, sample):
+        state = self.variables.get(name)
+        if state is None:
+            if name in self.ranges:
+                lo, hi = self.ranges[name]
+            else:
+                # Unknown variable: derive a padded range from the first data seen
+                finite = sample[np.isfinite(sample)]
+                lo, hi = (float(finite.min()), float(finite.max())) if finite.size else (0.0, 1.0)
+                pad = 0.5 * (hi - lo) or 1.0
+                lo, hi = lo - pad, hi + pad
+            n_lev = len(levels)
+            state = {
+                'levels': list(levels),
+                'edges': np.linspace(lo, hi, self.n_bins + 1),
+                # Bin 0 is underflow, bin n_bins + 1 is overflow
+                'counts': np.zeros((n_lev, self.n_bins + 2), dtype=np.int64),
+                'vmin': np.full(n_lev, np.inf),
+                'vmax': np.full(n_lev, -np.inf),
+                'n_nan': np.zeros(n_lev, dtype=np.int64),
+            }
+            self.variables[name] = state
+        return state
+        
+    def _level_index(self, state, level):
+        if level not in state['levels']:
+            state['levels'].append(level)
+            state['counts'] = np.vstack([state['counts'], np.zeros((1, self.n_bins + 2), dtype=np.int64)])
+            state['vmin'] = np.append(state['vmin'], np.inf)
+            state['vmax'] = np.append(state['vmax'], -np.inf)
+            state['n_nan'] = np.append(state['n_nan'], 0)
+        return state['levels'].index(level)
+        
+    def update(self, name, data, level=None):
+        """Adds the values of one variable (at one level) to the sketch."""
+        data = np.asarray(data)
+        state = self._get_state(name, [level], data)
+        k = self._level_index(state, level)
+        
+        valid = np.isfinite(data)
+        values = data[valid]
+        state['n_nan'][k] += data.size - values.size
+        if values.size == 0:
+            return
+            
+        lo = state['edges'][0]
+        hi = state['edges'][-1]
+        idx = np.floor((values - lo) * (self.n_bins / (hi - lo))).astype(np.int64) + 1
+        np.clip(idx, 0, self.n_bins + 1, out=idx)
+        state['counts'][k] += np.bincount(idx, minlength=self.n_bins + 2)
+        state['vmin'][k] = min(state['vmin'][k], values.min())
+        state['vmax'][k] = max(state['vmax'][k], values.max())
+        
+    def update_dataset(self, ds):
+        """Adds every data variable of a converted dataset, level by level."""
+        for name in ds.data_vars:
+            da = ds[name]
+            if 'level' in da.dims:
+                for lvl in da['level'].values:
+                    self.update(name, da.sel(level=lvl).values, level=lvl.item())
+            else:
+                self.update(name, da.values)
+                
+    def merge(self, other):
+        """Merges another sketch with identical bins into this one."""
+        for name, o in other.variables.items():
+            if name not in self.variables:
+                self.variables[name] = {k: (v.copy() if hasattr(v, 'copy') else v) for k, v in o.items()}
+                continue
+            state = self.variables[name]
+            if not np.array_equal(state['edges'], o['edges']):
+                raise ValueError(f"Cannot merge sketches with different bins for {name}")
+            for j, lvl in enumerate(o['levels']):
+                k = self._level_index(state, lvl)
+                state['counts'][k] += o['counts'][j]
+                state['n_nan'][k] += o['n_nan'][j]
+                state['vmin'][k] = min(state['vmin'][k], o['vmin'][j])
+                state['vmax'][k] = max(state['vmax'][k], o['vmax'][j])
+        return self
+        
+    def quantiles(self, name, qs=QUANTILES):
+        """
+        Estimates quantiles from the histogram of a variable.
+        
+        Returns:
+            np.ndarray: (n_levels, len(qs)), NaN for levels without data.
+        """
+        state = self.variables[name]
+        edges = state['edges']
+        out = np.full((len(state['levels']), len(qs)), np.nan)
+        for k in range(len(state['levels'])):
+            counts = state['counts'][k]
+            total = counts.sum()
+            if total == 0:
+                continue
+            vmin, vmax = state['vmin'][k], state['vmax'][k]
+            # Bin boundaries including the open-ended under/overflow bins
+            bounds = np.concatenate([[min(vmin, edges[0])], edges, [max(vmax, edges[-1])]])
+            cum = np.concatenate([[0], np.cumsum(counts)])
+            targets = np.asarray(qs) * total
+            vals = np.interp(targets, cum, bounds)
+            out[k] = np.clip(vals, vmin, vmax)
+        return out
+        
+    def to_dataset(self, qs=QUANTILES):
+        """Builds the era5_quantiles dataset: quantiles, histograms and bin edges."""
+        arrays = {}
+        for name, state in self.variables.items():
+            quant = self.quantiles(name, qs)
+            per_level = {
+                f'{name}_histogram': state['counts'][:, 1:-1],
+                f'{name}_underflow': state['counts'][:, 0],
+                f'{name}_overflow': state['counts'][:, -1],
+                f'{name}_min': state['vmin'],
+                f'{name}_max': state['vmax'],
+                f'{name}_nan_count': state['n_nan'],
+            }
+            if state['levels'] != [None]:
+                coords = {'level': state['levels']}
+                arrays[name] = xr.DataArray(quant.T, dims=('quantile', 'level'), coords={'quantile': qs, **coords})
+                for key, values in per_level.items():
+                    dims = ('level', 'bin') if values.ndim == 2 else ('level',)
+                    arrays[key] = xr.DataArray(values, dims=dims, coords=coords)
+            else:
+                arrays[name] = xr.DataArray(quant[0], dims=('quantile',), coords={'quantile': qs})
+                for key, values in per_level.items():
+                    arrays[key] = xr.DataArray(values[0], dims=('bin',) if values.ndim == 2 else ())
+            arrays[f'{name}_bin_edges'] = xr.DataArray(state['edges'], dims=('bin_edge',))
+        return xr.Dataset(arrays)
+
+def compute_quantiles(input_data, output_dir, sketch=None):
+    """
+    Writes era5_quantiles.nc from a streaming histogram sketch.
+    
+    If no (or an empty) sketch is given, one is built by streaming over the
+    dataset one time step at a time, so memory stays bounded by a single
+    initialization time rather than the full store.
+    """
+    if sketch is None or sketch.is_empty():
+        if isinstance(input_data, (str, os.PathLike)):
+            if str(input_data).endswith('.nc'):
+                ds = xr.open_dataset(input_data)
+            else:
+                ds = xr.open_zarr(input_data)
+        else:
+            ds = input_data
+            
+        sketch = sketch if sketch is not None else HistogramSketch()
+        if 'time' in ds.dims:
+            for i in range(ds.sizes['time']):
+                sketch.update_dataset(ds.isel(time=i).load())
+        else:
+            sketch.update_dataset(ds.load())
+            
+    output_path = os.path.join(output_dir, 'era5_quantiles.nc')
+    sketch.to_dataset().to_netcdf(output_path)
+    return output_path
@@ -0,0 +1,96 @@
+import numpy as np
+
+# ERA5 pressure levels (hPa)
+ERA5_LEVELS = [
+    1, 2, 3, 5, 7, 10, 20, 30, 50, 70, 100, 125, 150, 175, 200, 225, 250, 300, 350,
+    400, 450, 500, 550, 600, 650, 700, 750, 775, 800, 825, 850, 875, 900, 925, 950, 975, 1000
+]
+
+# ERA5 variable <- MPAS native-level variable (Time, nCells, nVertLevels)
+NATIVE_VARIABLES = [
+    ('U', 'uReconstructZonal'),
+    ('V', 'uReconstructMeridional'),
+    ('T', 'theta'),
+    ('Q', 'qv'),
+]
+
+# Dry air gas constant over specific heat, and reference pressure for theta
+RD_CP = 287.0 / 1004.5
+P0 = 100000.0
+
+def native_pressure_variables(ds):
+    """Names of the variables making up the native-level pressure of an MPAS dataset, or None."""
+    if 'pressure' in ds:
+        return ['pressure']
+    if 'pressure_p' in ds and 'pressure_base' in ds:
+        return ['pressure_p', 'pressure_base']
+    return None
+
+def native_pressure(ds, time_slice):
+    """
+    Native-level pressure (Pa) of some forecast steps, (Time, nCells, nVertLevels).
+
+    Only the requested steps are read, so the perturbation and base pressure
+    are never summed over the whole file at once.
+    """
+    pressure = None
+    for name in native_pressure_variables(ds):
+        values = ds[name].isel(Time=time_slice).transpose('Time', 'nCells', 'nVertLevels').values
+        pressure = values if pressure is None else pressure + values
+    return pressure
+
+def theta_to_temperature(theta, pressure_pa):
+    """T = theta * (p / p0) ** (Rd / cp)"""
+    return theta * (pressure_pa / P0) ** RD_CP
+
+def mixing_ratio_to_specific_humidity(qv):
+    """q = qv / (1 + qv)"""
+    return qv / (1.0 + qv)
+
+def interp_to_pressure(fields, pressure, levels_pa, extrapolate=False):
+    """
+    Interpolates column fields from native model levels to pressure levels.
+
+    All columns are handled at once: for each target level the bracketing
+    model levels are found with a vectorized count over the column (pressure
+    decreases with level index), and values are interpolated linearly in
+    log-pressure. The only Python loop is over the target levels.
+
+    Args:
+        fields (dict): name -> np.ndarray (nColumns, nVertLevels).
+        pressure (np.ndarray): Pressure (Pa), (nColumns, nVertLevels),
+            monotonically decreasing along the last axis.
+        levels_pa (sequence): Target pressure levels (Pa).
+        extrapolate (bool): Extrapolate linearly in log-pressure from the
+            nearest two levels instead of returning NaN outside the column.
+
+    Returns:
+        dict: name -> np.ndarray (nLevels, nColumns)
+    """
+    n_columns, n_vert = pressure.shape
+    log_p = np.log(pressure)
+    rows = np.arange(n_columns)
+
+    out = {name: np.empty((len(levels_pa), n_columns), dtype=np.result_type(f.dtype, np.float32))
+           for name, f in fields.items()}
+
+    for k, target in enumerate(levels_pa):
+        # Number of model levels at or below the target (higher pressure)
+        below = np.count_nonzero(pressure >= target, axis=1)
+        lower = np.clip(below - 1, 0, n_vert - 2)
+        upper = lower + 1
+
+        lp_lo = log_p[rows, lower]
+        lp_hi = log_p[rows, upper]
+        weight = (np.log(target) - lp_lo) / (lp_hi - lp_lo)
+
+        outside = (below == 0) | (below == n_vert)
+
+        for name, f in fields.items():
+            lo_val = f[rows, lower]
+            value = lo_val + weight * (f[rows, upper] - lo_val)
+            if not extrapolate:
+                value[outside] = np.nan
+            out[name][k] = value
+
+    return out
@@ -0,0 +1,250 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import xarray as xr
+from .loader import load_mpas_dataset
+from .converter import G, LEVELS, SURFACE_VARIABLES, LEVEL_VARIABLES, calculate_specific_humidity
+
+class LRUCache:
+    """Thread-safe LRU cache of NumPy arrays bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._items:
+                return
+            if value.nbytes > self.max_bytes:
+                return
+            self._items[key] = value
+            self.nbytes += value.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def __len__(self):
+        return len(self._items)
+
+class VirtualVariable:
+    """One ERA5 variable of a VirtualERA5Dataset, indexed like a NumPy array."""
+
+    def __init__(self, dataset, name, dims, shape, levels=None):
+        self.dataset = dataset
+        self.name = name
+        self.dims = dims
+        self.shape = shape
+        self.levels = levels
+
+    @property
+    def ndim(self):
+        return len(self.dims)
+
+    def __getitem__(self, key):
+        """
+        Reads and regrids only the indexed (time, forecast[, level]) fields.
+
+        Integers, slices and integer lists are supported per dimension;
+        integer indices drop their dimension as in NumPy.
+        """
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > self.ndim:
+            raise IndexError(f"Too many indices for {self.name} with dims {self.dims}")
+        key = key + (slice(None),) * (self.ndim - len(key))
+
+        indices = []
+        for k, n in zip(key, self.shape):
+            if isinstance(k, slice):
+                indices.append(np.arange(n)[k])
+            else:
+                idx = np.arange(n)[k]
+                indices.append(np.atleast_1d(idx))
+        field_idx, (lat_idx, lon_idx) = indices[:-2], indices[-2:]
+
+        out = np.empty([len(i) for i in field_idx] + [len(lat_idx), len(lon_idx)])
+        for pos in np.ndindex(*out.shape[:-2]):
+            t, f = field_idx[0][pos[0]], field_idx[1][pos[1]]
+            level = self.levels[field_idx[2][pos[2]]] if self.levels is not None else None
+            field = self.dataset._field(int(t), self.name, level, int(f))
+            out[pos] = field[np.ix_(lat_idx, lon_idx)]
+
+        drop = tuple(i for i, k in enumerate(key) if not isinstance(k, (slice, list, np.ndarray)))
+        return out.squeeze(axis=drop) if drop else out
+
+    def isel(self, **indexers):
+        """Positional selection by dimension name returning a labelled DataArray."""
+        key = tuple(indexers.get(d, slice(None)) for d in self.dims)
+        values = self[key]
+        coords = {}
+        dims = []
+        for d, k in zip(self.dims, key):
+            labels = self.dataset.coords[d] if d != 'level' else np.asarray(self.levels)
+            coords[d] = labels[k]
+            if isinstance(k, (slice, list, np.ndarray)):
+                dims.append(d)
+        return xr.DataArray(values, dims=dims, coords=coords, name=self.name)
+
+class VirtualERA5Dataset:
+    """
+    Read-only ERA5-shaped view over raw MPAS diag files.
+
+    Exposes the variable names and (time, forecast, [level,] latitude,
+    longitude) layout that Converter writes, with one 'time' entry per input
+    file. Nothing is converted up front: indexing a variable reads and
+    regrids only the requested fields, and regridded fields are kept in an
+    LRU cache bounded by `cache_bytes`.
+    """
+
+    def __init__(self, input_files, regridder, cache_bytes=2 * 1024 ** 3):
+        """
+        Args:
+            input_files (list): MPAS diag files, one initialization time each.
+            regridder (Regridder): Prepared regridder (latitude, longitude, regrid_values).
+            cache_bytes (int): Memory cap of the regridded-field cache.
+        """
+        self.input_files = list(input_files)
+        self.regridder = regridder
+        self.cache = LRUCache(cache_bytes)
+        self._handles = {}
+        self._io_lock = threading.Lock()
+
+        init_times = []
+        n_forecast = 0
+        present = None
+        for i in range(len(self.input_files)):
+            ds = self._open(i)
+            init_times.append(ds['Time'].values[0])
+            n_forecast = max(n_forecast, ds.sizes['Time'])
+            names = set(ds.data_vars)
+            present = names if present is None else present & names
+
+        self.coords = {
+            'time': np.array(init_times),
+            'forecast': np.arange(n_forecast),
+            'latitude': np.asarray(regridder.latitude),
+            'longitude': np.asarray(regridder.longitude),
+        }
+        self._build_variables(present or set())
+
+    def _build_variables(self, present):
+        """Variables available in every file, following Converter.convert()."""
+        n_lat, n_lon = len(self.coords['latitude']), len(self.coords['longitude'])
+        head = (len(self.coords['time']), len(self.coords['forecast']))
+        surface_dims = ('time', 'forecast', 'latitude', 'longitude')
+        level_dims = ('time', 'forecast', 'level', 'latitude', 'longitude')
+
+        # ERA5 name -> (MPAS variable, how the regridded field is derived)
+        self._sources = {}
+        for var_name, mpas_var in SURFACE_VARIABLES:
+            if mpas_var in present:
+                self._sources[var_name] = (mpas_var, None)
+        if 'height_500hPa' in present:
+            self._sources['Z500'] = ('height_500hPa', 'geopotential')
+        if 'relhum_500hPa' in present and 'temperature_500hPa' in present:
+            self._sources['Q500'] = ('relhum_500hPa', 'humidity')
+
+        self.data_vars = {}
+        for var_name in self._sources:
+            self.data_vars[var_name] = VirtualVariable(self, var_name, surface_dims, head + (n_lat, n_lon))
+
+        for var_name, prefix in LEVEL_VARIABLES:
+            levels = [lvl for lvl in LEVELS if f"{prefix}_{lvl}hPa" in present]
+            if var_name == 'Q':
+                levels = [lvl for lvl in levels if f"temperature_{lvl}hPa" in present]
+            if levels:
+                self._sources[var_name] = (prefix, 'humidity' if var_name == 'Q' else None)
+                self.data_vars[var_name] = VirtualVariable(
+                    self, var_name, level_dims, head + (len(levels), n_lat, n_lon), levels=levels
+                )
+
+    def _open(self, file_idx):
+        if file_idx not in self._handles:
+            self._handles[file_idx] = load_mpas_dataset(self.input_files[file_idx])
+        return self._handles[file_idx]
+
+    def _read(self, file_idx, mpas_var, step):
+        """Reads one forecast step of an MPAS variable, or None past the file's end."""
+        with self._io_lock:
+            ds = self._open(file_idx)
+            if step >= ds.sizes['Time']:
+                return None
+            return ds[mpas_var].isel(Time=step).values
+
+    def _field(self, file_idx, name, level, step):
+        """Regridded (latitude, longitude) field of one variable, level and forecast step."""
+        key = (file_idx, name, level, step)
+        field = self.cache.get(key)
+        if field is not None:
+            return field
+
+        source, derive = self._sources[name]
+        mpas_var = f"{source}_{level}hPa" if level is not None else source
+        values = self._read(file_idx, mpas_var, step)
+        if values is None:
+            field = np.full((len(self.coords['latitude']), len(self.coords['longitude'])), np.nan)
+        else:
+            field = self.regridder.regrid_values(values)
+            if derive == 'geopotential':
+                field *= G
+            elif derive == 'humidity':
+                lvl = level if level is not None else 500
+                temperature = self._temperature(file_idx, lvl, step)
+                field = calculate_specific_humidity(field, temperature, lvl * 100.0)
+
+        self.cache.put(key, field)
+        return field
+
+    def _temperature(self, file_idx, level, step):
+        """Regridded temperature used to derive Q at a pressure level."""
+        if 'T' in self.data_vars and level in self.data_vars['T'].levels:
+            return self._field(file_idx, 'T', level, step)
+        return self._field(file_idx, 'T500', None, step)
+
+    def __getitem__(self, name):
+        return self.data_vars[name]
+
+    def __contains__(self, name):
+        return name in self.data_vars
+
+    @property
+    def sizes(self):
+        sizes = {d: len(v) for d, v in self.coords.items()}
+        for var in self.data_vars.values():
+            if var.levels is not None:
+                sizes['level'] = len(var.levels)
+        return sizes
+
+    def isel(self, **indexers):
+        """Materializes a positional selection of all variables as an xr.Dataset."""
+        out = xr.Dataset()
+        for name, var in self.data_vars.items():
+            out[name] = var.isel(**{d: k for d, k in indexers.items() if d in var.dims})
+        return out
+
+    def close(self):
+        with self._io_lock:
+            for ds in self._handles.values():
+                ds.close()
+            self._handles.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,86 @@
+import pytest
+import xarray as xr
+import numpy as np
+import sys
+from src.compare import compare_stores, open_store, _blocks, main
+
+def _store(path, t_offset=0.0, nan_at=None):
+    rng = np.random.default_rng(0)
+    T = rng.uniform(200, 300, (1, 4, 2, 3, 5))
+    T[0, 2] += t_offset
+    sp = rng.uniform(95000, 105000, (1, 4, 3, 5))
+    if nan_at is not None:
+        sp[nan_at] = np.nan
+    ds = xr.Dataset(
+        {
+            'T': (('time', 'forecast', 'level', 'latitude', 'longitude'), T),
+            'SP': (('time', 'forecast', 'latitude', 'longitude'), sp),
+        },
+        coords={'forecast': np.arange(4), 'level': [500, 850]}
+    )
+    if str(path).endswith('.nc'):
+        ds.to_netcdf(path)
+    else:
+        ds.chunk({'forecast': 1}).to_zarr(path, consolidated=False)
+    return path
+
+def test_identical_stores(tmp_path):
+    a = _store(tmp_path / "a.zarr")
+    b = _store(tmp_path / "b.nc")
+
+    results = compare_stores(str(a), str(b), workers=2)
+
+    for name in ['T', 'SP']:
+        assert results[name]['passed']
+        assert results[name]['max_abs'] == 0.0
+        assert results[name]['rmse'] == 0.0
+    assert results['T']['count'] == 4 * 2 * 3 * 5
+
+def test_differences_and_tolerances(tmp_path):
+    a = _store(tmp_path / "a.zarr")
+    b = _store(tmp_path / "b.zarr", t_offset=0.5, nan_at=(0, 1, 0, 0))
+
+    strict = compare_stores(str(a), str(b), atol=0.1, block_size=2)
+    assert not strict['T']['passed']
+    assert strict['T']['max_abs'] == pytest.approx(0.5)
+    assert strict['T']['exceeding'] == 2 * 3 * 5
+    assert strict['T']['rmse'] == pytest.approx(0.5 / 2)
+    assert strict['SP']['nan_mismatch'] == 1
+    assert not strict['SP']['passed']
+
+    loose = compare_stores(str(a), str(b), variables=['T'], atol=0.6)
+    assert loose['T']['passed']
+    assert list(loose) == ['T']
+
+def test_blocks_follow_chunk_grid(tmp_path):
+    zarr_T = open_store(str(_store(tmp_path / "a.zarr")))['T']
+    nc_T = open_store(str(_store(tmp_path / "b.nc")))['T']
+
+    # One block per zarr chunk (forecast chunked by 1, levels together), whole lat/lon
+    blocks = _blocks(zarr_T)
+    assert len(blocks) == 4
+    assert blocks[1] == {'time': slice(0, 1), 'forecast': slice(1, 2), 'level': slice(0, 2)}
+    # Contiguous NetCDF is split per entry
+    assert len(_blocks(nc_T)) == 4 * 2
+    assert len(_blocks(zarr_T, block_size=2)) == 2
+
+def test_difference_in_one_of_many_blocks(tmp_path):
+    a = _store(tmp_path / "a.zarr")
+    b = _store(tmp_path / "b.zarr", t_offset=0.5)
+
+    results = compare_stores(str(a), str(b), variables=['T'], atol=0.1, workers=3)
+
+    # Only the forecast step 2 block differs
+    assert results['T']['count'] == 4 * 2 * 3 * 5
+    assert results['T']['exceeding'] == 2 * 3 * 5
+    assert results['T']['max_abs'] == pytest.approx(0.5)
+
+def test_cli_exit_code(tmp_path, monkeypatch, capsys):
+    a = _store(tmp_path / "a.zarr")
+    b = _store(tmp_path / "b.zarr", t_offset=0.5)
+
+    monkeypatch.setattr(sys, 'argv', ['compare', str(a), str(b), '--variables', 'T', '--atol', '0.1'])
+    with pytest.raises(SystemExit) as exc:
+        main()
+    assert exc.value.code == 1
+    assert 'FAIL' in capsys.readouterr().out
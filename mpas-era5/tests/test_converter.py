@@ -3,35 +3,29 @@ import xarray as xr
 import numpy as np
 import pandas as pd
 import os
+import json
 from src.converter import Converter
+from src.stats import HistogramSketch
 
 # Mock Regridder
 class MockRegridder:
     def __init__(self, map_file):
-        pass
+        # 2x2 lat/lon destination grid
+        self.latitude = np.array([0, 1])
+        self.longitude = np.array([0, 1])
+        self.cell_order = None
         
-    def regrid(self, da):
-        # Return a dummy DataArray with lat/lon dims
-        # Input has (Time, nCells) or (nCells)
-        # Output should have (Time, lat, lon)
+    def to_cell_order(self, values, axis=-1):
+        return values
         
-        dims = list(da.dims)
-        if 'nCells' in dims:
-            dims.remove('nCells')
-        
-        dims = dims + ['latitude', 'longitude']
-        
-        # Create dummy shape
-        shape = [da.sizes[d] for d in dims if d in da.dims] + [2, 2] # 2x2 lat/lon
-        
-        # Handle case where da.dims doesn't match shape construction exactly due to remove
-        # Simpler: just use the input values mean or something
-        
-        coords = {d: da.coords[d] for d in dims if d in da.coords}
-        coords['latitude'] = [0, 1]
-        coords['longitude'] = [0, 1]
-        
-        return xr.DataArray(np.zeros(shape), dims=dims, coords=coords)
+    def regrid_values(self, values, out=None, ordered=False):
+        # Input has (Time, nCells); output should have (Time, lat, lon)
+        shape = values.shape[:-1] + (2, 2)
+        if out is None:
+            out = np.empty(shape)
+        assert out.shape == shape
+        out[...] = 0
+        return out
 
 @pytest.fixture
 def mock_regridder(monkeypatch):
@@ -65,6 +59,12 @@ def test_converter_process(tmp_path, mock_regridder):
     assert 'time' in ds_out.dims
     assert 'forecast' in ds_out.dims
     assert ds_out['SP'].dims == ('time', 'forecast', 'latitude', 'longitude')
+    
+    # QA summary written next to the output from the in-memory arrays
+    with open(os.path.join(output_dir, "era5_converted_2021010100.qa.json")) as f:
+        qa = json.load(f)
+    assert qa['status'] == 'ok'
+    assert qa['variables']['SP']['max'] == 0.0
 
 def test_forecast_dimension_standardization(tmp_path, mock_regridder):
     """
@@ -122,3 +122,52 @@ def test_forecast_dimension_standardization(tmp_path, mock_regridder):
     times = pd.to_datetime(combined.time.values)
     assert (times.year == 2021).all(), f"Years should be 2021, got {times.year}"
 
+
+def test_converter_packed_encoding_report(tmp_path, mock_regridder):
+    input_path = tmp_path / "mpas_in.nc"
+    xr.Dataset(
+        {
+            't2m': (('Time', 'nCells'), np.random.rand(1, 10)),
+            'xtime': (('Time',), np.array([b'2021-01-01_00:00:00   ']))
+        },
+        coords={'Time': [0]}
+    ).to_netcdf(input_path)
+
+    output_dir = tmp_path / "output"
+    os.makedirs(output_dir)
+
+    converter = Converter("dummy_map.nc", str(output_dir), encoding='packed')
+    out_path = converter.process_file(str(input_path), output_format='zarr')
+
+    ds_out = xr.open_zarr(out_path)
+    assert ds_out['t2m'].encoding['dtype'] == np.int16
+    report_path = output_dir / "era5_converted_2021010100.encoding.json"
+    assert os.path.exists(report_path)
+    # The mock regridder returns zeros, far below the packed t2m range
+    with open(report_path) as f:
+        report = json.load(f)
+    assert report['t2m']['clipped'] == 4
+
+
+def test_sketch_sees_values_before_encoding(tmp_path, mock_regridder):
+    input_path = tmp_path / "mpas_in.nc"
+    xr.Dataset(
+        {
+            't2m': (('Time', 'nCells'), np.random.rand(1, 10)),
+            'xtime': (('Time',), np.array([b'2021-01-01_00:00:00   ']))
+        },
+        coords={'Time': [0]}
+    ).to_netcdf(input_path)
+
+    output_dir = tmp_path / "output"
+    os.makedirs(output_dir)
+
+    sketch = HistogramSketch()
+    converter = Converter("dummy_map.nc", str(output_dir), sketch=sketch, encoding='packed')
+    converter.process_file(str(input_path), output_format='zarr')
+
+    # Packing clips the mock's zeros to the bottom of the t2m range; the
+    # sketch must record the converted zeros, not the written values
+    state = sketch.variables['t2m']
+    assert state['vmin'][0] == 0.0
+    assert state['vmax'][0] == 0.0
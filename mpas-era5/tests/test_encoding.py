@@ -0,0 +1,89 @@
+import pytest
+import xarray as xr
+import numpy as np
+from src.encoding import (
+    PRECISION, bitround, keepbits_for, packing_parameters, encode_dataset, summarize_reports
+)
+
+def _dataset():
+    rng = np.random.default_rng(0)
+    shape = (1, 2, 3, 4, 5)
+    return xr.Dataset(
+        {
+            'T': (('time', 'forecast', 'level', 'latitude', 'longitude'), rng.uniform(200, 300, shape)),
+            'U': (('time', 'forecast', 'level', 'latitude', 'longitude'), rng.uniform(-50, 50, shape)),
+            'SP': (('time', 'forecast', 'latitude', 'longitude'), rng.uniform(95000, 105000, (1, 2, 4, 5))),
+        },
+        coords={'level': [500, 700, 850], 'forecast': [0, 1]}
+    )
+
+def test_packing_parameters_meet_precision():
+    for name in PRECISION:
+        scale, offset = packing_parameters(name)
+        assert scale / 2 <= PRECISION[name][2]
+
+def test_bitround_within_precision():
+    values = np.random.default_rng(1).uniform(150, 350, 1000)
+    keepbits = keepbits_for('T')
+    rounded = bitround(values, keepbits)
+
+    assert rounded.dtype == np.float32
+    assert np.max(np.abs(rounded - values)) <= PRECISION['T'][2]
+    # Dropped mantissa bits are zero
+    assert not (rounded.view(np.uint32) & np.uint32((1 << (23 - keepbits)) - 1)).any()
+    assert np.isnan(bitround(np.array([np.nan, 1.0]), 10)[0])
+
+@pytest.mark.parametrize("mode", ["packed", "bitround"])
+def test_encode_dataset_roundtrip(tmp_path, mode):
+    ds = _dataset()
+    original = ds.copy(deep=True)
+
+    encoded, encoding, report = encode_dataset(ds, mode, 'netcdf')
+    path = tmp_path / "out.nc"
+    encoded.to_netcdf(path, encoding=encoding)
+
+    decoded = xr.open_dataset(path)
+    for name in ['T', 'U', 'SP']:
+        err = np.max(np.abs(decoded[name].values - original[name].values))
+        assert err <= PRECISION[name][2]
+        assert report[name]['within_precision']
+        assert report[name]['max_abs_error'] == pytest.approx(err, rel=1e-3, abs=1e-6)
+    if mode == 'packed':
+        assert decoded['T'].encoding['dtype'] == np.int16
+
+def test_encode_dataset_reports_clipping():
+    ds = _dataset()
+    ds['T'][0, 0, 0, 0, 0] = 400.0
+
+    _, _, report = encode_dataset(ds, 'packed')
+
+    assert report['T']['clipped'] == 1
+    assert not report['T']['within_precision']
+
+def test_packed_out_of_range_values_saturate(tmp_path):
+    ds = _dataset()
+    ds['T'][0, 0, 0, 0, 0] = 400.0
+    ds['T'][0, 0, 0, 0, 1] = 0.0
+    original = ds.copy(deep=True)
+
+    encoded, encoding, report = encode_dataset(ds, 'packed')
+    encoded.to_zarr(tmp_path / "out.zarr", encoding=encoding)
+
+    decoded = xr.open_zarr(tmp_path / "out.zarr")['T'].values
+    vmin, vmax, precision = PRECISION['T']
+    # Clipped to the packable range instead of wrapping around in the int16 cast
+    assert decoded[0, 0, 0, 0, 0] == pytest.approx(vmax, abs=precision)
+    assert decoded[0, 0, 0, 0, 1] == pytest.approx(vmin, abs=precision)
+    assert report['T']['clipped'] == 2
+    err = np.max(np.abs(decoded - original['T'].values))
+    assert report['T']['max_abs_error'] == pytest.approx(err, rel=1e-3)
+
+def test_summarize_reports():
+    _, _, r1 = encode_dataset(_dataset(), 'packed')
+    _, _, r2 = encode_dataset(_dataset(), 'packed')
+
+    summary = summarize_reports([r1, r2])
+
+    assert summary['T']['count'] == 2 * r1['T']['count']
+    assert summary['T']['max_abs_error'] == max(r1['T']['max_abs_error'], r2['T']['max_abs_error'])
+    assert summary['T']['rmse'] == pytest.approx(r1['T']['rmse'])
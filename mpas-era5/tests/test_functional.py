@@ -2,6 +2,9 @@ import pytest
 import xarray as xr
 import numpy as np
 import os
+import sys
+import json
+from unittest.mock import MagicMock
 from src.converter import Converter
 from src.stats import compute_stats
 
@@ -61,3 +64,90 @@ def test_functional_full_flow(tmp_path):
     assert os.path.exists(output_dir / "era5_mean.nc")
     assert os.path.exists(output_dir / "era5_std.nc")
     assert os.path.exists(output_dir / "era5_static.nc")
+
+def test_functional_level_variables(tmp_path):
+    from src.converter import calculate_specific_humidity, LEVELS
+
+    # 2 source cells -> 2 dest cells (1 lat x 2 lon), identity mapping
+    map_path = tmp_path / "map.nc"
+    xr.Dataset(
+        {
+            'row': (('n_s',), [1, 2]),
+            'col': (('n_s',), [1, 2]),
+            'S': (('n_s',), [1.0, 1.0]),
+            'yc_b': (('n_b',), [0.0, 0.0]),
+            'xc_b': (('n_b',), [0.0, 1.0]),
+        },
+        attrs={'dst_grid_dims': [1, 2]}
+    ).assign_coords(n_a=np.arange(2), n_b=np.arange(2)).to_netcdf(map_path)
+
+    n_time = 3
+    data = {'xtime': (('Time',), np.array([b'2021-01-01_00:00:00   '] * n_time))}
+    for lvl in LEVELS:
+        data[f'uzonal_{lvl}hPa'] = (('Time', 'nCells'), np.full((n_time, 2), float(lvl)))
+        data[f'temperature_{lvl}hPa'] = (('Time', 'nCells'), np.full((n_time, 2), 250.0))
+        data[f'relhum_{lvl}hPa'] = (('Time', 'nCells'), np.full((n_time, 2), 50.0))
+    input_path = tmp_path / "mpas.nc"
+    xr.Dataset(data, coords={'Time': np.arange(n_time)}).to_netcdf(input_path)
+
+    converter = Converter(str(map_path), str(tmp_path))
+    out_ds, init_time = converter.convert(converter.read_input(str(input_path)))
+
+    assert out_ds['U'].dims == ('time', 'forecast', 'level', 'latitude', 'longitude')
+    assert out_ds['U'].shape == (1, n_time, len(LEVELS), 1, 2)
+    # Assembled in place: the variable is the preallocated C-contiguous array
+    assert out_ds['U'].values.flags['C_CONTIGUOUS']
+    np.testing.assert_array_equal(out_ds['U'].sel(level=850).values, 850.0)
+    np.testing.assert_allclose(
+        out_ds['Q'].sel(level=500).values,
+        calculate_specific_humidity(50.0, 250.0, 50000.0)
+    )
+    np.testing.assert_allclose(out_ds['Q500'].values, out_ds['Q'].sel(level=500).values)
+    np.testing.assert_array_equal(out_ds['forecast'].values, np.arange(n_time))
+
+def test_reports_written_when_combine_fails(tmp_path, monkeypatch):
+    from src import main as main_module
+    temp_dir = tmp_path / "out" / "temp_parts"
+    os.makedirs(temp_dir)
+    # Two parts with the same init time: the QA reports must not overwrite each other
+    for name in ["era5_converted_2021010100.zarr", "era5_converted_2021010100_rerun.zarr"]:
+        xr.Dataset({'SP': (('time',), [1.0])}).to_zarr(temp_dir / name, consolidated=False)
+        qa = {'init_time': '2021-01-01 00:00:00', 'status': 'warning', 'issues': ['SP has 1 NaNs'], 'variables': {}}
+        with open(temp_dir / name.replace(".zarr", ".qa.json"), 'w') as f:
+            json.dump(qa, f)
+
+    def fail(*args, **kwargs):
+        raise ValueError("cannot combine")
+    monkeypatch.setattr(main_module.xr, 'open_mfdataset', fail)
+    monkeypatch.setattr(sys, 'argv', ['main', '--input_dir', str(tmp_path), '--map_file', 'unused.nc',
+                                      '--output_dir', str(tmp_path / "out"), '--skip_conversion'])
+    main_module.main()
+
+    with open(tmp_path / "out" / "qa_report.json") as f:
+        report = json.load(f)
+    assert report['n_files'] == 2
+    assert len(report['files_with_issues']) == 2
+    assert "duplicate times" in report['init_time_issues']
+
+def test_parallel_conversion_builds_no_parent_regridder(tmp_path, monkeypatch):
+    from src import main as main_module
+    (tmp_path / "in").mkdir()
+    (tmp_path / "in" / "mpas.nc").write_bytes(b"")
+    regridder = MagicMock()
+    pool = MagicMock()
+    pool.return_value.__enter__.return_value.map.return_value = []
+    monkeypatch.setattr(main_module, 'Regridder', regridder)
+    monkeypatch.setattr(main_module, 'ProcessPoolExecutor', pool)
+    monkeypatch.setattr(main_module, 'inspect_input', MagicMock())
+    monkeypatch.setattr(main_module, 'inspect_map', MagicMock())
+    monkeypatch.setattr(main_module, 'plan_resources', MagicMock(return_value={
+        'workers': 2, 'regrid_threads': 1, 'time_chunk': 1,
+    }))
+    monkeypatch.setattr(main_module, 'format_plan', MagicMock(return_value=""))
+    monkeypatch.setattr(sys, 'argv', ['main', '--input_dir', str(tmp_path / "in"), '--map_file', 'map.nc',
+                                      '--output_dir', str(tmp_path / "out")])
+    main_module.main()
+
+    # Each worker builds its own regridder in _init_worker
+    pool.assert_called_once()
+    regridder.assert_not_called()
@@ -0,0 +1,101 @@
+import pytest
+import threading
+import xarray as xr
+import numpy as np
+import os
+from src.converter import Converter
+from src.pipeline import ConversionPipeline
+
+class MockRegridder:
+    def __init__(self, map_file):
+        # 2x2 lat/lon destination grid
+        self.latitude = np.array([0, 1])
+        self.longitude = np.array([0, 1])
+        self.cell_order = None
+        
+    def to_cell_order(self, values, axis=-1):
+        return values
+        
+    def regrid_values(self, values, out=None, ordered=False):
+        # Input has (Time, nCells); output should have (Time, lat, lon)
+        shape = values.shape[:-1] + (2, 2)
+        if out is None:
+            out = np.empty(shape)
+        assert out.shape == shape
+        out[...] = 0
+        return out
+
+@pytest.fixture
+def mock_regridder(monkeypatch):
+    monkeypatch.setattr("src.converter.Regridder", MockRegridder)
+
+def _write_input(path, hour):
+    xr.Dataset(
+        {
+            'mslp': (('Time', 'nCells'), np.random.rand(2, 10)),
+            'xtime': (('Time',), np.array([f'2021-01-01_{hour:02d}:00:00   '.encode()] * 2))
+        },
+        coords={'Time': [0, 1]}
+    ).to_netcdf(path)
+
+def test_pipeline_converts_all_files_in_order(tmp_path, mock_regridder):
+    files = []
+    for i, hour in enumerate([0, 6, 12]):
+        p = tmp_path / f"f{i}.nc"
+        _write_input(p, hour)
+        files.append(str(p))
+
+    output_dir = tmp_path / "out"
+    os.makedirs(output_dir)
+    converter = Converter("dummy_map.nc", str(output_dir))
+
+    results = ConversionPipeline(converter, queue_depth=1, output_format='netcdf').run(files)
+
+    assert [r[0] for r in results] == files
+    assert all(r[2] is None for r in results)
+    for (_, out_path, _), hour in zip(results, [0, 6, 12]):
+        assert out_path.endswith(f"era5_converted_20210101{hour:02d}.nc")
+        assert os.path.exists(out_path)
+
+def test_pipeline_isolates_failed_file(tmp_path, mock_regridder):
+    good = tmp_path / "good.nc"
+    _write_input(good, 0)
+    bad = tmp_path / "bad.nc"
+    bad.write_text("not a netcdf file")
+
+    output_dir = tmp_path / "out"
+    os.makedirs(output_dir)
+    converter = Converter("dummy_map.nc", str(output_dir))
+
+    results = ConversionPipeline(converter, output_format='netcdf').run([str(bad), str(good)])
+
+    assert results[0][1] is None
+    assert results[0][2] is not None
+    assert results[1][2] is None
+    assert os.path.exists(results[1][1])
+
+def test_pipeline_overlaps_stages():
+    """The first write must be able to wait for the next file's read."""
+    second_read = threading.Event()
+
+    class StubConverter:
+        def read_input(self, f):
+            if f == 'b':
+                second_read.set()
+            return f
+        def convert_and_check(self, ds):
+            return ds, None, None
+        def write(self, out_ds, init_time, output_format, qa=None):
+            if out_ds == 'a':
+                # Deadlocks (and fails) if stages run one file at a time
+                assert second_read.wait(timeout=5)
+            return out_ds + '.out'
+
+    results = ConversionPipeline(StubConverter(), queue_depth=1).run(['a', 'b'])
+
+    assert [r[1] for r in results] == ['a.out', 'b.out']
+    assert all(r[2] is None for r in results)
+
+def test_pipeline_rejects_zero_depth():
+    with pytest.raises(ValueError):
+        ConversionPipeline(object(), queue_depth=0)
@@ -0,0 +1,73 @@
+import pytest
+import xarray as xr
+import numpy as np
+from src.planner import (
+    inspect_input, inspect_map, estimate_memory, plan_resources, format_plan, available_memory,
+    pipeline_resident_items,
+)
+
+INPUT = {'n_cells': 1000000, 'n_time': 8, 'n_vert_levels': 55, 'n_input_vars': 42, 'n_native_vars': 6}
+MAP = {'nnz': 3000000, 'n_src': 1000000, 'n_dst': 720 * 1440}
+GIB = 1024 ** 3
+
+def test_inspect_files(tmp_path):
+    path = tmp_path / "mpas.nc"
+    xr.Dataset(
+        {
+            'mslp': (('Time', 'nCells'), np.zeros((3, 10))),
+            't2m': (('Time', 'nCells'), np.zeros((3, 10))),
+            'theta': (('Time', 'nCells', 'nVertLevels'), np.zeros((3, 10, 4))),
+            'vorticity': (('Time', 'nCells'), np.zeros((3, 10))),
+        }
+    ).to_netcdf(path)
+    info = inspect_input(str(path))
+    assert info == {'n_cells': 10, 'n_time': 3, 'n_vert_levels': 4, 'n_input_vars': 2, 'n_native_vars': 1}
+
+    map_path = tmp_path / "map.nc"
+    xr.Dataset({'S': (('n_s',), np.ones(7)), 'yc_b': (('n_b',), np.zeros(5))}).to_netcdf(map_path)
+    assert inspect_map(str(map_path)) == {'nnz': 7, 'n_src': 0, 'n_dst': 5}
+
+def test_plan_fits_budget():
+    per_worker = estimate_memory(INPUT, MAP)['total']
+    plan = plan_resources(INPUT, MAP, n_files=20, memory_budget=int(3.5 * per_worker), cores=16)
+
+    assert plan['workers'] == 3
+    assert plan['regrid_threads'] == 5
+    assert plan['time_chunk'] == 1
+    assert plan['fits']
+    assert 'Workers:        3' in format_plan(plan)
+
+def test_plan_grows_time_chunk_for_native_levels():
+    small = plan_resources(INPUT, MAP, n_files=1, n_pressure_levels=37, memory_budget=40 * GIB, cores=4)
+    large = plan_resources(INPUT, MAP, n_files=1, n_pressure_levels=37, memory_budget=64 * GIB, cores=4)
+
+    assert small['workers'] == large['workers'] == 1
+    assert 1 <= small['time_chunk'] < large['time_chunk'] <= INPUT['n_time']
+    assert small['fits'] and small['peak_bytes'] <= 40 * GIB
+
+def test_plan_overrides_and_overflow():
+    plan = plan_resources(INPUT, MAP, n_files=10, memory_budget=GIB // 4, cores=8, workers=4, time_chunk=2)
+
+    assert plan['workers'] == 4 and plan['time_chunk'] == 2 and plan['regrid_threads'] == 2
+    assert not plan['fits']
+    assert 'WARNING' in format_plan(plan)
+
+def test_plan_counts_pipeline_queues():
+    single = estimate_memory(INPUT, MAP)
+    plan = plan_resources(INPUT, MAP, n_files=10, memory_budget=64 * GIB, cores=8, workers=1, queue_depth=2)
+
+    # Two full queues of depth 2 plus the reader, regridder and writer in flight
+    assert pipeline_resident_items(2) == 4
+    est = plan['per_worker_bytes']
+    assert plan['workers'] == 1 and plan['resident_items'] == 4
+    assert est['input'] == 4 * single['input'] and est['output'] == 4 * single['output']
+    assert est['weights'] == single['weights']
+    assert plan['peak_bytes'] == est['total'] > single['total']
+    assert 'queue depth 2' in format_plan(plan)
+
+    deeper = plan_resources(INPUT, MAP, n_files=10, memory_budget=64 * GIB, cores=8, workers=1, queue_depth=4)
+    assert deeper['peak_bytes'] > plan['peak_bytes']
+
+def test_available_memory():
+    mem = available_memory()
+    assert mem is None or mem > 0
@@ -0,0 +1,70 @@
+import pytest
+import xarray as xr
+import numpy as np
+import pandas as pd
+from src.qa import variable_summary, check_time_axis, quality_summary, summarize_qa
+
+def _out_ds(init_time, sp=None):
+    sp = np.arange(8.0).reshape(1, 2, 2, 2) if sp is None else sp
+    t = np.full((1, 2, 2, 2, 2), 250.0)
+    t[0, 1, 1, 0, 0] = np.nan
+    return xr.Dataset(
+        {
+            'SP': (('time', 'forecast', 'latitude', 'longitude'), sp),
+            'T': (('time', 'forecast', 'level', 'latitude', 'longitude'), t),
+        },
+        coords={'time': [np.datetime64(init_time)], 'forecast': [0, 1], 'level': [500, 850]}
+    )
+
+def _times(start, hours):
+    return pd.Timestamp(start).to_datetime64() + np.array(hours, dtype='timedelta64[h]')
+
+def test_variable_summary():
+    s = variable_summary(np.array([1.0, np.nan, 3.0]))
+    assert s == {'count': 2, 'nan_count': 1, 'min': 1.0, 'max': 3.0, 'mean': 2.0}
+    assert variable_summary(np.full(3, np.nan))['mean'] is None
+
+def test_check_time_axis():
+    assert check_time_axis(_times('2021-01-01', [0, 6, 12])) == (6.0, [])
+    assert check_time_axis(_times('2021-01-01', [0, 6, 12]), expected_step_hours=3)[1]
+    _, issues = check_time_axis(_times('2021-01-01', [0, 6, 6, 18]))
+    assert "duplicate times" in issues and any("irregular" in i for i in issues)
+    assert check_time_axis(np.array([0, 1]))[1]
+
+def test_quality_summary():
+    qa = quality_summary(_out_ds('2021-01-01'), _times('2021-01-01', [0, 6]))
+    assert qa['status'] == 'warning'
+    assert qa['time_step_hours'] == 6.0
+    assert qa['variables']['SP']['max'] == 7.0
+    assert qa['variables']['T']['nan_count'] == 1
+    assert qa['variables']['T']['nan_count_per_level'] == {'500': 0, '850': 1}
+
+    bad = quality_summary(_out_ds('2021-01-01', sp=np.full((1, 2, 2, 2), np.nan)), _times('2021-01-01', [6, 0]))
+    assert bad['status'] == 'fail'
+    assert "SP is all NaN" in bad['issues'] and "times are not increasing" in bad['issues']
+
+def test_summarize_qa():
+    reports = {
+        f"{d}.zarr": quality_summary(_out_ds(d, sp=np.arange(8.0).reshape(1, 2, 2, 2) + i), _times(d, [0, 6]))
+        for i, d in enumerate(['2021-01-01', '2021-01-02', '2021-01-04'])
+    }
+    summary = summarize_qa(reports)
+
+    assert summary['n_files'] == 3
+    assert summary['status']['warning'] == 3
+    assert summary['variables']['SP']['min'] == 0.0 and summary['variables']['SP']['max'] == 9.0
+    assert summary['variables']['SP']['mean'] == pytest.approx(4.5)
+    assert summary['variables']['T']['nan_count'] == 3
+    assert any("irregular" in i for i in summary['init_time_issues'])
+    assert sorted(summary['files_with_issues']) == ['2021-01-01.zarr', '2021-01-02.zarr', '2021-01-04.zarr']
+
+def test_summarize_qa_duplicate_init_times():
+    reports = {
+        path: quality_summary(_out_ds('2021-01-01'), _times('2021-01-01', [0, 6]))
+        for path in ['a/2021010100.zarr', 'b/2021010100.zarr']
+    }
+    summary = summarize_qa(reports)
+
+    # Both files are listed, and the repeated init time is flagged
+    assert len(summary['files_with_issues']) == 2
+    assert "duplicate times" in summary['init_time_issues']
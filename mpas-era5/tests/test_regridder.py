@@ -82,3 +82,150 @@ def test_regridder_regrid(tmp_path):
     # Check values. Flattened result should be [40, 30, 20, 10]
     expected = np.array([[[40.0, 30.0], [20.0, 10.0]]])
     np.testing.assert_array_equal(result.values, expected)
+
+def _write_random_map(map_path, n_lat=4, n_lon=8, n_src=50, seed=0):
+    rng = np.random.default_rng(seed)
+    n_b = n_lat * n_lon
+    # Each destination cell averages 3 random source cells
+    row = np.repeat(np.arange(n_b), 3) + 1
+    col = rng.integers(0, n_src, size=3 * n_b) + 1
+    s = np.full(3 * n_b, 1.0 / 3.0)
+    lat, lon = np.meshgrid(np.linspace(-60, 60, n_lat), np.linspace(0, 315, n_lon), indexing='ij')
+    ds = xr.Dataset(
+        {
+            'row': (('n_s',), row),
+            'col': (('n_s',), col),
+            'S': (('n_s',), s),
+            'yc_b': (('n_b',), lat.ravel()),
+            'xc_b': (('n_b',), lon.ravel()),
+            'yc_a': (('n_a',), rng.uniform(-1.5, 1.5, n_src)),
+            'xc_a': (('n_a',), rng.uniform(0, 6.28, n_src)),
+        },
+        attrs={'dst_grid_dims': [n_lat, n_lon]}
+    )
+    ds.to_netcdf(map_path)
+
+@pytest.mark.parametrize("method", ["hilbert", "morton"])
+def test_regridder_reorder_matches_original(tmp_path, method):
+    map_path = tmp_path / "map.nc"
+    _write_random_map(map_path)
+
+    data = xr.DataArray(np.random.rand(3, 50), dims=('Time', 'nCells'), coords={'Time': [0, 1, 2]})
+
+    plain = Regridder(str(map_path)).regrid(data)
+    reordered_regridder = Regridder(str(map_path), reorder=method)
+    reordered = reordered_regridder.regrid(data)
+
+    assert sorted(reordered_regridder.cell_order) == list(range(50))
+    np.testing.assert_allclose(reordered.values, plain.values)
+
+def test_regridder_weight_cache(tmp_path):
+    map_path = tmp_path / "map.nc"
+    _write_random_map(map_path)
+    cache_dir = tmp_path / "cache"
+
+    first = Regridder(str(map_path), reorder='hilbert', cache_dir=str(cache_dir))
+    assert len(os.listdir(cache_dir)) == 1
+
+    second = Regridder(str(map_path), reorder='hilbert', cache_dir=str(cache_dir))
+    np.testing.assert_array_equal(second.cell_order, first.cell_order)
+    assert (second.weights != first.weights).nnz == 0
+    assert second.dst_shape == first.dst_shape
+
+    # A different ordering gets its own cache entry
+    Regridder(str(map_path), cache_dir=str(cache_dir))
+    assert len(os.listdir(cache_dir)) == 2
+
+def test_regridder_regrid_values_into_slice(tmp_path):
+    map_path = tmp_path / "map.nc"
+    _write_random_map(map_path)
+    regridder = Regridder(str(map_path))
+
+    values = np.random.rand(2, 50)
+    expected = regridder.regrid_values(values)
+
+    # Write into a non-contiguous level slice of a (time, forecast, level, lat, lon) array
+    out = np.zeros((1, 2, 3) + regridder.dst_shape)
+    result = regridder.regrid_values(values, out=out[0, :, 1])
+
+    assert np.shares_memory(result, out)
+    np.testing.assert_allclose(out[0, :, 1], expected)
+    assert not out[0, :, 0].any() and not out[0, :, 2].any()
+
+    with pytest.raises(ValueError):
+        regridder.regrid_values(values, out=np.zeros((3,) + regridder.dst_shape))
+
+def test_regridder_prune_weights(tmp_path):
+    map_path = tmp_path / "map.nc"
+    _write_random_map(map_path)
+    # Perturb the map with tiny weights that pruning should remove
+    ds = xr.open_dataset(map_path).load()
+    n_b = ds.sizes['n_b']
+    ds = xr.Dataset(
+        {
+            'row': (('n_s',), np.concatenate([ds['row'].values, np.arange(n_b) + 1])),
+            'col': (('n_s',), np.concatenate([ds['col'].values, np.ones(n_b, dtype=int)])),
+            'S': (('n_s',), np.concatenate([ds['S'].values, np.full(n_b, 1e-6)])),
+            'yc_b': ds['yc_b'], 'xc_b': ds['xc_b'], 'yc_a': ds['yc_a'], 'xc_a': ds['xc_a'],
+        },
+        attrs=ds.attrs
+    )
+    ds.to_netcdf(map_path)
+    cache_dir = tmp_path / "cache"
+
+    full = Regridder(str(map_path))
+    pruned = Regridder(str(map_path), prune_tol=1e-4, cache_dir=str(cache_dir))
+
+    report = pruned.prune_report
+    assert report['nnz_after'] < report['nnz_before'] == full.weights.nnz
+    assert report['max_abs_error'] < 1e-4
+    # Rows keep their original sums
+    np.testing.assert_allclose(np.asarray(pruned.weights.sum(axis=1)).ravel(),
+                               np.asarray(full.weights.sum(axis=1)).ravel())
+
+    # Nothing survives a huge tolerance except one weight per row
+    assert Regridder(str(map_path), prune_tol=10.0).weights.nnz == n_b
+
+    cached = Regridder(str(map_path), prune_tol=1e-4, cache_dir=str(cache_dir))
+    assert cached.weights.nnz == report['nnz_after']
+    assert cached.prune_report == report
+
+def test_regridder_threads_match_serial(tmp_path):
+    map_path = tmp_path / "map.nc"
+    _write_random_map(map_path)
+
+    values = np.random.rand(3, 5, 50)
+    serial = Regridder(str(map_path)).regrid_values(values)
+    threaded = Regridder(str(map_path), threads=4).regrid_values(values)
+
+    np.testing.assert_allclose(threaded, serial)
+
+def test_regrid_values_pre_ordered_input(tmp_path):
+    map_path = tmp_path / "map.nc"
+    _write_random_map(map_path)
+    regridder = Regridder(str(map_path), reorder='hilbert')
+    values = np.random.rand(3, 50)
+
+    expected = regridder.regrid_values(values)
+    ordered = regridder.to_cell_order(values)
+    np.testing.assert_allclose(regridder.regrid_values(ordered, ordered=True), expected)
+    # Without a cell order the input is used as is
+    assert Regridder(str(map_path)).to_cell_order(values) is values
+
+def test_regrid_values_into_out_without_output_sized_temporary(tmp_path):
+    import tracemalloc
+    map_path = tmp_path / "map.nc"
+    _write_random_map(map_path, n_lat=40, n_lon=80)
+    regridder = Regridder(str(map_path))
+    values = np.random.rand(40, 50).astype(np.float32)
+    expected = np.stack([regridder.weights.dot(v.astype(np.float64)) for v in values]).reshape((40,) + regridder.dst_shape)
+
+    # Stale contents of the preallocated output must not leak into the result
+    out = np.full((1, 40) + regridder.dst_shape, np.nan)
+    tracemalloc.start()
+    regridder.regrid_values(values, out=out[0])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    np.testing.assert_allclose(out[0], expected)
+    assert peak < out.nbytes / 4
@@ -0,0 +1,64 @@
+import pytest
+import xarray as xr
+import numpy as np
+import os
+from src.stations import StationExtractor
+
+def _write_mesh(path):
+    # 4 cells on the equator at 0, 90, 180, 270 E
+    xr.Dataset(
+        {
+            'latCell': (('nCells',), np.zeros(4)),
+            'lonCell': (('nCells',), np.deg2rad([0.0, 90.0, 180.0, 270.0])),
+        }
+    ).to_netcdf(path)
+
+def _write_diag(path, hour, offset):
+    values = np.arange(4, dtype=float)[None, :] * 10.0 + offset + np.arange(2)[:, None]
+    xr.Dataset(
+        {
+            't2m': (('Time', 'nCells'), values),
+            'xtime': (('Time',), np.array([f'2021-01-01_{hour:02d}:00:00   '.encode(), f'2021-01-01_{hour + 3:02d}:00:00   '.encode()])),
+        }
+    ).to_netcdf(path)
+
+def test_extract_nearest_cell(tmp_path):
+    mesh = tmp_path / "mesh.nc"
+    _write_mesh(mesh)
+    files = [tmp_path / "diag0.nc", tmp_path / "diag1.nc"]
+    _write_diag(files[0], 0, 0.0)
+    _write_diag(files[1], 6, 100.0)
+
+    stations = {'name': ['A', 'B'], 'lat': [1.0, -2.0], 'lon': [89.0, 181.0]}
+    extractor = StationExtractor(str(mesh), stations)
+
+    assert list(extractor.cells) == [1, 2]
+
+    out = extractor.extract([str(f) for f in files], ['t2m', 'missing'])
+
+    assert out['t2m'].dims == ('Time', 'station')
+    assert out.sizes['Time'] == 4
+    assert list(out['station'].values) == ['A', 'B']
+    np.testing.assert_array_equal(out['t2m'].sel(station='A').values, [10.0, 11.0, 110.0, 111.0])
+    np.testing.assert_array_equal(out['t2m'].sel(station='B').values, [20.0, 21.0, 120.0, 121.0])
+    assert out['cell_distance_km'].values[0] == pytest.approx(157.0, abs=2.0)
+    assert 'missing' not in out
+
+def test_extract_idw_and_tree_cache(tmp_path):
+    mesh = tmp_path / "mesh.nc"
+    _write_mesh(mesh)
+    diag = tmp_path / "diag.nc"
+    _write_diag(diag, 0, 0.0)
+    cache_dir = tmp_path / "cache"
+
+    # Halfway between cells 0 and 1: equal weights
+    stations = {'name': ['mid'], 'lat': [0.0], 'lon': [45.0]}
+    extractor = StationExtractor(str(mesh), stations, k=2, cache_dir=str(cache_dir))
+    assert len(os.listdir(cache_dir)) == 1
+
+    out = extractor.extract([str(diag)], ['t2m'])
+    np.testing.assert_allclose(out['t2m'].values[:, 0], [5.0, 6.0])
+
+    # Second extractor reuses the cached tree
+    cached = StationExtractor(str(mesh), stations, k=2, cache_dir=str(cache_dir))
+    np.testing.assert_array_equal(cached.weights, extractor.weights)
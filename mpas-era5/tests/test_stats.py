@@ -0,0 +1,68 @@
+import pytest
+import xarray as xr
+import numpy as np
+import os
+from src.stats import HistogramSketch, compute_quantiles
+
+def test_sketch_quantiles_match_exact():
+    rng = np.random.default_rng(0)
+    data = rng.normal(280.0, 10.0, size=200000)
+    sketch = HistogramSketch(n_bins=2048)
+    sketch.update('T', data, level=500)
+
+    qs = [0.01, 0.5, 0.99]
+    approx = sketch.quantiles('T', qs)[0]
+    exact = np.quantile(data, qs)
+    bin_width = (330.0 - 170.0) / 2048
+    np.testing.assert_allclose(approx, exact, atol=2 * bin_width)
+
+def test_sketch_out_of_range_and_nan():
+    sketch = HistogramSketch(n_bins=10, ranges={'X': (0.0, 1.0)})
+    sketch.update('X', np.array([-5.0, 0.5, 7.0, np.nan]))
+
+    state = sketch.variables['X']
+    assert state['counts'][0, 0] == 1   # underflow
+    assert state['counts'][0, -1] == 1  # overflow
+    assert state['n_nan'][0] == 1
+    q = sketch.quantiles('X', [0.0, 1.0])[0]
+    assert q[0] == -5.0
+    assert q[1] == 7.0
+
+def test_sketch_merge_equals_single_pass():
+    rng = np.random.default_rng(1)
+    a = rng.normal(0, 20, size=5000)
+    b = rng.normal(5, 20, size=5000)
+
+    s1 = HistogramSketch(n_bins=64)
+    s1.update('U', a, level=850)
+    s2 = HistogramSketch(n_bins=64)
+    s2.update('U', b, level=850)
+    s2.update('U', b, level=500)
+    s1.merge(s2)
+
+    single = HistogramSketch(n_bins=64)
+    single.update('U', np.concatenate([a, b]), level=850)
+
+    k = s1.variables['U']['levels'].index(850)
+    np.testing.assert_array_equal(s1.variables['U']['counts'][k], single.variables['U']['counts'][0])
+    assert 500 in s1.variables['U']['levels']
+
+def test_compute_quantiles_streams_store(tmp_path):
+    levels = [500, 850]
+    ds = xr.Dataset(
+        {
+            'T': (('time', 'forecast', 'level', 'latitude', 'longitude'), np.random.rand(3, 2, 2, 4, 4) + 250.0),
+            't2m': (('time', 'forecast', 'latitude', 'longitude'), np.random.rand(3, 2, 4, 4) + 280.0),
+        },
+        coords={'level': levels}
+    )
+
+    out_path = compute_quantiles(ds, str(tmp_path))
+
+    assert os.path.exists(out_path)
+    ds_q = xr.open_dataset(out_path)
+    assert ds_q['T'].dims == ('quantile', 'level')
+    assert ds_q['T_histogram'].dims == ('level', 'bin')
+    assert ds_q['T_histogram'].sum() == 3 * 2 * 2 * 4 * 4
+    assert ds_q['t2m'].dims == ('quantile',)
+    assert float(ds_q['t2m'].sel(quantile=0.5)) == pytest.approx(280.5, abs=0.2)
@@ -0,0 +1,183 @@
+import pytest
+import xarray as xr
+import numpy as np
+from src.converter import Converter
+from src.vertical import interp_to_pressure, theta_to_temperature, native_pressure
+
+def _columns(n_columns=5, n_vert=10):
+    # Pressure decreasing with level index, different surface pressure per column
+    surface = np.linspace(100000.0, 85000.0, n_columns)[:, None]
+    return surface * np.exp(-0.25 * np.arange(n_vert))[None, :]
+
+def test_interp_linear_in_log_pressure_is_exact():
+    p = _columns()
+    field = 3.0 * np.log(p) + 7.0
+    levels = [50000.0, 30000.0, 20000.0]
+
+    out = interp_to_pressure({'X': field}, p, levels)
+
+    assert out['X'].shape == (3, 5)
+    expected = 3.0 * np.log(np.array(levels))[:, None] + 7.0
+    np.testing.assert_allclose(out['X'], np.broadcast_to(expected, (3, 5)))
+
+def test_interp_outside_column():
+    p = _columns()
+    field = np.log(p)
+    # Below the lowest level of every column / above the model top
+    levels = [101000.0, 10.0]
+
+    out = interp_to_pressure({'X': field}, p, levels)
+    assert np.isnan(out['X']).all()
+
+    out = interp_to_pressure({'X': field}, p, levels, extrapolate=True)
+    np.testing.assert_allclose(out['X'], np.log(np.array(levels))[:, None] * np.ones((2, 5)))
+
+def _identity_map(tmp_path):
+    # Identity mapping for 2 cells on a 1 x 2 grid
+    map_path = tmp_path / "map.nc"
+    xr.Dataset(
+        {
+            'row': (('n_s',), [1, 2]),
+            'col': (('n_s',), [1, 2]),
+            'S': (('n_s',), [1.0, 1.0]),
+            'yc_b': (('n_b',), [0.0, 0.0]),
+            'xc_b': (('n_b',), [0.0, 1.0]),
+        },
+        attrs={'dst_grid_dims': [1, 2]}
+    ).assign_coords(n_a=np.arange(2), n_b=np.arange(2)).to_netcdf(map_path)
+    return map_path
+
+def test_converter_native_levels(tmp_path):
+    map_path = _identity_map(tmp_path)
+    n_time, n_vert = 3, 10
+    p = np.broadcast_to(_columns(2, n_vert), (n_time, 2, n_vert))
+    dims = ('Time', 'nCells', 'nVertLevels')
+    input_path = tmp_path / "mpas.nc"
+    xr.Dataset(
+        {
+            'pressure': (dims, p),
+            'uReconstructZonal': (dims, np.log(p)),
+            'theta': (dims, np.full(p.shape, 300.0)),
+            'qv': (dims, np.full(p.shape, 0.01)),
+            'mslp': (('Time', 'nCells'), np.full((n_time, 2), 101325.0)),
+            'xtime': (('Time',), np.array([b'2021-01-01_00:00:00   '] * n_time)),
+        }
+    ).to_netcdf(input_path)
+
+    levels = [700, 500, 250]
+    results = []
+    for time_chunk in [1, 2]:
+        converter = Converter(str(map_path), str(tmp_path), pressure_levels=levels, time_chunk=time_chunk)
+        out_ds, _ = converter.convert(converter.read_input(str(input_path)))
+        results.append(out_ds)
+
+    out_ds = results[0]
+    assert out_ds['U'].dims == ('time', 'forecast', 'level', 'latitude', 'longitude')
+    assert list(out_ds['level'].values) == levels
+    np.testing.assert_allclose(
+        out_ds['U'].values[0, :, :, 0, 0],
+        np.broadcast_to(np.log(np.array(levels) * 100.0), (n_time, 3))
+    )
+    # T is not linear in log-pressure, so only approximately recovered
+    np.testing.assert_allclose(out_ds['T'].sel(level=500).values, theta_to_temperature(300.0, 50000.0), rtol=1e-3)
+    np.testing.assert_allclose(out_ds['Q'].values, 0.01 / 1.01)
+    assert 'SP' in out_ds
+    for var in ['U', 'T', 'Q']:
+        np.testing.assert_allclose(results[1][var].values, out_ds[var].values)
+
+def test_native_pressure_summed_per_chunk(tmp_path):
+    map_path = _identity_map(tmp_path)
+    n_time, n_vert = 4, 10
+    p = np.broadcast_to(_columns(2, n_vert), (n_time, 2, n_vert))
+    dims = ('Time', 'nCells', 'nVertLevels')
+    input_path = tmp_path / "mpas_pp.nc"
+    xr.Dataset(
+        {
+            'pressure_p': (dims, 0.1 * p),
+            'pressure_base': (dims, 0.9 * p),
+            'uReconstructZonal': (dims, np.log(p)),
+            'xtime': (('Time',), np.array([b'2021-01-01_00:00:00   '] * n_time)),
+        }
+    ).to_netcdf(input_path)
+
+    converter = Converter(str(map_path), str(tmp_path), pressure_levels=[500], time_chunk=2)
+    ds = converter.read_input(str(input_path))
+    # Only the requested steps are read and summed
+    chunk = native_pressure(ds, slice(0, 2))
+    assert isinstance(chunk, np.ndarray) and chunk.shape == (2, 2, n_vert)
+    np.testing.assert_allclose(chunk, p[:2])
+
+    out_ds, _ = converter.convert(ds)
+    np.testing.assert_allclose(out_ds['U'].values[0, :, 0], np.log(50000.0))
+
+def test_converter_requires_native_fields_for_pressure_levels(tmp_path):
+    map_path = _identity_map(tmp_path)
+    input_path = tmp_path / "mpas_plev.nc"
+    # Only the pre-interpolated levels, which differ from the requested ones
+    xr.Dataset(
+        {
+            'uzonal_500hPa': (('Time', 'nCells'), np.zeros((1, 2))),
+            'theta': (('Time', 'nCells', 'nVertLevels'), np.full((1, 2, 10), 300.0)),
+            'xtime': (('Time',), np.array([b'2021-01-01_00:00:00   '])),
+        }
+    ).to_netcdf(input_path)
+
+    converter = Converter(str(map_path), str(tmp_path), pressure_levels=[600, 400])
+    with pytest.raises(ValueError, match="'pressure_p' and 'pressure_base'"):
+        converter.convert(converter.read_input(str(input_path)))
+
+def test_converter_extrapolates_outside_column(tmp_path):
+    map_path = _identity_map(tmp_path)
+    n_time, n_vert = 2, 10
+    p = np.broadcast_to(_columns(2, n_vert), (n_time, 2, n_vert))
+    dims = ('Time', 'nCells', 'nVertLevels')
+    input_path = tmp_path / "mpas.nc"
+    xr.Dataset(
+        {
+            'pressure': (dims, p),
+            'uReconstructZonal': (dims, np.log(p)),
+            'xtime': (('Time',), np.array([b'2021-01-01_00:00:00   '] * n_time)),
+        }
+    ).to_netcdf(input_path)
+    # Above the model top of both columns and below ground of the second
+    levels = [1, 1000]
+
+    converter = Converter(str(map_path), str(tmp_path), pressure_levels=levels)
+    out_ds, _ = converter.convert(converter.read_input(str(input_path)))
+    assert np.isnan(out_ds['U'].values).any()
+
+    converter = Converter(str(map_path), str(tmp_path), pressure_levels=levels, extrapolate=True)
+    out_ds, _ = converter.convert(converter.read_input(str(input_path)))
+    np.testing.assert_allclose(
+        out_ds['U'].values[0, :, :, 0, :],
+        np.broadcast_to(np.log(np.array(levels) * 100.0)[None, :, None], (n_time, 2, 2))
+    )
+
+def test_converter_reordered_cells_match(tmp_path):
+    from src.regridder import Regridder
+    map_path = _identity_map(tmp_path)
+    # Source cell centers let the regridder reorder the two cells
+    xr.open_dataset(map_path).load().assign(
+        yc_a=(('n_a',), [0.5, -0.5]), xc_a=(('n_a',), [3.0, 0.1])
+    ).to_netcdf(tmp_path / "map_centers.nc")
+    n_time, n_vert = 2, 10
+    p = np.broadcast_to(_columns(2, n_vert), (n_time, 2, n_vert))
+    dims = ('Time', 'nCells', 'nVertLevels')
+    input_path = tmp_path / "mpas.nc"
+    xr.Dataset(
+        {
+            'pressure': (dims, p),
+            'uReconstructZonal': (dims, np.log(p)),
+            'mslp': (('Time', 'nCells'), [[1.0, 2.0], [3.0, 4.0]]),
+            'xtime': (('Time',), np.array([b'2021-01-01_00:00:00   '] * n_time)),
+        }
+    ).to_netcdf(input_path)
+
+    results = []
+    for reorder in [None, 'morton']:
+        regridder = Regridder(str(tmp_path / "map_centers.nc"), reorder=reorder)
+        converter = Converter(None, str(tmp_path), regridder=regridder, pressure_levels=[500, 250])
+        results.append(converter.convert(converter.read_input(str(input_path)))[0])
+
+    for var in ['SP', 'U']:
+        np.testing.assert_allclose(results[1][var].values, results[0][var].values)
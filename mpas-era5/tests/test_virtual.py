@@ -0,0 +1,93 @@
+import pytest
+import xarray as xr
+import numpy as np
+from src.converter import Converter
+from src.virtual import VirtualERA5Dataset, LRUCache
+
+class SumRegridder:
+    """2x3 destination grid; every point gets the cell sum plus its flat index."""
+    latitude = np.array([10.0, 20.0])
+    longitude = np.array([0.0, 1.0, 2.0])
+    cell_order = None
+
+    def __init__(self):
+        self.calls = 0
+
+    def to_cell_order(self, values, axis=-1):
+        return values
+
+    def regrid_values(self, values, out=None, ordered=False):
+        values = np.asarray(values)
+        self.calls += int(np.prod(values.shape[:-1]))
+        result = values.sum(axis=-1)[..., None, None] + np.arange(6.0).reshape(2, 3)
+        if out is None:
+            return result
+        out[...] = result
+        return out
+
+def _write_mpas(path, day, n_time=2):
+    rng = np.random.default_rng(day)
+    fields = {
+        'mslp': (('Time', 'nCells'), rng.uniform(9e4, 1e5, (n_time, 4))),
+        'height_500hPa': (('Time', 'nCells'), rng.uniform(1000, 1500, (n_time, 4))),
+        'xtime': (('Time',), np.array([f'2021-01-0{day}_{6 * t:02d}:00:00   '.encode() for t in range(n_time)])),
+    }
+    for lvl in (500, 850):
+        fields[f'temperature_{lvl}hPa'] = (('Time', 'nCells'), rng.uniform(60, 70, (n_time, 4)))
+        fields[f'relhum_{lvl}hPa'] = (('Time', 'nCells'), rng.uniform(10, 25, (n_time, 4)))
+    xr.Dataset(fields).to_netcdf(path)
+
+def test_virtual_matches_converter(tmp_path):
+    files = [str(tmp_path / f"diag{d}.nc") for d in (1, 2)]
+    for d, f in zip((1, 2), files):
+        _write_mpas(f, d)
+
+    converter = Converter("unused", str(tmp_path), regridder=SumRegridder())
+    expected = [converter.convert(converter.read_input(f))[0] for f in files]
+
+    with VirtualERA5Dataset(files, SumRegridder()) as vds:
+        assert vds.sizes['time'] == 2 and vds.sizes['forecast'] == 2
+        assert set(vds.data_vars) == {'SP', 'T500', 'Z500', 'Q500', 'T', 'Q'}
+        assert vds['T'].dims == ('time', 'forecast', 'level', 'latitude', 'longitude')
+        assert vds['T'].levels == [500, 850]
+
+        for name in ['SP', 'Z500', 'Q500', 'T', 'Q']:
+            full = np.concatenate([e[name].values for e in expected])
+            np.testing.assert_allclose(vds[name][:], full)
+
+        # Integer indices drop dimensions, slices keep them
+        np.testing.assert_allclose(vds['Q'][1, 0, 1], expected[1]['Q'].values[0, 0, 1])
+        assert vds['SP'][0, :, 1:, [0, 2]].shape == (2, 1, 2)
+
+        sub = vds.isel(time=1, forecast=slice(0, 1))
+        assert sub['T'].dims == ('forecast', 'level', 'latitude', 'longitude')
+        np.testing.assert_array_equal(sub['T']['level'], [500, 850])
+        np.testing.assert_allclose(sub['SP'].values, expected[1]['SP'].values[0, :1])
+
+def test_virtual_reads_only_indexed_fields(tmp_path):
+    path = str(tmp_path / "diag1.nc")
+    _write_mpas(path, 1)
+    regridder = SumRegridder()
+
+    vds = VirtualERA5Dataset([path], regridder)
+    vds['T'][0, 1, 0]
+    assert regridder.calls == 1
+    # Served from the cache
+    vds['T'][0, 1, 0, :, 1]
+    assert regridder.calls == 1
+    assert vds.cache.hits == 1
+    vds.close()
+
+def test_lru_cache_cap():
+    cache = LRUCache(max_bytes=3 * 80)
+    for i in range(4):
+        cache.put(i, np.zeros(10))
+    assert len(cache) == 3 and cache.nbytes == 240
+    assert cache.get(0) is None
+    assert cache.get(1) is not None
+    cache.put(4, np.zeros(10))
+    # 1 was used recently, 2 is evicted
+    assert cache.get(1) is not None and cache.get(2) is None
+    # Items larger than the cap are never stored
+    cache.put(5, np.zeros(100))
+    assert cache.get(5) is None
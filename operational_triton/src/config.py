@@ -38,9 +38,48 @@ class Config:
                     "threshold_trigger": 5.0 # Example threshold
                 }
             },
+            "ingest": {
+                "max_workers": 4, # Concurrent file copies from feed_dir
+                "manifest": None # Defaults to <work_dir>/01_LISinput/.ingest_manifest.json
+            },
+            "process": {
+                "in_memory": False, # Hand decoded GRIB bands to the model without a GeoTIFF round trip
+                "write_tiff": True, # Archive GeoTIFFs in 02_LISpostproc
+                "max_workers": None, # GRIB files converted concurrently (None = CPU count)
+                "grib_index": True, # Read bands through a cached message offset index
+                "index_dir": None # Defaults to <work_dir>/grib_index (kept out of 01_LISinput)
+            },
+            "model": {
+                "runoff_bands": [24, 25], # Surface + subsurface runoff (message numbers or short names) summed per timestep
+                "interval_hours": 3,
+                "mask_cache_dir": None # Defaults to <work_dir>/site_masks
+            },
+            "slurm": {
+                "commands": None, # Override the sbatch/squeue/sacct argument lists
+                "poll_interval_seconds": 30, # One batched squeue for all outstanding jobs per interval
+                "max_concurrent_submits": 8,
+                "max_unknown_polls": 5 # Polls a job may be missing from squeue and sacct before it counts as finished
+            },
+            "hindcast": {
+                "max_workers": None # Dates processed concurrently (None = CPU count)
+            },
+            "metrics": {
+                "textfile": None, # Prometheus textfile; defaults to <work_dir>/metrics/triton.prom
+                "jsonl": None # Append every metric update to this JSON lines file (optional)
+            },
             "workflow": {
-                "data_check_interval_seconds": 300,
-                "max_retries": 3
+                "data_check_interval_seconds": 300, # Full rescan period of the arrival watcher
+                "max_retries": 3,
+                "stage_concurrency": {"ingest": 2, "process": 2, "model": 1}, # Tasks of each stage running at once
+                "state_db": None, # Task state (SQLite); defaults to <work_dir>/workflow_state.sqlite
+                "reconcile_days": 3 # Feed timesteps this far back from the newest are rerun until done (daemon)
+            },
+            "watcher": {
+                "paths": None, # Directories to watch (None = global.feed_dir)
+                "backend": "auto", # inotify where available, else directory polling
+                "poll_interval_seconds": 5,
+                "settle_seconds": 10, # Quiet time before a file counts as fully written
+                "files_per_timestep": 1
             }
         }
 
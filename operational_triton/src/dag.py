@@ -0,0 +1,180 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+# Task outcomes
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped" # Completed in an earlier run
+UPSTREAM_FAILED = "upstream_failed"
+
+class StateStore:
+    """Outcome of every task run so far, kept in a local SQLite database."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                "name TEXT PRIMARY KEY, stage TEXT, status TEXT, attempts INTEGER, "
+                "seconds REAL, error TEXT, updated TEXT)"
+            )
+
+    def status(self, name):
+        with self.lock:
+            row = self.conn.execute("SELECT status FROM tasks WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def is_done(self, name):
+        return self.status(name) == DONE
+
+    def names(self, prefix, status=None):
+        """Names of the recorded tasks starting with `prefix` (optionally only those with `status`)."""
+        query = "SELECT name FROM tasks WHERE substr(name, 1, ?) = ?"
+        params = [len(prefix), prefix]
+        if status is not None:
+            query += " AND status = ?"
+            params.append(status)
+        with self.lock:
+            return [row[0] for row in self.conn.execute(query, params)]
+
+    def record(self, name, stage, status, seconds=None, error=None):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO tasks (name, stage, status, attempts, seconds, error, updated) "
+                "VALUES (?, ?, ?, 1, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET stage = excluded.stage, status = excluded.status, "
+                "attempts = attempts + 1, seconds = excluded.seconds, error = excluded.error, "
+                "updated = excluded.updated",
+                (name, stage, status, seconds, error, datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class Task:
+    def __init__(self, name, stage, func, deps=(), persist=True):
+        self.name = name
+        self.stage = stage
+        self.func = func
+        self.deps = list(deps)
+        # Tasks whose output only lives in memory are rerun whenever a dependent needs them
+        self.persist = persist
+
+class TaskGraph:
+    """
+    Runs tasks as soon as their dependencies are done, with a concurrency
+    limit per stage.
+
+    Tasks are started in the order they were added, so with per-timestep
+    ingest -> process chains the ingest of timestep N+1 runs while N is
+    processed. Tasks recorded as done in the state store are skipped, and a
+    failed task only blocks its own dependents.
+    """
+
+    def __init__(self, concurrency=None, state=None):
+        """
+        Args:
+            concurrency (dict): stage -> maximum tasks of that stage running at once (default 1).
+            state (StateStore): Where completed tasks are recorded (default: not persisted).
+        """
+        self.concurrency = concurrency or {}
+        self.state = state
+        self.tasks = {}
+
+    def add(self, name, stage, func, deps=(), persist=True):
+        """Adds a task; dependencies must have been added before. Returns the task name."""
+        if name in self.tasks:
+            raise ValueError(f"Duplicate task {name}")
+        missing = [d for d in deps if d not in self.tasks]
+        if missing:
+            raise ValueError(f"Task {name} depends on unknown tasks {missing}")
+        self.tasks[name] = Task(name, stage, func, deps, persist)
+        return name
+
+    def limit(self, stage):
+        return max(1, self.concurrency.get(stage, 1))
+
+    def needed(self):
+        """Names of the tasks that have to run in this pass."""
+        dependents = {name: [] for name in self.tasks}
+        for task in self.tasks.values():
+            for dep in task.deps:
+                dependents[dep].append(task.name)
+        needed = set()
+        # Dependents are added after their dependencies, so walk backwards
+        for task in reversed(list(self.tasks.values())):
+            if task.persist:
+                if not (self.state and self.state.is_done(task.name)):
+                    needed.add(task.name)
+            elif any(d in needed for d in dependents[task.name]):
+                needed.add(task.name)
+        return needed
+
+    def _execute(self, task):
+        start = time.perf_counter()
+        task.func()
+        return time.perf_counter() - start
+
+    def run(self):
+        """
+        Runs all needed tasks.
+
+        Returns:
+            dict: task name -> DONE, FAILED, SKIPPED or UPSTREAM_FAILED
+        """
+        needed = self.needed()
+        status = {name: SKIPPED for name in self.tasks if name not in needed}
+        pending = [task for task in self.tasks.values() if task.name in needed]
+        running = {}
+        per_stage = Counter()
+        max_workers = sum(self.limit(stage) for stage in {task.stage for task in pending}) or 1
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            while pending or running:
+                for task in list(pending):
+                    deps = [status.get(d) for d in task.deps]
+                    if any(s in (FAILED, UPSTREAM_FAILED) for s in deps):
+                        pending.remove(task)
+                        status[task.name] = UPSTREAM_FAILED
+                        logger.warning(f"Not running {task.name}: a dependency failed")
+                    elif all(s in (DONE, SKIPPED) for s in deps) and per_stage[task.stage] < self.limit(task.stage):
+                        pending.remove(task)
+                        per_stage[task.stage] += 1
+                        running[pool.submit(self._execute, task)] = task
+                if not running:
+                    continue
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task = running.pop(future)
+                    per_stage[task.stage] -= 1
+                    try:
+                        seconds = future.result()
+                    except Exception as e:
+                        status[task.name] = FAILED
+                        logger.error(f"Task {task.name} failed: {e}")
+                        if self.state and task.persist:
+                            self.state.record(task.name, task.stage, FAILED, error=str(e))
+                        continue
+                    status[task.name] = DONE
+                    logger.info(f"Task {task.name} done in {seconds:.1f} s")
+                    if self.state and task.persist:
+                        self.state.record(task.name, task.stage, DONE, seconds=seconds)
+
+        counts = Counter(status.values())
+        logger.info("Task graph finished: " + ", ".join(f"{n} {s}" for s, n in sorted(counts.items())))
+        return status
@@ -0,0 +1,166 @@
+import os
+import json
+import logging
+import pygrib
+
+logger = logging.getLogger(__name__)
+
+# Bump when the sidecar layout changes so old indexes are rebuilt
+INDEX_VERSION = 1
+
+# Message keys stored in the index for selection by name
+METADATA_KEYS = ["shortName", "name", "typeOfLevel", "level"]
+
+def _find_marker(f, start, chunk_size=1 << 20):
+    """Offset of the next b'GRIB' marker at or after `start`, or -1."""
+    f.seek(start)
+    position = start
+    tail = b""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return -1
+        data = tail + chunk
+        found = data.find(b"GRIB")
+        if found >= 0:
+            return position - len(tail) + found
+        tail = data[-3:]
+        position += len(chunk)
+
+def scan_messages(path):
+    """
+    Lists the GRIB messages of a file from section 0 alone.
+
+    Each message is located by its 'GRIB' indicator and skipped using the
+    total length in section 0 (3 bytes in edition 1, 8 bytes in edition 2),
+    so no message is decoded.
+
+    Returns:
+        list: dicts with number (1-based, as pygrib), offset, length, edition
+    """
+    messages = []
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        offset = 0
+        while offset < size:
+            f.seek(offset)
+            header = f.read(16)
+            if len(header) < 8:
+                break
+            if header[:4] != b"GRIB":
+                # Padding or garbage between messages
+                offset = _find_marker(f, offset + 1)
+                if offset < 0:
+                    break
+                continue
+            edition = header[7]
+            if edition == 1:
+                length = int.from_bytes(header[4:7], "big")
+            elif edition == 2:
+                length = int.from_bytes(header[8:16], "big")
+            else:
+                raise ValueError(f"Unsupported GRIB edition {edition} at offset {offset} in {path}")
+            if length <= 0 or offset + length > size:
+                raise ValueError(f"Truncated GRIB message at offset {offset} in {path}")
+            messages.append({"number": len(messages) + 1, "offset": offset, "length": length, "edition": edition})
+            offset += length
+    return messages
+
+class GribIndex:
+    """
+    Persistent message inventory of one GRIB file.
+
+    Maps message number and shortName/name/level to byte offset and length,
+    so a band is read with one seek instead of stepping through the file,
+    and can be selected by name instead of by position. The index is stored
+    as a JSON sidecar and rebuilt when the file's size or mtime changes.
+    """
+
+    def __init__(self, path, cache_dir=None):
+        """
+        Args:
+            path (str): GRIB file.
+            cache_dir (str): Directory for the sidecar (default: next to the file).
+        """
+        self.path = path
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.index_path = os.path.join(cache_dir, os.path.basename(path) + ".idx.json")
+        else:
+            self.index_path = path + ".idx.json"
+        self.messages = self._load() or self._build()
+
+    def _signature(self):
+        st = os.stat(self.path)
+        return [st.st_size, st.st_mtime_ns]
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return None
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read GRIB index {self.index_path}: {e}")
+            return None
+        if index.get("version") != INDEX_VERSION or index.get("source") != self._signature():
+            return None
+        return index["messages"]
+
+    def _build(self):
+        messages = scan_messages(self.path)
+        with open(self.path, "rb") as f:
+            for message in messages:
+                f.seek(message["offset"])
+                try:
+                    grb = pygrib.fromstring(f.read(message["length"]))
+                    for key in METADATA_KEYS:
+                        value = getattr(grb, key, None)
+                        message[key] = value if isinstance(value, (str, int, float)) or value is None else str(value)
+                except Exception as e:
+                    logger.warning(f"Could not read metadata of message {message['number']} in {self.path}: {e}")
+        index = {"version": INDEX_VERSION, "source": self._signature(), "messages": messages}
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(index, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            # A read-only location only costs a rescan next time
+            logger.warning(f"Could not write GRIB index {self.index_path}: {e}")
+        logger.info(f"Indexed {len(messages)} messages of {self.path}")
+        return messages
+
+    def find(self, short_name=None, name=None, level=None, type_of_level=None):
+        """Messages matching all given keys."""
+        wanted = {"shortName": short_name, "name": name, "level": level, "typeOfLevel": type_of_level}
+        return [m for m in self.messages
+                if all(v is None or m.get(k) == v for k, v in wanted.items())]
+
+    def resolve(self, band):
+        """
+        Message number of a band given as a 1-based message number or a
+        shortName/name (e.g. 'Qs_acc').
+
+        Raises:
+            KeyError: If the name matches no message or several.
+        """
+        if isinstance(band, int):
+            if not 1 <= band <= len(self.messages):
+                raise KeyError(f"Message {band} not in {self.path} ({len(self.messages)} messages)")
+            return band
+        matches = self.find(short_name=band) or self.find(name=band)
+        if len(matches) != 1:
+            raise KeyError(f"Band {band!r} matches {len(matches)} messages in {self.path}")
+        return matches[0]["number"]
+
+    def read_message(self, band):
+        """Raw bytes of one message, read with a single seek."""
+        message = self.messages[self.resolve(band) - 1]
+        with open(self.path, "rb") as f:
+            f.seek(message["offset"])
+            return f.read(message["length"])
+
+    def decode(self, band):
+        """Decoded pygrib message of a band (values, latlons(), Di, Dj, ...)."""
+        return pygrib.fromstring(self.read_message(band))
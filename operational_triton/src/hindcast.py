@@ -0,0 +1,155 @@
+import os
+import time
+import logging
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from utils import get_date_range
+from ingest import DataIngestor
+from process import DataProcessor
+from model import TritonModel
+from hydrograph import generate_dates
+from metrics import get_registry, STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Pipeline components of this worker process, created once by _init_worker
+_worker = {}
+
+def _init_worker(config):
+    _worker["ingestor"] = DataIngestor(config)
+    _worker["processor"] = DataProcessor(config)
+    _worker["model"] = TritonModel(config)
+
+def run_date(date_str, site_names, dates, in_memory=False):
+    """
+    Ingests and processes one date and extracts the per-ID runoff of all sites.
+    Runs in a worker initialized by _init_worker.
+
+    Args:
+        date_str (str): Date (YYYY-MM-DD).
+        site_names (list): Sites to extract.
+        dates (list): Timesteps of the hindcast that fall on this date.
+        in_memory (bool): Decode GRIB bands in memory instead of converting to GeoTIFF.
+
+    Returns:
+        dict: date, success, error, dates, runoff ({site: (len(dates), n_ids) array}), n_read, seconds
+    """
+    start = time.perf_counter()
+    ingestor, processor, model = _worker["ingestor"], _worker["processor"], _worker["model"]
+    result = {"date": date_str, "success": False, "error": None, "dates": dates, "runoff": {}, "n_read": 0}
+    try:
+        if not ingestor.sync_data(date_str):
+            raise RuntimeError("Ingestion failed")
+        runoff = None
+        if in_memory:
+            runoff = processor.decode_date(date_str)
+        else:
+            # Dates are already spread over processes; convert this date's files serially
+            processor.convert_batch(processor.lis_files(date_str), max_workers=1)
+        sites = model.load_sites(site_names)
+        result["runoff"], result["n_read"] = model.extract_runoff(sites, dates, runoff)
+        result["success"] = True
+    except Exception as e:
+        logger.error(f"Hindcast failed for {date_str}: {e}")
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+def merge_runoff(results, grid):
+    """
+    Places per-date results on the continuous hindcast time axis.
+
+    Returns:
+        tuple: ({site: (len(grid), n_ids) array, zero where missing}, {site: timesteps read})
+    """
+    position = {date: i for i, date in enumerate(grid)}
+    merged = {}
+    n_read = {}
+    for result in results:
+        if not result["success"]:
+            continue
+        rows = [position[date] for date in result["dates"]]
+        for site, roff in result["runoff"].items():
+            if site not in merged:
+                merged[site] = np.zeros((len(grid), roff.shape[1]))
+                n_read[site] = 0
+            merged[site][rows] = roff
+            n_read[site] += result["n_read"]
+    return merged, n_read
+
+def run_hindcast(config, start_date, end_date, max_workers=None):
+    """
+    Runs the pipeline over a date range on a process pool and writes one
+    continuous hydrograph per enabled site.
+
+    Site masks are built (or validated) once before the pool starts, so
+    workers only memory-map the cached label arrays. Each worker handles
+    whole dates; their timesteps are taken from one grid over the full
+    range, so rows line up across day boundaries.
+
+    Args:
+        config (Config): Workflow configuration.
+        start_date, end_date (str): Inclusive range (YYYY-MM-DD).
+        max_workers (int): Concurrent dates (default: hindcast.max_workers, or the CPU count).
+
+    Returns:
+        dict: site -> True (high-res triggered), False, or None if no data was found.
+    """
+    model = TritonModel(config)
+    site_names = [name for name, site_config in config.get("sites", {}).items() if site_config.get("enabled")]
+    sites = model.load_sites(site_names)
+    if not sites:
+        logger.error("No enabled sites to hindcast")
+        return {}
+
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(hours=23)
+    grid = generate_dates(start, end, model.interval_hours)
+    by_day = {}
+    for date in grid:
+        by_day.setdefault(date.strftime("%Y-%m-%d"), []).append(date)
+
+    days = get_date_range(start_date, end_date)
+    in_memory = config.get("process.in_memory", False)
+    args = [(day, list(sites), by_day.get(day, []), in_memory) for day in days]
+    if max_workers is None:
+        max_workers = config.get("hindcast.max_workers") or os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(days)))
+    logger.info(f"Hindcast of {len(days)} dates ({start_date} to {end_date}) for "
+                f"{', '.join(sites)} with {max_workers} workers")
+
+    if max_workers == 1:
+        _init_worker(config)
+        results = [run_date(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(config,)) as pool:
+            futures = [pool.submit(run_date, *a) for a in args]
+            results = []
+            for a, future in zip(args, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    # Worker crashed (e.g. killed); report it like any other failure
+                    results.append({"date": a[0], "success": False, "error": str(e), "dates": a[2],
+                                    "runoff": {}, "n_read": 0, "seconds": 0.0})
+
+    # Stage metrics recorded inside pool workers stay there; time each date here
+    metrics = get_registry()
+    for r in results:
+        metrics.observe(STAGE_SECONDS, r["seconds"], stage="hindcast_date")
+
+    failed = [r["date"] for r in results if not r["success"]]
+    if failed:
+        logger.error(f"Hindcast failed for {len(failed)} of {len(days)} dates: {', '.join(failed)}")
+
+    merged, n_read = merge_runoff(results, grid)
+    triggers = {}
+    for site_name, (site_config, _, _) in sites.items():
+        if not n_read.get(site_name):
+            logger.error(f"No runoff data found for {site_name} between {start_date} and {end_date}")
+            triggers[site_name] = None
+            continue
+        triggers[site_name] = model.write_hydrograph(site_name, site_config, merged[site_name], start, end)
+    metrics.export()
+    return triggers
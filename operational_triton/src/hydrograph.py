@@ -0,0 +1,94 @@
+import re
+import logging
+import numpy as np
+import shapefile
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# LIS output file naming used by the post-processing (see bin/A02_write_runoff_hyg_endtoend_LISarchive.py)
+LIS_FILE_PREFIX = "PS.557WW_SC.U_DI.C_GP.LIS-NOAH_GR.C0P09DEG_AR.GLOBAL_PA.LIS_DD."
+
+def read_site_table(shapefile_path):
+    """Returns the (DN, TRITON_Run) table of a site shapefile as an (n, 2) array."""
+    sf = shapefile.Reader(shapefile_path)
+    try:
+        return np.array([[r.DN, r.TRITON_Run] for r in sf.records()])
+    finally:
+        sf.close()
+
+def generate_dates(start, end, interval_hours):
+    """Timesteps from start to end (inclusive) every interval_hours."""
+    delta = timedelta(hours=interval_hours)
+    dates = []
+    current = start
+    while current <= end:
+        dates.append(current)
+        current += delta
+    return dates
+
+LIS_TIME_PATTERN = re.compile(r"(\d{8})_DT\.(\d{4})")
+
+def parse_lis_time(file_name):
+    """Valid time of a LIS GRIB/GeoTIFF file from its name (..._DD.YYYYMMDD_DT.HH00_DF...), or None."""
+    match = LIS_TIME_PATTERN.search(file_name)
+    if not match:
+        return None
+    return datetime.strptime("".join(match.groups()), "%Y%m%d%H%M")
+
+def runoff_file(postproc_dir, date, band, prefix=LIS_FILE_PREFIX):
+    """Path of the GeoTIFF of one LIS band at one timestep."""
+    return f"{postproc_dir}/{prefix}{date.strftime('%Y%m%d_DT.%H00_DF')}_band_{band}.tif"
+
+class LabelIndex:
+    """
+    Maps each unique ID (DN) of a site to its pixels in the label raster.
+
+    Built once per site; summing a runoff field per ID is then a single
+    gather plus bincount instead of one np.where over the grid per ID.
+    """
+
+    def __init__(self, labels, ids):
+        """
+        Args:
+            labels (np.ndarray): Integer label raster (LIS_UniqueId).
+            ids (array): Unique IDs to aggregate, in hydrograph column order.
+        """
+        self.ids = np.asarray(ids)
+        self.shape = labels.shape
+
+        flat = labels.ravel()
+        order = np.argsort(self.ids, kind='stable')
+        sorted_ids = self.ids[order]
+        pos = np.clip(np.searchsorted(sorted_ids, flat), 0, len(sorted_ids) - 1)
+        match = sorted_ids[pos] == flat
+
+        # Flat pixel positions and the hydrograph column each one adds to
+        self.positions = np.flatnonzero(match)
+        self.segments = order[pos[match]]
+        self.pixel_counts = np.bincount(self.segments, minlength=len(self.ids))
+
+        missing = int(np.count_nonzero(self.pixel_counts == 0))
+        if missing:
+            logger.warning(f"{missing} of {len(self.ids)} IDs have no pixels in the label raster")
+
+    def sum(self, field):
+        """Per-ID sum of a field on the label grid; NaNs count as zero."""
+        if field.shape != self.shape:
+            raise ValueError(f"Field shape {field.shape} does not match label raster {self.shape}")
+        values = field.ravel()[self.positions]
+        values = np.where(np.isfinite(values), values, 0.0)
+        return np.bincount(self.segments, weights=values, minlength=len(self.ids))
+
+def create_floodevent_hydrograph_runoff(extracted_hyg, time):
+    """Hydrograph table: time column, a zero column, then one runoff column per ID."""
+    rows, cols = extracted_hyg.shape
+    temp_r_timesrs = np.zeros((rows, cols + 1))
+    temp_r_timesrs[:, 1:] = extracted_hyg
+    return np.column_stack((time, temp_r_timesrs))
+
+def save_hydrograph(file_path, data):
+    """Writes a hydrograph table in the TRITON .hyg format."""
+    with open(file_path, 'w') as f:
+        f.write('%Time(hr) Runoff(mm/hr)\n')
+        np.savetxt(f, data, delimiter=',', fmt='%.4f')
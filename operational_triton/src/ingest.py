@@ -1,59 +1,176 @@
-import subprocess
-import logging
 import os
+import json
+import fcntl
+import shutil
+import logging
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from hydrograph import parse_lis_time
+from metrics import get_registry, BYTES, FILES
 
 logger = logging.getLogger(__name__)
 
+# Bump when the manifest layout changes so old manifests are ignored
+MANIFEST_VERSION = 1
+
+def copy_atomic(source, destination):
+    """
+    Copies a file so readers never see it partially written.
+
+    The data goes to a hidden temporary file next to the destination, which
+    is renamed into place after the copy (and mtime) is complete.
+
+    Returns:
+        tuple: (size, mtime_ns) of the source before the copy
+    """
+    st = os.stat(source)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    tmp_path = os.path.join(os.path.dirname(destination), f".{os.path.basename(destination)}.{os.getpid()}.tmp")
+    try:
+        shutil.copyfile(source, tmp_path)
+        shutil.copystat(source, tmp_path)
+        after = os.stat(source)
+        if (after.st_size, after.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+            raise IOError(f"{source} changed while copying (still being written?)")
+        os.replace(tmp_path, destination)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return st.st_size, st.st_mtime_ns
+
 class DataIngestor:
     def __init__(self, config):
         self.config = config
         self.feed_dir = config.get("global.feed_dir")
         self.work_dir = config.get("global.work_dir")
         self.input_dir = os.path.join(self.work_dir, "01_LISinput")
+        self.max_workers = config.get("ingest.max_workers", 4)
+        self.manifest_path = config.get("ingest.manifest") or os.path.join(self.input_dir, ".ingest_manifest.json")
+        # Feed-relative path -> [size, mtime_ns] of every file copied so far
+        self.manifest = self._load_manifest()
+        # Concurrent syncs (one per timestep in the task graph) share the manifest
+        self._lock = threading.Lock()
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read ingest manifest {self.manifest_path}: {e}. Re-checking all files.")
+            return {}
+        if manifest.get("version") != MANIFEST_VERSION:
+            return {}
+        return manifest.get("files", {})
+
+    def _save_manifest(self):
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        # Other processes (hindcast workers) may have recorded files meanwhile: merge under a file lock
+        with open(f"{self.manifest_path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            on_disk = self._load_manifest()
+            on_disk.update(self.manifest)
+            self.manifest.update(on_disk)
+            tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"version": MANIFEST_VERSION, "files": on_disk}, f)
+            os.replace(tmp_path, self.manifest_path)
+
+    def date_dir(self, date_str):
+        """Feed-relative directory of a date: YYYY/Mon/DD/LIS-DD"""
+        date_obj = datetime.strptime(date_str, "%Y-%m-%d")
+        return os.path.join(date_obj.strftime("%Y"), date_obj.strftime("%b"), date_obj.strftime("%d"), "LIS-DD")
+
+    def feed_timesteps(self, date_str):
+        """Valid times of the LIS files of a date present in the feed."""
+        try:
+            names = os.listdir(os.path.join(self.feed_dir, self.date_dir(date_str)))
+        except OSError:
+            return []
+        return sorted({t for t in (parse_lis_time(n) for n in names if not n.startswith(".")) if t})
 
-    def sync_data(self, date_str):
+    def pending_files(self, date_str, timesteps=None):
         """
-        Syncs LIS data for a specific date using rsync.
-        Constructs the source path dynamically: YYYY/Mon/DD/LIS-DD
+        Feed-relative paths of the LIS files of a date that are new or changed
+        since they were last ingested (or missing from 01_LISinput).
         """
-        date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-        year = date_obj.strftime("%Y")
-        month_abbr = date_obj.strftime("%b") # e.g., Dec
-        day = date_obj.strftime("%d")
-
-        # Dynamic source path construction
-        # Pattern: /feed_dir/YYYY/Mon/*/LIS-DD
-        # Note: The wildcard * in the middle (from original script) needs to be handled.
-        # rsync doesn't expand remote wildcards like shell does if not using a shell.
-        # We assume the structure is consistent.
-        
-        source_pattern = f"{year}/{month_abbr}/*/LIS-DD"
-        source_path = os.path.join(self.feed_dir, source_pattern)
-        
-        # Since we can't easily use wildcards in the middle of a path with simple rsync calls 
-        # without shell expansion, we might need to be more specific or use shell=True.
-        # For now, we'll use the shell expansion capability of rsync or python glob if local.
-        # Assuming feed_dir is mounted locally as per the original script.
-        
-        full_source_pattern = os.path.join(self.feed_dir, year, month_abbr, "*", "LIS-DD")
-        
-        cmd = [
-            "rsync",
-            "-av",
-            "--relative",
-            full_source_pattern,
-            self.input_dir
-        ]
+        relative_dir = self.date_dir(date_str)
+        wanted = set(timesteps) if timesteps is not None else None
+        pending = []
+        with os.scandir(os.path.join(self.feed_dir, relative_dir)) as it:
+            for entry in it:
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                valid_time = parse_lis_time(entry.name)
+                if valid_time is None or (wanted is not None and valid_time not in wanted):
+                    continue
+                relative_path = os.path.join(relative_dir, entry.name)
+                st = entry.stat()
+                if self.manifest.get(relative_path) == [st.st_size, st.st_mtime_ns] and \
+                        os.path.exists(os.path.join(self.input_dir, relative_path)):
+                    continue
+                pending.append(relative_path)
+        return sorted(pending)
+
+    def sync_data(self, date_str, timesteps=None):
+        """
+        Copies new LIS files of a date from the feed to 01_LISinput/YYYY/Mon/DD/LIS-DD.
+        Replaces bin/00_rsync.sh
+
+        Only files missing from the manifest or whose size or mtime changed are
+        copied, several at a time (ingest.max_workers), each written atomically.
+
+        Args:
+            date_str (str): Date (YYYY-MM-DD).
+            timesteps (list): Only ingest these valid times (default: all of the date).
 
+        Returns:
+            bool: True if every pending file was copied.
+        """
         logger.info(f"Syncing data for {date_str}...")
-        logger.debug(f"Command: {' '.join(cmd)}")
+        with get_registry().timer("ingest"):
+            return self._sync(date_str, timesteps)
 
+    def _sync(self, date_str, timesteps):
+        metrics = get_registry()
         try:
-            # Using shell=True to allow wildcard expansion by the shell
-            subprocess.run(f"rsync -av --relative {full_source_pattern} {self.input_dir}", shell=True, check=True, executable="/bin/bash")
-            logger.info(f"Successfully synced data for {date_str}")
+            pending = self.pending_files(date_str, timesteps)
+        except OSError as e:
+            logger.error(f"Cannot list feed data for {date_str}: {e}")
+            return False
+
+        if not pending:
+            logger.info(f"No new files for {date_str}")
             return True
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Rsync failed for {date_str}: {e}")
+
+        def copy(relative_path):
+            return copy_atomic(os.path.join(self.feed_dir, relative_path), os.path.join(self.input_dir, relative_path))
+
+        failed = 0
+        n_bytes = 0
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(pending)))) as pool:
+            futures = {relative_path: pool.submit(copy, relative_path) for relative_path in pending}
+            for relative_path, future in futures.items():
+                try:
+                    size, mtime_ns = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to copy {relative_path}: {e}")
+                    failed += 1
+                    continue
+                with self._lock:
+                    self.manifest[relative_path] = [size, mtime_ns]
+                n_bytes += size
+        with self._lock:
+            self._save_manifest()
+
+        metrics.inc(FILES, len(pending) - failed, stage="ingest", status="copied")
+        metrics.inc(FILES, failed, stage="ingest", status="failed")
+        metrics.inc(BYTES, n_bytes, stage="ingest")
+        logger.info(f"Copied {len(pending) - failed} of {len(pending)} new files ({n_bytes / 1e6:.1f} MB) for {date_str}")
+        if failed:
+            logger.error(f"Sync incomplete for {date_str}: {failed} file(s) failed")
             return False
+        logger.info(f"Successfully synced data for {date_str}")
+        return True
@@ -2,13 +2,18 @@ import argparse
 import logging
 from config import Config
 from utils import setup_logging
+from metrics import configure_metrics
 from workflow import WorkflowEngine
+from hindcast import run_hindcast
 
 def main():
     parser = argparse.ArgumentParser(description="Operational TRITON Workflow")
     parser.add_argument("--config", default="config.yaml", help="Path to configuration file")
-    parser.add_argument("--mode", choices=["daemon", "run-once"], default="run-once", help="Operation mode")
+    parser.add_argument("--mode", choices=["daemon", "run-once", "hindcast"], default="run-once", help="Operation mode")
     parser.add_argument("--date", help="Date to process (YYYY-MM-DD) for run-once mode")
+    parser.add_argument("--start-date", help="First date (YYYY-MM-DD) for hindcast mode")
+    parser.add_argument("--end-date", help="Last date (YYYY-MM-DD) for hindcast mode")
+    parser.add_argument("--workers", type=int, help="Dates processed concurrently in hindcast mode")
     
     args = parser.parse_args()
 
@@ -16,6 +21,15 @@ def main():
     config = Config(args.config)
     setup_logging(log_dir=config.get("global.log_dir"))
     logger = logging.getLogger(__name__)
+    # Stage timings, volumes, queue depths and arrival latency (see metrics.py)
+    configure_metrics(config)
+
+    if args.mode == "hindcast":
+        if not args.start_date or not args.end_date:
+            logger.error("--start-date and --end-date are required for hindcast mode")
+            return
+        run_hindcast(config, args.start_date, args.end_date, args.workers)
+        return
 
     engine = WorkflowEngine(config)
 
@@ -25,7 +39,8 @@ def main():
         if not args.date:
             logger.error("--date is required for run-once mode")
             return
-        engine.run_pipeline(args.date)
+        # Task graph with persistent state: a rerun only repeats what failed
+        engine.run_graph({args.date: None})
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Series recorded across the workflow: name -> (type, help)
+STAGE_SECONDS = "triton_stage_duration_seconds"
+BYTES = "triton_bytes_total"
+FILES = "triton_files_total"
+QUEUE_DEPTH = "triton_queue_depth"
+ARRIVAL_TO_DECISION = "triton_arrival_to_decision_seconds"
+
+METRICS = {
+    STAGE_SECONDS: ("histogram", "Wall time of one run of a workflow stage"),
+    BYTES: ("counter", "Bytes handled per stage"),
+    FILES: ("counter", "Files handled per stage and outcome"),
+    QUEUE_DEPTH: ("gauge", "Items waiting in a workflow queue"),
+    ARRIVAL_TO_DECISION: ("histogram", "Seconds from LIS file arrival to the high-res trigger decision"),
+}
+
+# Histogram upper bounds in seconds, from a band decode to a late timestep
+DEFAULT_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms of the workflow.
+
+    The current values are written as a Prometheus textfile (for the node
+    exporter's textfile collector) by export(); every update is also
+    appended to a JSON lines file when one is configured.
+    """
+
+    def __init__(self, textfile=None, jsonl=None, buckets=DEFAULT_BUCKETS):
+        """
+        Args:
+            textfile (str): Prometheus textfile written by export() (optional).
+            jsonl (str): File every update is appended to (optional).
+            buckets (tuple): Histogram bucket upper bounds.
+        """
+        self.textfile = textfile
+        self.jsonl = jsonl
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def _record(self, kind, name, value, labels):
+        if not self.jsonl:
+            return
+        line = json.dumps({"time": time.time(), "metric": name, "type": kind, "labels": labels, "value": value})
+        try:
+            with open(self.jsonl, "a") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logger.warning(f"Could not append to metrics log {self.jsonl}: {e}")
+
+    def inc(self, name, value=1, **labels):
+        """Adds to a counter."""
+        with self._lock:
+            key = (name, _label_key(labels))
+            self.values[key] = self.values.get(key, 0) + value
+            self._record("counter", name, value, labels)
+
+    def set(self, name, value, **labels):
+        """Sets a gauge."""
+        with self._lock:
+            self.values[(name, _label_key(labels))] = value
+            self._record("gauge", name, value, labels)
+
+    def observe(self, name, value, **labels):
+        """Adds an observation to a histogram."""
+        with self._lock:
+            key = (name, _label_key(labels))
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                histogram["buckets"][index] += 1
+            histogram["count"] += 1
+            histogram["sum"] += value
+            self._record("histogram", name, value, labels)
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        """Times a block as one run of `stage` (recorded even if it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(STAGE_SECONDS, time.perf_counter() - start, stage=stage, **labels)
+
+    def get(self, name, **labels):
+        """Current value of a counter or gauge, or a histogram's {count, sum, buckets}."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            if key in self.histograms:
+                return dict(self.histograms[key])
+            return self.values.get(key)
+
+    def render(self):
+        """Prometheus text exposition of all series."""
+        with self._lock:
+            names = sorted({name for name, _ in self.values} | {name for name, _ in self.histograms})
+            lines = []
+            for name in names:
+                kind, help_text = METRICS.get(name, ("untyped", name))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for (series, key), value in sorted(self.values.items()):
+                    if series == name:
+                        lines.append(f"{name}{_format_labels(key)} {value}")
+                for (series, key), histogram in sorted(self.histograms.items()):
+                    if series != name:
+                        continue
+                    cumulative = 0
+                    for bound, n in zip(self.buckets, histogram["buckets"]):
+                        cumulative += n
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', str(bound))])} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {histogram['count']}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram['sum']}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        """Writes the Prometheus textfile atomically (scrapers never see a partial file)."""
+        if not self.textfile:
+            return
+        try:
+            directory = os.path.dirname(self.textfile)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.textfile}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(self.render())
+            os.replace(tmp_path, self.textfile)
+        except OSError as e:
+            logger.warning(f"Could not write metrics textfile {self.textfile}: {e}")
+
+_registry = MetricsRegistry()
+
+def get_registry():
+    """The process-wide metrics registry."""
+    return _registry
+
+def configure_metrics(config):
+    """Points the process-wide registry at the files in metrics.textfile / metrics.jsonl."""
+    metrics_dir = os.path.join(config.get("global.work_dir"), "metrics")
+    _registry.textfile = config.get("metrics.textfile") or os.path.join(metrics_dir, "triton.prom")
+    _registry.jsonl = config.get("metrics.jsonl")
+    if _registry.jsonl:
+        os.makedirs(os.path.dirname(_registry.jsonl) or ".", exist_ok=True)
+    return _registry
@@ -1,10 +1,15 @@
 import os
 import logging
 import numpy as np
-from osgeo import gdal
-import shapefile
 from datetime import datetime, timedelta
-# import pyslurm # Commented out as we might not have it installed in this env, using mock or subprocess
+from raster import read_geotransform, read_raster_window, site_window
+from sitemask import load_site_mask
+from slurm import SlurmJobManager
+from metrics import get_registry
+from hydrograph import (
+    LabelIndex, generate_dates, runoff_file,
+    create_floodevent_hydrograph_runoff, save_hydrograph,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -13,57 +18,231 @@ class TritonModel:
         self.config = config
         self.work_dir = config.get("global.work_dir")
         self.output_dir = os.path.join(self.work_dir, "03_TRITON_NRT")
+        self.postproc_dir = os.path.join(self.work_dir, "02_LISpostproc")
+        self.runoff_bands = config.get("model.runoff_bands", [24, 25])
+        self.interval_hours = config.get("model.interval_hours", 3)
+        self.mask_cache_dir = config.get("model.mask_cache_dir") or os.path.join(self.work_dir, "site_masks")
         os.makedirs(self.output_dir, exist_ok=True)
+        # (SiteMask, LabelIndex) per site, loaded on first use and reused across runs
+        self._label_indexes = {}
+        # Pixel window of each site in the runoff rasters, computed once per site
+        self._windows = {}
+        # High-resolution TRITON runs (sbatch/squeue/sacct via slurm.commands)
+        self.jobs = SlurmJobManager.from_config(config)
 
-    def generate_hydrograph(self, start_date, site_name="osan"):
+    def get_label_index(self, site_name, site_config):
+        """Returns the site mask and label index of a site, loading them on first use."""
+        if site_name not in self._label_indexes:
+            mask = load_site_mask(site_name, site_config, self.mask_cache_dir)
+            self._label_indexes[site_name] = (mask, LabelIndex(mask.labels, mask.ids))
+        return self._label_indexes[site_name]
+
+    def get_window(self, site_name, mask, geotransform, shape):
+        """Returns the pixel window of a site in the runoff grid, computing it on first use."""
+        if site_name not in self._windows:
+            if mask.geotransform:
+                window = site_window(mask.geotransform, mask.window, geotransform, shape, flip=True)
+            else:
+                # No georeference stored: the runoff grid is the label grid
+                if tuple(shape) != mask.grid_shape:
+                    raise ValueError(f"Runoff grid {shape} does not match label grid {mask.grid_shape}")
+                row_off, col_off, rows, cols = mask.window
+                window = (shape[0] - row_off - rows, col_off, rows, cols)
+            self._windows[site_name] = window
+            logger.info(f"Reading window {window} of {shape} runoff grids for {site_name}")
+        return self._windows[site_name]
+
+    @staticmethod
+    def union_window(windows):
+        """Smallest (row_off, col_off, rows, cols) window covering all given windows."""
+        row = min(w[0] for w in windows)
+        col = min(w[1] for w in windows)
+        rows = max(w[0] + w[2] for w in windows) - row
+        cols = max(w[1] + w[3] for w in windows) - col
+        return row, col, rows, cols
+
+    @staticmethod
+    def crop_window(block, block_window, window):
+        """
+        Part of a flipped block read over `block_window` that covers `window`
+        (both in file coordinates, see read_raster_window(flip=True)).
+        """
+        row_off, col_off, rows, _ = block_window
+        top = row_off + rows - (window[0] + window[2])
+        left = window[1] - col_off
+        return block[top:top + window[2], left:left + window[3]]
+
+    def read_runoff(self, masks, date, runoff=None):
+        """
+        Total runoff (sum of the runoff bands) of several sites at one timestep.
+
+        Each band is read once over the window covering all sites and then
+        cropped per site, so extra sites add no raster I/O. Decoded bands
+        passed in `runoff` (valid time -> {band: (data, geotransform)}, see
+        DataProcessor.decode_date) are used in place of the GeoTIFFs.
+
+        Args:
+            masks (dict): site name -> SiteMask.
+            date (datetime): Timestep.
+
+        Returns:
+            dict: site name -> np.ndarray, or None if the timestep is not available.
         """
-        Generates the runoff hydrograph (.hyg) file.
+        if runoff is not None and date in runoff:
+            data, geotransform = runoff[date][self.runoff_bands[0]]
+            windows = {site: self.get_window(site, mask, geotransform, data.shape) for site, mask in masks.items()}
+            block_window = self.union_window(list(windows.values()))
+            row, col, rows, cols = block_window
+            total = None
+            for band in self.runoff_bands:
+                data, _ = runoff[date][band]
+                # Same orientation and nodata handling as read_raster_window(flip=True)
+                part = np.flipud(data[row:row + rows, col:col + cols]).astype(np.float32)
+                part[part == 9999] = np.nan
+                total = part if total is None else total + part
+        else:
+            files = [runoff_file(self.postproc_dir, date, band) for band in self.runoff_bands]
+            if not all(os.path.exists(f) for f in files):
+                return None
+            if any(site not in self._windows for site in masks):
+                geotransform, shape = read_geotransform(files[0])
+                for site, mask in masks.items():
+                    self.get_window(site, mask, geotransform, shape)
+            windows = {site: self._windows[site] for site in masks}
+            block_window = self.union_window(list(windows.values()))
+            total = sum(read_raster_window(f, block_window, flip=True) for f in files)
+
+        return {site: self.crop_window(total, block_window, window) for site, window in windows.items()}
+
+    def generate_hydrographs(self, start_date, site_names, end_date=None, runoff=None):
+        """
+        Generates the runoff hydrograph (.hyg) files of several sites in one pass.
         Replaces A02_write_runoff_hyg_endtoend_LISarchive.py
+
+        Every timestep's runoff bands are read once for all sites (see
+        read_runoff). With `runoff` (from DataProcessor.decode_date) the
+        decoded bands are used directly instead of re-reading GeoTIFFs from
+        02_LISpostproc.
+
+        Returns:
+            dict: site name -> True (high-res triggered), False, or None if
+                  the site is not configured or no runoff data was found.
         """
-        site_config = self.config.get(f"sites.{site_name}")
-        if not site_config:
-            logger.error(f"No config found for site {site_name}")
-            return None
+        results = {}
+        sites = self.load_sites(site_names)
+        for site_name in site_names:
+            if site_name not in sites:
+                results[site_name] = None
+        if not sites:
+            return results
+
+        logger.info(f"Generating hydrographs for {', '.join(sites)} starting {start_date}")
+
+        start = datetime.strptime(start_date, "%Y-%m-%d")
+        end = datetime.strptime(end_date or start_date, "%Y-%m-%d") + timedelta(hours=23)
+        dates = generate_dates(start, end, self.interval_hours)
+        with get_registry().timer("hydrograph"):
+            roff_hyg, n_read = self.extract_runoff(sites, dates, runoff)
+
+        for site_name, (site_config, _, _) in sites.items():
+            if n_read == 0:
+                logger.error(f"No runoff data found for {site_name} between {start:%Y-%m-%d} and {end:%Y-%m-%d}")
+                results[site_name] = None
+                continue
+            results[site_name] = self.write_hydrograph(site_name, site_config, roff_hyg[site_name], start, end)
+        return results
+
+    def load_sites(self, site_names):
+        """Returns {site name: (site config, SiteMask, LabelIndex)} of the configured sites."""
+        sites = {}
+        for site_name in site_names:
+            site_config = self.config.get(f"sites.{site_name}")
+            if not site_config:
+                logger.error(f"No config found for site {site_name}")
+                continue
+            sites[site_name] = (site_config,) + self.get_label_index(site_name, site_config)
+        return sites
+
+    def extract_runoff(self, sites, dates, runoff=None):
+        """
+        Per-ID runoff of several sites at each timestep (see read_runoff).
+
+        Args:
+            sites (dict): From load_sites().
+            dates (list): Timesteps (datetime).
+
+        Returns:
+            tuple: ({site name: (len(dates), n_ids) array, zero where missing}, timesteps read)
+        """
+        masks = {site: mask for site, (_, mask, _) in sites.items()}
+        roff_hyg = {site: np.zeros((len(dates), len(index.ids))) for site, (_, _, index) in sites.items()}
+        n_read = 0
+        for i, date in enumerate(dates):
+            totals = self.read_runoff(masks, date, runoff)
+            if totals is None:
+                logger.warning(f"Runoff missing for {date:%Y-%m-%d %H:%M}. Skipping...")
+                continue
+            for site, (_, _, index) in sites.items():
+                roff_hyg[site][i] = index.sum(totals[site])
+            n_read += 1
+        return roff_hyg, n_read
+
+    def write_hydrograph(self, site_name, site_config, roff_hyg, start, end):
+        """
+        Writes one site's hydrograph and returns whether it triggers high-res modeling.
+
+        Row i of `roff_hyg` is the runoff accumulated at start + i * interval_hours.
+        """
+        # Accumulated runoff per interval -> rate in mm/hr
+        rates = roff_hyg / self.interval_hours
+        out_hyg = create_floodevent_hydrograph_runoff(
+            rates, np.arange(self.interval_hours, self.interval_hours * len(rates) + 1, self.interval_hours)
+        )
+        hyg_path = os.path.join(self.output_dir, f"{site_name}_{start:%Y%m%d}_{end:%Y%m%d}.hyg")
+        save_hydrograph(hyg_path, out_hyg)
+        logger.info(f"Saved hydrograph {hyg_path}")
 
-        logger.info(f"Generating hydrograph for {site_name} starting {start_date}")
-        
-        # ... (Implementation of the runoff summation logic) ...
-        # This would contain the logic to read the TIFFs generated by process.py,
-        # apply the shapefile mask from site_config['shapefile'],
-        # and sum the runoff.
-        
-        # Placeholder for the core logic
-        # ...
-        
         # Threshold Trigger Check
-        total_runoff = 10.0 # Example calculated value
+        peak_runoff = float(rates.max())
         threshold = site_config.get("threshold_trigger", 5.0)
-        
-        if total_runoff > threshold:
-            logger.info(f"Runoff {total_runoff} exceeds threshold {threshold}. High-res modeling triggered.")
+
+        if peak_runoff > threshold:
+            logger.info(f"{site_name}: runoff {peak_runoff} exceeds threshold {threshold}. High-res modeling triggered.")
             return True # Trigger high-res
         else:
-            logger.info(f"Runoff {total_runoff} below threshold {threshold}. Skipping high-res.")
+            logger.info(f"{site_name}: runoff {peak_runoff} below threshold {threshold}. Skipping high-res.")
             return False
 
+    def generate_hydrograph(self, start_date, site_name="osan", end_date=None, runoff=None):
+        """Generates the hydrograph of one site (see generate_hydrographs)."""
+        return self.generate_hydrographs(start_date, [site_name], end_date, runoff)[site_name]
+
     def submit_job(self, job_script_path):
-        """Submits a SLURM job."""
+        """Submits a SLURM job and returns its ID, or None if sbatch failed."""
         logger.info(f"Submitting job: {job_script_path}")
-        # try:
-        #     job_id = pyslurm.job().submit_batch_job({'script': job_script_path})
-        #     logger.info(f"Job submitted with ID: {job_id}")
-        #     return job_id
-        # except Exception as e:
-        #     logger.error(f"Failed to submit job: {e}")
-        #     return None
-        return "12345" # Mock Job ID
+        try:
+            job_id = self.jobs.run(self.jobs.submit(job_script_path, cwd=os.path.dirname(job_script_path) or None)).result()
+            logger.info(f"Job submitted with ID: {job_id}")
+            return job_id
+        except Exception as e:
+            logger.error(f"Failed to submit job: {e}")
+            return None
+
+    def submit_jobs(self, job_scripts, on_complete=None):
+        """
+        Submits several SLURM jobs concurrently; they are then tracked in the
+        background and `on_complete(job_id, state)` runs as each one finishes.
+
+        Returns:
+            dict: script -> job ID (or the submission error)
+        """
+        callbacks = [on_complete] if on_complete else []
+        return self.jobs.run(self.jobs.submit_many(list(job_scripts), callbacks)).result()
 
     def monitor_job(self, job_id):
         """Checks the status of a SLURM job."""
-        # try:
-        #     job = pyslurm.job().find_id(job_id)
-        #     state = job['job_state']
-        #     return state
-        # except Exception:
-        #     return "UNKNOWN"
-        return "COMPLETED" # Mock Status
+        try:
+            return self.jobs.run(self.jobs.query([job_id])).result()[job_id]
+        except Exception as e:
+            logger.error(f"Failed to query job {job_id}: {e}")
+            return "UNKNOWN"
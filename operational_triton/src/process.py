@@ -1,4 +1,6 @@
 import os
+import glob
+import time
 import logging
 import pygrib
 import numpy as np
@@ -7,29 +9,158 @@ import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import cartopy.crs as ccrs
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from hydrograph import parse_lis_time
+from watcher import is_partial
+from gribindex import GribIndex
+from metrics import get_registry, STAGE_SECONDS, BYTES, FILES
 
 logger = logging.getLogger(__name__)
 
+def write_geotiff(output_path, data, lat, lon, grb):
+    """Writes one decoded GRIB message as a GeoTIFF (EPSG:4326)."""
+    driver = gdal.GetDriverByName('GTiff')
+    dataset = driver.Create(
+        output_path,
+        lon.shape[1], lat.shape[0], 1, gdal.GDT_Float32)
+    
+    # GeoTransform: [top_left_x, w_e_pixel_resolution, 0, top_left_y, 0, n_s_pixel_resolution]
+    # Note: grb.Di and grb.Dj might need adjustment for direction
+    dataset.SetGeoTransform([lon.min(), grb.Di, 0, lat.max(), 0, -grb.Dj])
+    
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    dataset.SetProjection(srs.ExportToWkt())
+
+    dataset.GetRasterBand(1).WriteArray(data)
+    dataset.FlushCache()
+
+class _PygribMessages:
+    """Sequential pygrib access with the GribIndex interface (used without an index)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.grbs = pygrib.open(path)
+        # (number, shortName, name) of every message, listed on the first lookup by name
+        self._names = None
+
+    def resolve(self, band):
+        """
+        Message number of a band given as a 1-based message number or a
+        shortName/name, as GribIndex.resolve.
+
+        Raises:
+            KeyError: If the name matches no message or several.
+        """
+        if isinstance(band, int):
+            return band
+        if self._names is None:
+            self.grbs.seek(0)
+            self._names = [(grb.messagenumber, grb.shortName, grb.name) for grb in self.grbs]
+        matches = ([number for number, short_name, _ in self._names if short_name == band]
+                   or [number for number, _, name in self._names if name == band])
+        if len(matches) != 1:
+            raise KeyError(f"Band {band!r} matches {len(matches)} messages in {self.path}")
+        return matches[0]
+
+    def decode(self, band):
+        return self.grbs.message(band)
+
+    def close(self):
+        self.grbs.close()
+
+def open_messages(grib_file_path, use_index=True, index_dir=None):
+    """Opens a GRIB file for band access through its offset index or plain pygrib."""
+    if use_index:
+        return GribIndex(grib_file_path, cache_dir=index_dir)
+    return _PygribMessages(grib_file_path)
+
+def convert_grib_file(grib_file_path, postproc_dir, band_indices, use_index=True, index_dir=None):
+    """
+    Converts all requested bands of one GRIB file to GeoTIFF with a single open.
+
+    Bands are message numbers or short names. GeoTIFFs are named after the
+    band as given (see hydrograph.runoff_file), so TritonModel finds them
+    with the same model.runoff_bands.
+
+    Runs in the worker processes of DataProcessor.convert_batch, so it only
+    takes and returns plain (picklable) values.
+
+    Returns:
+        dict: file, success, outputs (GeoTIFF paths), failed_bands
+              (band -> error), error (file-level), seconds, with the
+              decode_seconds / write_seconds split and the file's bytes.
+    """
+    start = time.perf_counter()
+    result = {"file": grib_file_path, "success": False, "outputs": [], "failed_bands": {}, "error": None,
+              "decode_seconds": 0.0, "write_seconds": 0.0, "bytes": 0}
+    output_filename = os.path.splitext(os.path.basename(grib_file_path))[0]
+    try:
+        messages = open_messages(grib_file_path, use_index, index_dir)
+        try:
+            for band in band_indices:
+                try:
+                    band_start = time.perf_counter()
+                    number = messages.resolve(band)
+                    grb = messages.decode(number)
+                    values = grb.values
+                    lat, lon = grb.latlons()
+                    write_start = time.perf_counter()
+                    result["decode_seconds"] += write_start - band_start
+                    output_path = os.path.join(postproc_dir, f"{output_filename}_band_{band}.tif")
+                    write_geotiff(output_path, values, lat, lon, grb)
+                    result["write_seconds"] += time.perf_counter() - write_start
+                    result["outputs"].append(output_path)
+                except Exception as e:
+                    result["failed_bands"][band] = str(e)
+        finally:
+            if hasattr(messages, "close"):
+                messages.close()
+        result["success"] = not result["failed_bands"]
+        result["bytes"] = os.path.getsize(grib_file_path)
+    except Exception as e:
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
 class DataProcessor:
     def __init__(self, config):
         self.config = config
         self.work_dir = config.get("global.work_dir")
+        self.input_dir = os.path.join(self.work_dir, "01_LISinput")
         self.postproc_dir = os.path.join(self.work_dir, "02_LISpostproc")
+        self.band_indices = config.get("model.runoff_bands", [24, 25])
+        # GeoTIFFs are the archival side output of the in-memory path
+        self.write_tiff = config.get("process.write_tiff", True)
+        # Read bands through a cached per-file message offset index (see gribindex.py)
+        self.use_index = config.get("process.grib_index", True)
+        # Sidecars stay out of 01_LISinput, where they would be taken for LIS files
+        self.index_dir = config.get("process.index_dir") or os.path.join(self.work_dir, "grib_index")
         os.makedirs(self.postproc_dir, exist_ok=True)
 
-    def check_data_availability(self, date_str):
-        """Checks if the input directory for a given date exists."""
-        # Logic to check specific directory structure in 01_LISinput
-        # This needs to match how rsync places files.
-        # Assuming rsync --relative preserves the full path structure.
-        # input_dir/feed_dir_structure/YYYY/Mon/Day/LIS-DD
-        
-        # For simplicity, let's assume we search for the LIS-DD folder
-        # We might need to walk the directory or know the exact path.
-        # Based on original script: $WORK_DIR/01_LISinput/2024/Dec/*/LIS-DD
-        
-        # This is a placeholder for the exact path logic
-        return True 
+    def lis_files(self, date_str, timesteps=None):
+        """
+        GRIB files synced for a date (01_LISinput/YYYY/Mon/DD/LIS-DD/*),
+        optionally only those of the given valid times. Partial transfers
+        and index sidecars are skipped as in the watcher (see is_partial).
+        """
+        date_obj = datetime.strptime(date_str, "%Y-%m-%d")
+        pattern = os.path.join(self.input_dir, date_obj.strftime("%Y"), date_obj.strftime("%b"),
+                               date_obj.strftime("%d"), "LIS-DD", "*")
+        files = sorted(f for f in glob.glob(pattern)
+                       if not is_partial(os.path.basename(f)) and parse_lis_time(os.path.basename(f)))
+        if timesteps is not None:
+            wanted = set(timesteps)
+            files = [f for f in files if parse_lis_time(os.path.basename(f)) in wanted]
+        return files
+
+    def check_data_availability(self, date_str, timesteps=None):
+        """Checks whether GRIB files of a date (or of all the given valid times) are in 01_LISinput."""
+        files = self.lis_files(date_str, timesteps)
+        if timesteps is None:
+            return bool(files)
+        return {parse_lis_time(os.path.basename(f)) for f in files} >= set(timesteps)
 
     def convert_grib_to_tiff(self, grib_file_path, output_filename, band_indices=[23, 24]):
         """Converts specific bands of a GRIB file to GeoTIFF."""
@@ -68,19 +199,110 @@ class DataProcessor:
             logger.error(f"Failed to process GRIB file {grib_file_path}: {e}")
             return False
 
+    def decode_grib(self, grib_file_path, band_indices=None, output_filename=None):
+        """
+        Decodes runoff bands of a GRIB file into memory.
+
+        Bands are returned as (data, geotransform) with the same array and
+        GeoTransform the GeoTIFF would get, so TritonModel can use them in
+        place of the files. With write_tiff enabled the GeoTIFFs are still
+        written to 02_LISpostproc as an archival side output.
+
+        Returns:
+            dict: band index -> (float32 data with NaN for missing values, geotransform)
+        """
+        band_indices = band_indices or self.band_indices
+        if output_filename is None:
+            output_filename = os.path.splitext(os.path.basename(grib_file_path))[0]
+        metrics = get_registry()
+        bands = {}
+        messages = open_messages(grib_file_path, self.use_index, self.index_dir)
+        try:
+            for band in band_indices:
+                with metrics.timer("grib_decode"):
+                    number = messages.resolve(band)
+                    grb = messages.decode(number)
+                    data = np.ma.filled(np.ma.asarray(grb.values, dtype=np.float32), np.nan)
+                    lat, lon = grb.latlons()
+                geotransform = [float(lon.min()), grb.Di, 0, float(lat.max()), 0, -grb.Dj]
+                bands[band] = (data, geotransform)
+                if self.write_tiff:
+                    output_path = os.path.join(self.postproc_dir, f"{output_filename}_band_{band}.tif")
+                    with metrics.timer("tiff_write"):
+                        self._write_geotiff(output_path, data, lat, lon, grb)
+                    logger.info(f"Generated {output_path}")
+        finally:
+            if hasattr(messages, "close"):
+                messages.close()
+        metrics.inc(FILES, stage="grib_decode", status="ok")
+        if os.path.exists(grib_file_path):
+            metrics.inc(BYTES, os.path.getsize(grib_file_path), stage="grib_decode")
+        return bands
+
+    def decode_date(self, date_str, band_indices=None, timesteps=None):
+        """
+        Decodes the runoff bands of every GRIB file of a date (or of the
+        given valid times only) into memory.
+
+        Returns:
+            dict: valid time (datetime) -> {band index: (data, geotransform)}
+        """
+        runoff = {}
+        for grib_file in self.lis_files(date_str, timesteps):
+            try:
+                runoff[parse_lis_time(os.path.basename(grib_file))] = self.decode_grib(grib_file, band_indices)
+            except Exception as e:
+                logger.error(f"Failed to decode GRIB file {grib_file}: {e}")
+        logger.info(f"Decoded {len(runoff)} timesteps for {date_str}")
+        return runoff
+
+    def convert_batch(self, grib_files, band_indices=None, max_workers=None):
+        """
+        Converts many GRIB files to GeoTIFF in parallel, one process per file.
+
+        Args:
+            grib_files (list): GRIB files to convert.
+            band_indices (list): Bands to extract, as message numbers or short names
+                (default: model.runoff_bands).
+            max_workers (int): Concurrent files (default: process.max_workers, or
+                the CPU count). 1 converts in this process.
+
+        Returns:
+            list: One result dict per file (see convert_grib_file), in input order.
+        """
+        band_indices = band_indices or self.band_indices
+        max_workers = max_workers or self.config.get("process.max_workers") or os.cpu_count() or 1
+        max_workers = min(max_workers, max(len(grib_files), 1))
+        args = [(f, self.postproc_dir, band_indices, self.use_index, self.index_dir) for f in grib_files]
+
+        if max_workers == 1:
+            results = [convert_grib_file(*a) for a in args]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                futures = [pool.submit(convert_grib_file, *a) for a in args]
+                results = []
+                for f, future in zip(grib_files, futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        # Worker crashed (e.g. killed); report it like any other failure
+                        results.append({"file": f, "success": False, "outputs": [], "failed_bands": {},
+                                        "error": str(e), "seconds": 0.0, "decode_seconds": 0.0,
+                                        "write_seconds": 0.0, "bytes": 0})
+
+        # Workers cannot reach this process's registry: record their timings here
+        metrics = get_registry()
+        for r in results:
+            metrics.observe(STAGE_SECONDS, r["decode_seconds"], stage="grib_decode")
+            metrics.observe(STAGE_SECONDS, r["write_seconds"], stage="tiff_write")
+            metrics.inc(FILES, stage="grib_convert", status="ok" if r["success"] else "failed")
+            metrics.inc(BYTES, r["bytes"], stage="grib_convert")
+
+        failed = [r for r in results if not r["success"]]
+        for r in failed:
+            logger.error(f"Failed to convert {r['file']}: {r['error'] or r['failed_bands']}")
+        logger.info(f"Converted {len(results) - len(failed)}/{len(results)} GRIB files with {max_workers} workers")
+        return results
+
     def _write_geotiff(self, output_path, data, lat, lon, grb):
-        driver = gdal.GetDriverByName('GTiff')
-        dataset = driver.Create(
-            output_path,
-            lon.shape[1], lat.shape[0], 1, gdal.GDT_Float32)
-        
-        # GeoTransform: [top_left_x, w_e_pixel_resolution, 0, top_left_y, 0, n_s_pixel_resolution]
-        # Note: grb.Di and grb.Dj might need adjustment for direction
-        dataset.SetGeoTransform([lon.min(), grb.Di, 0, lat.max(), 0, -grb.Dj])
-        
-        srs = osr.SpatialReference()
-        srs.ImportFromEPSG(4326)
-        dataset.SetProjection(srs.ExportToWkt())
-
-        dataset.GetRasterBand(1).WriteArray(data)
-        dataset.FlushCache()
+        write_geotiff(output_path, data, lat, lon, grb)
@@ -0,0 +1,75 @@
+import logging
+import numpy as np
+from osgeo import gdal
+
+logger = logging.getLogger(__name__)
+
+def read_raster(path, flip=False, nodata=9999):
+    """Reads band 1 of a GeoTIFF as float32 with `nodata` replaced by NaN."""
+    dataset = gdal.Open(path)
+    if dataset is None:
+        raise IOError(f"Could not open raster {path}")
+    array = np.asarray(dataset.GetRasterBand(1).ReadAsArray(), dtype=np.float32)
+    if flip:
+        array = np.flipud(array)
+    if nodata is not None:
+        array[array == nodata] = np.nan
+    return array
+
+def read_labels(path):
+    """Reads band 1 of an integer label GeoTIFF (e.g. LIS_UniqueId.tif) without float conversion."""
+    dataset = gdal.Open(path)
+    if dataset is None:
+        raise IOError(f"Could not open raster {path}")
+    return np.asarray(dataset.GetRasterBand(1).ReadAsArray())
+
+def read_geotransform(path):
+    """Returns (geotransform, (rows, cols)) of a raster without reading its data."""
+    dataset = gdal.Open(path)
+    if dataset is None:
+        raise IOError(f"Could not open raster {path}")
+    return tuple(dataset.GetGeoTransform()), (dataset.RasterYSize, dataset.RasterXSize)
+
+def site_window(site_geotransform, site_window_offsets, raster_geotransform, raster_shape, flip=False):
+    """
+    Pixel window of a site in a raster, from the two GeoTransforms.
+
+    Args:
+        site_geotransform (tuple): GeoTransform of the label grid the site mask was cut from.
+        site_window_offsets (tuple): (row_off, col_off, rows, cols) of the site in that grid.
+        raster_geotransform (tuple): GeoTransform of the raster to read.
+        raster_shape (tuple): (rows, cols) of the raster to read.
+        flip (bool): The raster is stored upside down (read_raster(flip=True)); its
+            GeoTransform then describes the flipped array.
+
+    Returns:
+        tuple: (row_off, col_off, rows, cols) in file pixel coordinates.
+    """
+    row_off, col_off, rows, cols = site_window_offsets
+    x0 = site_geotransform[0] + col_off * site_geotransform[1]
+    y0 = site_geotransform[3] + row_off * site_geotransform[5]
+    col = int(round((x0 - raster_geotransform[0]) / raster_geotransform[1]))
+    row = int(round((y0 - raster_geotransform[3]) / raster_geotransform[5]))
+    if flip:
+        row = raster_shape[0] - row - rows
+    if row < 0 or col < 0 or row + rows > raster_shape[0] or col + cols > raster_shape[1]:
+        raise ValueError(f"Site window {(row, col, rows, cols)} falls outside raster of shape {raster_shape}")
+    return row, col, rows, cols
+
+def read_raster_window(path, window, flip=False, nodata=9999):
+    """
+    Reads only a (row_off, col_off, rows, cols) window of band 1 as float32.
+
+    With flip=True the window is given in file coordinates (see site_window)
+    and the result is flipped like read_raster(flip=True).
+    """
+    row_off, col_off, rows, cols = window
+    dataset = gdal.Open(path)
+    if dataset is None:
+        raise IOError(f"Could not open raster {path}")
+    array = np.asarray(dataset.GetRasterBand(1).ReadAsArray(col_off, row_off, cols, rows), dtype=np.float32)
+    if flip:
+        array = np.flipud(array)
+    if nodata is not None:
+        array[array == nodata] = np.nan
+    return array
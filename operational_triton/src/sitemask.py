@@ -0,0 +1,128 @@
+import os
+import json
+import logging
+import numpy as np
+from raster import read_labels, read_geotransform
+from hydrograph import read_site_table
+
+logger = logging.getLogger(__name__)
+
+# Bump when the artifact layout changes so old caches are rebuilt
+MASK_VERSION = 1
+
+class SiteMask:
+    """
+    Integer label raster of one site cropped to the bounding box of its IDs.
+
+    `row_off`/`col_off` locate the crop in the full LIS_UniqueId grid
+    (`grid_shape`, georeferenced by `geotransform`), so runoff fields on the
+    same grid can be cropped with `crop()` before aggregation.
+    """
+
+    def __init__(self, site_name, labels, table, row_off, col_off, grid_shape, geotransform=None):
+        self.site_name = site_name
+        self.labels = labels
+        self.table = np.asarray(table)
+        self.row_off = int(row_off)
+        self.col_off = int(col_off)
+        self.grid_shape = tuple(int(n) for n in grid_shape)
+        self.geotransform = tuple(geotransform) if geotransform is not None else None
+
+    @property
+    def ids(self):
+        return self.table[:, 0]
+
+    @property
+    def window(self):
+        """(row_off, col_off, rows, cols) of the crop in the full grid."""
+        return (self.row_off, self.col_off) + self.labels.shape
+
+    def crop(self, field):
+        """Crops a full-grid field to the site window."""
+        if field.shape != self.grid_shape:
+            raise ValueError(f"Field shape {field.shape} does not match label grid {self.grid_shape}")
+        rows, cols = self.labels.shape
+        return field[self.row_off:self.row_off + rows, self.col_off:self.col_off + cols]
+
+def build_site_mask(site_name, shapefile_path, lis_grid_path):
+    """Builds a SiteMask from the site shapefile table and the full label raster."""
+    table = read_site_table(shapefile_path)
+    labels = read_labels(lis_grid_path)
+    geotransform, _ = read_geotransform(lis_grid_path)
+
+    inside = np.isin(labels, table[:, 0])
+    if not inside.any():
+        raise ValueError(f"None of the {len(table)} IDs of {site_name} occur in {lis_grid_path}")
+    rows = np.flatnonzero(inside.any(axis=1))
+    cols = np.flatnonzero(inside.any(axis=0))
+    r0, r1, c0, c1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+
+    # Smallest integer type holding the IDs; the IDs never go through float
+    cropped = labels[r0:r1, c0:c1]
+    dtype = np.int32 if np.abs(cropped).max(initial=0) < 2 ** 31 else np.int64
+    return SiteMask(site_name, np.ascontiguousarray(cropped, dtype=dtype), table, r0, c0, labels.shape, geotransform)
+
+def _source_signature(paths):
+    """Size and mtime of every source file (shapefile sidecars included)."""
+    signature = {}
+    for path in paths:
+        st = os.stat(path)
+        signature[os.path.abspath(path)] = [st.st_size, st.st_mtime_ns]
+    return signature
+
+def _shapefile_sources(shapefile_path):
+    base = os.path.splitext(shapefile_path)[0]
+    return [p for p in (base + ".shp", base + ".dbf") if os.path.exists(p)] or [shapefile_path]
+
+def load_site_mask(site_name, site_config, cache_dir):
+    """
+    Returns the SiteMask of a site, from the cache when its sources are unchanged.
+
+    The label raster is stored as .npy and opened memory-mapped; the table,
+    offsets and source signature go to a JSON file next to it. Any change
+    in size or mtime of the shapefile or LIS_UniqueId raster rebuilds it.
+    """
+    shapefile_path = site_config["shapefile"]
+    lis_grid_path = site_config["lis_grid"]
+    signature = _source_signature(_shapefile_sources(shapefile_path) + [lis_grid_path])
+
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path = os.path.join(cache_dir, f"{site_name}.mask.json")
+    labels_path = os.path.join(cache_dir, f"{site_name}.labels.npy")
+
+    if os.path.exists(meta_path) and os.path.exists(labels_path):
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get("version") == MASK_VERSION and meta.get("sources") == signature:
+                labels = np.load(labels_path, mmap_mode="r")
+                logger.info(f"Loaded cached site mask for {site_name} from {meta_path}")
+                return SiteMask(site_name, labels, meta["table"], meta["row_off"], meta["col_off"],
+                                meta["grid_shape"], meta.get("geotransform"))
+            logger.info(f"Site mask for {site_name} is stale. Rebuilding...")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not read cached site mask for {site_name}: {e}. Rebuilding...")
+
+    mask = build_site_mask(site_name, shapefile_path, lis_grid_path)
+
+    # Labels first, then the metadata that validates them; both replaced atomically
+    tmp_labels = f"{labels_path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_labels, mask.labels)
+    os.replace(tmp_labels, labels_path)
+    meta = {
+        "version": MASK_VERSION,
+        "sources": signature,
+        "table": mask.table.tolist(),
+        "row_off": mask.row_off,
+        "col_off": mask.col_off,
+        "grid_shape": list(mask.grid_shape),
+        "geotransform": list(mask.geotransform) if mask.geotransform is not None else None,
+    }
+    tmp_meta = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp_meta, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_meta, meta_path)
+    logger.info(f"Built site mask for {site_name}: window {mask.window} of grid {mask.grid_shape}")
+
+    mask.labels = np.load(labels_path, mmap_mode="r")
+    return mask
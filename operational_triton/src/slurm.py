@@ -0,0 +1,246 @@
+import re
+import asyncio
+import inspect
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Job states after which a job never runs again
+TERMINAL_STATES = {
+    "COMPLETED", "FAILED", "CANCELLED", "TIMEOUT", "OUT_OF_MEMORY", "NODE_FAIL",
+    "PREEMPTED", "BOOT_FAIL", "DEADLINE", "REVOKED", "SPECIAL_EXIT",
+}
+
+DEFAULT_COMMANDS = {
+    "sbatch": ["sbatch", "--parsable"],
+    "squeue": ["squeue", "--noheader", "--format=%i %T"],
+    "sacct": ["sacct", "--noheader", "--parsable2", "--format=JobID,State"],
+}
+
+_SUBMITTED = re.compile(r"(?:Submitted batch job\s+)?(\d+)(?:;\S+)?\s*$")
+
+def parse_job_id(output):
+    """Job ID from sbatch output ('12345', '12345;cluster' or 'Submitted batch job 12345')."""
+    match = _SUBMITTED.search(output.strip())
+    if not match:
+        raise RuntimeError(f"Unexpected sbatch output: {output.strip()!r}")
+    return match.group(1)
+
+def parse_states(output):
+    """{job ID: state} from 'ID STATE' (squeue) or 'ID|STATE' (sacct) lines; job steps are ignored."""
+    states = {}
+    for line in output.splitlines():
+        fields = line.replace("|", " ").split()
+        if len(fields) < 2 or "." in fields[0]:
+            continue
+        # sacct reports e.g. 'CANCELLED by 1234'
+        states[fields[0]] = fields[1].rstrip("+")
+    return states
+
+class SlurmJob:
+    def __init__(self, job_id, script, callbacks):
+        self.job_id = job_id
+        self.script = script
+        self.state = "PENDING"
+        # Consecutive polls in which neither squeue nor sacct reported the job
+        self.unknown_polls = 0
+        self.callbacks = list(callbacks)
+        self.done = asyncio.get_running_loop().create_future()
+
+class SlurmJobManager:
+    """
+    Submits SLURM jobs concurrently and tracks them with batched queries.
+
+    All outstanding jobs are checked with one squeue call per poll
+    interval; jobs that have left the queue get their final state from
+    one sacct call. Callbacks (plain functions or coroutines taking the
+    job ID and final state) run when a job finishes. The sbatch, squeue
+    and sacct commands are argument lists, so tests can substitute fakes.
+
+    A job reported by neither command (e.g. sacct accounting lag) stays
+    outstanding for `max_unknown_polls` polls before it is finished as
+    UNKNOWN; while the scheduler cannot be reached at all, jobs are left
+    as they are.
+    """
+
+    def __init__(self, commands=None, poll_interval=30, max_concurrent_submits=8, max_unknown_polls=5):
+        """
+        Args:
+            commands (dict): 'sbatch', 'squeue' and 'sacct' argument lists (default: DEFAULT_COMMANDS).
+            poll_interval (float): Seconds between status queries.
+            max_concurrent_submits (int): sbatch calls in flight at once.
+            max_unknown_polls (int): Polls a job may go unreported before it is finished as UNKNOWN.
+        """
+        self.commands = dict(DEFAULT_COMMANDS, **(commands or {}))
+        self.poll_interval = poll_interval
+        self.max_concurrent_submits = max_concurrent_submits
+        self.max_unknown_polls = max_unknown_polls
+        self.jobs = {}
+        self._semaphore = None
+        self._monitor = None
+        self._loop = None
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            commands=config.get("slurm.commands"),
+            poll_interval=config.get("slurm.poll_interval_seconds", 30),
+            max_concurrent_submits=config.get("slurm.max_concurrent_submits", 8),
+            max_unknown_polls=config.get("slurm.max_unknown_polls", 5),
+        )
+
+    async def _run(self, args, cwd=None):
+        process = await asyncio.create_subprocess_exec(
+            *args, cwd=cwd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(f"{args[0]} exited with {process.returncode}: {stderr.decode().strip()}")
+        return stdout.decode()
+
+    async def submit(self, script, cwd=None, callbacks=()):
+        """
+        Submits one job script (run from its directory unless `cwd` is given).
+
+        Returns:
+            str: Job ID
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_submits)
+        async with self._semaphore:
+            output = await self._run(self.commands["sbatch"] + [script], cwd=cwd)
+        job_id = parse_job_id(output)
+        self.jobs[job_id] = SlurmJob(job_id, script, callbacks)
+        logger.info(f"Submitted {script} as job {job_id}")
+        if self._monitor is None or self._monitor.done():
+            self._monitor = asyncio.create_task(self._monitor_loop())
+        return job_id
+
+    async def submit_many(self, scripts, callbacks=()):
+        """
+        Submits several job scripts concurrently.
+
+        Returns:
+            dict: script -> job ID, or the exception if its submission failed
+        """
+        results = await asyncio.gather(*(self.submit(s, callbacks=callbacks) for s in scripts), return_exceptions=True)
+        for script, result in zip(scripts, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to submit {script}: {result}")
+        return dict(zip(scripts, results))
+
+    def outstanding(self):
+        # Also called from other threads (e.g. the workflow's queue metrics) while
+        # submit() adds jobs on the loop thread: iterate over a snapshot
+        return [job_id for job_id, job in list(self.jobs.items()) if not job.done.done()]
+
+    async def query(self, job_ids):
+        """
+        States of several jobs from one squeue call, plus one sacct call for
+        jobs no longer in the queue.
+
+        Returns:
+            dict: job ID -> state ('UNKNOWN' if neither command reports it)
+
+        Raises:
+            RuntimeError: If both squeue and sacct fail (scheduler unreachable).
+        """
+        job_ids = list(job_ids)
+        if not job_ids:
+            return {}
+        squeue_error = None
+        try:
+            states = parse_states(await self._run(self.commands["squeue"] + ["--jobs=" + ",".join(job_ids)]))
+        except (RuntimeError, OSError) as e:
+            # squeue rejects the whole list once any job has been purged
+            logger.debug(f"squeue failed, asking sacct: {e}")
+            squeue_error = e
+            states = {}
+        gone = [j for j in job_ids if j not in states]
+        if gone:
+            try:
+                states.update(parse_states(await self._run(self.commands["sacct"] + ["--jobs=" + ",".join(gone)])))
+            except (RuntimeError, OSError) as e:
+                if squeue_error is not None:
+                    raise RuntimeError(f"squeue and sacct both failed: {squeue_error}; {e}") from e
+                logger.warning(f"sacct failed: {e}")
+        return {j: states.get(j, "UNKNOWN") for j in job_ids}
+
+    async def _monitor_loop(self):
+        while self.outstanding():
+            await asyncio.sleep(self.poll_interval)
+            job_ids = self.outstanding()
+            try:
+                states = await self.query(job_ids)
+            except (RuntimeError, OSError) as e:
+                # Scheduler hiccup: try again next interval
+                logger.warning(f"Job status query failed: {e}")
+                continue
+            for job_id, state in states.items():
+                job = self.jobs[job_id]
+                if state == "UNKNOWN":
+                    # sacct may lag behind squeue: only give up on a job after repeated misses
+                    job.unknown_polls += 1
+                    if job.unknown_polls >= self.max_unknown_polls:
+                        job.state = state
+                        await self._finish(job)
+                    continue
+                job.unknown_polls = 0
+                job.state = state
+                if state in TERMINAL_STATES:
+                    await self._finish(job)
+
+    async def _finish(self, job):
+        level = logging.INFO if job.state == "COMPLETED" else logging.ERROR
+        logger.log(level, f"Job {job.job_id} ({job.script}) finished: {job.state}")
+        job.done.set_result(job.state)
+        for callback in job.callbacks:
+            try:
+                result = callback(job.job_id, job.state)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Callback for job {job.job_id} failed: {e}")
+
+    async def wait(self, job_ids=None):
+        """
+        Waits for jobs (default: all submitted) to finish.
+
+        Returns:
+            dict: job ID -> final state
+        """
+        job_ids = list(job_ids) if job_ids is not None else list(self.jobs)
+        states = await asyncio.gather(*(self.jobs[j].done for j in job_ids))
+        return dict(zip(job_ids, states))
+
+    # Synchronous use from the workflow: the manager runs on its own event loop thread
+
+    def _background_loop(self):
+        if self._thread is None:
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name="slurm-jobs", daemon=True)
+            self._thread.start()
+        return self._loop
+
+    def run(self, coroutine):
+        """Runs a coroutine of this manager on its background loop and returns a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._background_loop())
+
+    async def shutdown(self):
+        """Stops tracking; jobs keep running in SLURM."""
+        if self._monitor is not None and not self._monitor.done():
+            self._monitor.cancel()
+            try:
+                await self._monitor
+            except asyncio.CancelledError:
+                pass
+
+    def close(self):
+        if self._thread is not None:
+            self.run(self.shutdown()).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._thread = None
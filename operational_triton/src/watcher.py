@@ -0,0 +1,264 @@
+import os
+import time
+import errno
+import ctypes
+import ctypes.util
+import select
+import struct
+import logging
+from collections import defaultdict
+from hydrograph import parse_lis_time
+
+logger = logging.getLogger(__name__)
+
+# inotify(7) event flags
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+# struct inotify_event header: wd, mask, cookie, len (name follows)
+_EVENT = struct.Struct("iIII")
+
+def is_partial(name):
+    """Names of files still being written or not LIS data (rsync '.name.XXXXXX', '*.tmp', index sidecars)."""
+    return name.startswith(".") or name.endswith((".tmp", ".part", ".idx.json"))
+
+def scan_tree(paths):
+    """Returns {file path: (size, mtime_ns)} of all LIS files under the given directories."""
+    files = {}
+    stack = [p for p in paths if os.path.isdir(p)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif not is_partial(entry.name) and parse_lis_time(entry.name):
+                        st = entry.stat()
+                        files[entry.path] = (st.st_size, st.st_mtime_ns)
+        except OSError as e:
+            # Directories can disappear between listing and scanning
+            logger.debug(f"Skipping directory during scan: {e}")
+    return files
+
+class InotifyEvents:
+    """Recursive inotify watch of directory trees through libc (Linux only)."""
+
+    def __init__(self, paths):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 failed: {os.strerror(err)}")
+        self.dirs = {}
+        for path in paths:
+            self.add_tree(path)
+
+    def add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                logger.warning("inotify watch limit reached (fs.inotify.max_user_watches); relying on rescans")
+            elif err != errno.ENOENT:
+                logger.warning(f"Could not watch {path}: {os.strerror(err)}")
+            return
+        self.dirs[wd] = path
+
+    def add_tree(self, path):
+        """Watches a directory and its subdirectories; returns files already inside."""
+        files = set()
+        for root, dirs, names in os.walk(path):
+            self.add_watch(root)
+            files.update(os.path.join(root, n) for n in names)
+        return files
+
+    def read(self, timeout):
+        """
+        Waits up to `timeout` seconds for events.
+
+        Returns:
+            tuple: (set of changed file paths, True if the kernel queue overflowed)
+        """
+        paths = set()
+        overflow = False
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return paths, overflow
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + _EVENT.size <= len(buf):
+                wd, mask, _, length = _EVENT.unpack_from(buf, offset)
+                name = buf[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                if mask & IN_IGNORED:
+                    self.dirs.pop(wd, None)
+                    continue
+                directory = self.dirs.get(wd)
+                if directory is None or not name:
+                    continue
+                path = os.path.join(directory, os.fsdecode(name))
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        # Files may land before the new directory's watch is in place
+                        paths |= self.add_tree(path)
+                else:
+                    paths.add(path)
+        return paths, overflow
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+class ArrivalWatcher:
+    """
+    Detects LIS timesteps whose files have fully arrived.
+
+    Changes come from inotify where available and from directory rescans
+    otherwise (or on filesystems such as Lustre where writes from other
+    nodes raise no events, every `rescan_interval` seconds). A file counts
+    once its size and mtime have not changed for `settle_seconds`; a
+    timestep is complete when `files_per_timestep` of its files have
+    settled. Files present at start-up are taken as already processed.
+    """
+
+    def __init__(self, paths, settle_seconds=10, poll_interval=5, rescan_interval=300,
+                 files_per_timestep=1, backend="auto", clock=time.monotonic):
+        """
+        Args:
+            paths (list): Directories to watch (e.g. the LIS feed directory).
+            settle_seconds (float): Quiet time before a file counts as written.
+            poll_interval (float): Rescan period of the polling backend.
+            rescan_interval (float): Safety rescan period when using inotify.
+            files_per_timestep (int): Files that make up one complete timestep.
+            backend (str): 'auto', 'inotify' or 'poll'.
+        """
+        self.paths = [p for p in paths if p]
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self.files_per_timestep = files_per_timestep
+        self.clock = clock
+
+        self.known = scan_tree(self.paths)
+        # path -> (size, mtime_ns, time of the last observed change)
+        self.pending = {}
+        # valid time -> settled file names, until the timestep is complete
+        self.arrived = defaultdict(set)
+        self.completed = set()
+        # valid time -> wall-clock time its first file was seen (for arrival latency)
+        self.first_seen = {}
+
+        self.events = None
+        if backend in ("auto", "inotify"):
+            try:
+                self.events = InotifyEvents(self.paths)
+            except (OSError, AttributeError) as e:
+                if backend == "inotify":
+                    raise
+                logger.warning(f"inotify unavailable ({e}); polling every {poll_interval} s")
+        self.backend = "inotify" if self.events else "poll"
+        self.last_scan = self.clock()
+        logger.info(f"Watching {', '.join(self.paths)} ({self.backend}, {len(self.known)} existing files)")
+
+    def observe(self, paths):
+        """Records possible changes of the given files."""
+        now = self.clock()
+        for path in paths:
+            if is_partial(os.path.basename(path)) or not parse_lis_time(os.path.basename(path)):
+                continue
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                self.pending.pop(path, None)
+                continue
+            signature = (st.st_size, st.st_mtime_ns)
+            if path not in self.pending and self.known.get(path) == signature:
+                continue
+            if self.pending.get(path, (None, None))[:2] != signature:
+                self.pending[path] = signature + (now,)
+                self.first_seen.setdefault(parse_lis_time(os.path.basename(path)), time.time())
+
+    def rescan(self):
+        current = scan_tree(self.paths)
+        self.observe(p for p, signature in current.items() if self.known.get(p) != signature)
+        self.last_scan = self.clock()
+
+    def settle(self):
+        """Returns the pending files that have not changed for settle_seconds."""
+        now = self.clock()
+        settled = []
+        for path, (size, mtime_ns, changed) in list(self.pending.items()):
+            if now - changed < self.settle_seconds:
+                continue
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                del self.pending[path]
+                continue
+            if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+                self.pending[path] = (st.st_size, st.st_mtime_ns, now)
+                continue
+            del self.pending[path]
+            self.known[path] = (size, mtime_ns)
+            settled.append(path)
+        return settled
+
+    def complete(self, files):
+        """Groups settled files into newly complete timesteps."""
+        ready = defaultdict(list)
+        for path in files:
+            valid_time = parse_lis_time(os.path.basename(path))
+            if valid_time in self.completed:
+                continue
+            self.arrived[valid_time].add(os.path.basename(path))
+            if len(self.arrived[valid_time]) >= self.files_per_timestep:
+                del self.arrived[valid_time]
+                self.completed.add(valid_time)
+                ready[valid_time.strftime("%Y-%m-%d")].append(valid_time)
+        return {date_str: sorted(times) for date_str, times in sorted(ready.items())}
+
+    def poll(self, timeout=None):
+        """
+        Waits up to `timeout` seconds (default: poll_interval, shortened while
+        files are settling) and returns the timesteps completed meanwhile.
+
+        Returns:
+            dict: date (YYYY-MM-DD) -> sorted list of valid times (datetime)
+        """
+        if timeout is None:
+            timeout = self.poll_interval
+        if self.pending:
+            first_due = min(changed for _, _, changed in self.pending.values()) + self.settle_seconds
+            timeout = max(0, min(timeout, first_due - self.clock()))
+
+        if self.events:
+            paths, overflow = self.events.read(timeout)
+            self.observe(paths)
+            if overflow:
+                logger.warning("inotify queue overflowed; rescanning")
+            if overflow or self.clock() - self.last_scan >= self.rescan_interval:
+                self.rescan()
+        else:
+            if timeout:
+                time.sleep(timeout)
+            self.rescan()
+        return self.complete(self.settle())
+
+    def close(self):
+        if self.events:
+            self.events.close()
@@ -1,9 +1,16 @@
+import os
 import time
 import logging
-from datetime import datetime, timedelta
+from collections import Counter
+from datetime import timedelta
+from functools import partial
 from ingest import DataIngestor
 from process import DataProcessor
 from model import TritonModel
+from watcher import ArrivalWatcher
+from dag import TaskGraph, StateStore, DONE, SKIPPED
+from metrics import get_registry, QUEUE_DEPTH, ARRIVAL_TO_DECISION
+from hydrograph import parse_lis_time
 
 logger = logging.getLogger(__name__)
 
@@ -14,47 +21,304 @@ class WorkflowEngine:
         self.processor = DataProcessor(config)
         self.model = TritonModel(config)
         self.check_interval = config.get("workflow.data_check_interval_seconds", 300)
+        self.in_memory = config.get("process.in_memory", False)
+        self.stage_concurrency = config.get("workflow.stage_concurrency") or {"ingest": 2, "process": 2, "model": 1}
+        self.state_db = config.get("workflow.state_db") or os.path.join(config.get("global.work_dir"), "workflow_state.sqlite")
+        self.reconcile_days = config.get("workflow.reconcile_days", 3)
+        self._state = None
+        # valid time -> wall-clock time its first file appeared in the feed (daemon mode)
+        self.arrived_at = {}
+        # date -> decoded bands kept between graph runs in memory mode (see build_graph)
+        self._runoff = {}
 
-    def run_pipeline(self, date_str):
-        """Runs the full pipeline for a specific date."""
+    @property
+    def state(self):
+        """Task state store, opened on first use."""
+        if self._state is None:
+            self._state = StateStore(self.state_db)
+        return self._state
+
+    def enabled_sites(self):
+        sites = self.config.get("sites", {})
+        return [name for name, site_config in sites.items() if site_config.get("enabled")]
+
+    def submit_triggered(self, triggers):
+        """
+        Starts high-resolution runs (sites.<site>.job_script) for the sites whose
+        hydrograph crossed the threshold; they are submitted together and
+        tracked in the background.
+        """
+        scripts = []
+        for site_name, trigger in triggers.items():
+            if not trigger:
+                continue
+            job_script = self.config.get(f"sites.{site_name}.job_script")
+            if not job_script:
+                logger.warning(f"High-res run triggered for {site_name}, but no job_script is configured")
+                continue
+            scripts.append(job_script)
+        if scripts:
+            self.model.submit_jobs(scripts, on_complete=self.job_finished)
+
+    def job_finished(self, job_id, state):
+        """Called as each high-resolution run leaves the queue."""
+        if state == "COMPLETED":
+            logger.info(f"High-res job {job_id} completed")
+        else:
+            logger.error(f"High-res job {job_id} ended {state}")
+
+    def run_pipeline(self, date_str, timesteps=None):
+        """
+        Runs the full pipeline for a specific date.
+
+        With `timesteps` (valid times that just arrived) only their GRIB files
+        are processed; the hydrographs still cover the whole date.
+        """
         logger.info(f"Starting pipeline for {date_str}")
+        with get_registry().timer("pipeline"):
+            self._run_pipeline(date_str, timesteps)
 
+    def _run_pipeline(self, date_str, timesteps):
         # Step 1: Ingest
-        if not self.ingestor.sync_data(date_str):
+        synced = self.ingestor.sync_data(date_str, timesteps) if timesteps is not None else self.ingestor.sync_data(date_str)
+        if not synced:
             logger.error("Ingestion failed. Aborting pipeline.")
             return
 
         # Step 2: Process
-        # We need to list the files synced and process them.
-        # For now, assuming we process what's expected.
-        # self.processor.convert_grib_to_tiff(...) 
+        # In-memory mode hands the decoded bands straight to the model;
+        # GeoTIFFs are then only written if process.write_tiff is set.
         logger.info("Processing data...")
+        runoff = None
+        if self.in_memory:
+            if timesteps is not None:
+                runoff = self.processor.decode_date(date_str, timesteps=timesteps)
+            else:
+                runoff = self.processor.decode_date(date_str)
+        else:
+            self.processor.convert_batch(self.processor.lis_files(date_str, timesteps))
 
         # Step 3: Model
-        # Iterate over enabled sites
-        sites = self.config.get("sites", {})
-        for site_name, site_config in sites.items():
-            if site_config.get("enabled"):
-                trigger = self.model.generate_hydrograph(date_str, site_name)
-                if trigger:
-                    # Prepare and submit SLURM job
-                    # job_script = ...
-                    # self.model.submit_job(job_script)
-                    pass
+        # All enabled sites are extracted in one pass over the timesteps
+        enabled = self.enabled_sites()
+        if enabled:
+            if runoff is not None:
+                triggers = self.model.generate_hydrographs(date_str, enabled, runoff=runoff)
+            else:
+                triggers = self.model.generate_hydrographs(date_str, enabled)
+            self.submit_triggered(triggers)
 
         logger.info(f"Pipeline completed for {date_str}")
 
-    def start_daemon(self):
-        """Starts the workflow as a long-running daemon."""
+    def _ingest_task(self, date_str, valid_time):
+        if not self.ingestor.sync_data(date_str, [valid_time]):
+            raise RuntimeError(f"Ingestion failed for {valid_time:%Y-%m-%d %H:%M}")
+
+    def _process_task(self, date_str, valid_time, runoff):
+        if runoff is not None:
+            decoded = self.processor.decode_date(date_str, timesteps=[valid_time])
+            if valid_time not in decoded:
+                raise RuntimeError(f"Could not decode {valid_time:%Y-%m-%d %H:%M}")
+            runoff.update(decoded)
+            return
+        files = self.processor.lis_files(date_str, [valid_time])
+        if not files:
+            raise RuntimeError(f"No GRIB files for {valid_time:%Y-%m-%d %H:%M} in {self.processor.input_dir}")
+        failed = [r["file"] for r in self.processor.convert_batch(files) if not r["success"]]
+        if failed:
+            raise RuntimeError(f"Conversion failed for {', '.join(failed)}")
+
+    def _complete_runoff(self, date_str, runoff):
+        """
+        Decodes the timesteps of a date that are not held in memory (decoded
+        before a restart, or evicted), so the hydrographs always cover every
+        timestep ingested so far, not just the latest arrivals.
+        """
+        missing = [t for t in self.ingestor.feed_timesteps(date_str) if t not in runoff]
+        if missing:
+            runoff.update(self.processor.decode_date(date_str, timesteps=missing))
+
+    def _model_task(self, date_str, sites, runoff, timesteps=()):
+        if runoff is not None:
+            self._complete_runoff(date_str, runoff)
+            triggers = self.model.generate_hydrographs(date_str, sites, runoff=runoff)
+        else:
+            triggers = self.model.generate_hydrographs(date_str, sites)
+        if all(trigger is None for trigger in triggers.values()):
+            raise RuntimeError(f"No hydrograph could be generated for {date_str}")
+        self.submit_triggered(triggers)
+        self.record_decision(timesteps)
+
+    def record_decision(self, timesteps):
+        """Records the arrival-to-decision latency of timesteps whose arrival time is known."""
+        now = time.time()
+        for valid_time in timesteps:
+            arrived = self.arrived_at.pop(valid_time, None)
+            if arrived is not None:
+                get_registry().observe(ARRIVAL_TO_DECISION, now - arrived)
+
+    def build_graph(self, dates):
+        """
+        Task graph of the pipeline over timesteps.
+
+        Each timestep gets an ingest and a process task; each date gets one
+        model task over all enabled sites once its timesteps are processed.
+        The model task is named after the timesteps it covers, so later
+        arrivals for the same date update the hydrographs again.
+
+        Args:
+            dates (dict): date (YYYY-MM-DD) -> valid times, or None for all in the feed.
+        """
+        graph = TaskGraph(self.stage_concurrency, self.state)
+        sites = self.enabled_sites()
+        # Only the dates of this run stay in memory; others are decoded again when needed
+        for date_str in list(self._runoff):
+            if date_str not in dates:
+                del self._runoff[date_str]
+        for date_str, timesteps in dates.items():
+            if timesteps is None:
+                timesteps = self.ingestor.feed_timesteps(date_str)
+            if not timesteps:
+                logger.warning(f"No LIS data found for {date_str}")
+                continue
+            # Decoded bands shared by the date's process tasks and its model task,
+            # and kept for later arrivals of the same date
+            runoff = self._runoff.setdefault(date_str, {}) if self.in_memory else None
+            processed = []
+            for valid_time in sorted(timesteps):
+                key = valid_time.strftime("%Y-%m-%dT%H%M")
+                ingest = graph.add(f"ingest:{key}", "ingest", partial(self._ingest_task, date_str, valid_time))
+                processed.append(graph.add(
+                    f"process:{key}", "process", partial(self._process_task, date_str, valid_time, runoff),
+                    deps=[ingest], persist=not self.in_memory,
+                ))
+            if sites:
+                hours = ",".join(t.strftime("%H%M") for t in sorted(timesteps))
+                graph.add(f"model:{date_str}[{hours}]", "model",
+                          partial(self._model_task, date_str, sites, runoff, sorted(timesteps)), deps=processed)
+        return graph
+
+    def run_graph(self, dates):
+        """
+        Runs the pipeline for several dates as a task graph (see dag.py).
+
+        Stages overlap across timesteps within their concurrency limits
+        (workflow.stage_concurrency), and tasks completed in earlier runs
+        are skipped, so a rerun only repeats what failed.
+
+        Returns:
+            bool: True if every task is done.
+        """
+        graph = self.build_graph(dates)
+        metrics = get_registry()
+        metrics.set(QUEUE_DEPTH, len(graph.needed()), queue="tasks")
+        try:
+            status = graph.run()
+        finally:
+            metrics.set(QUEUE_DEPTH, 0, queue="tasks")
+            metrics.export()
+        return all(s in (DONE, SKIPPED) for s in status.values())
+
+    def create_watcher(self):
+        """File-arrival watcher on the LIS feed (see watcher.py)."""
+        return ArrivalWatcher(
+            self.config.get("watcher.paths") or [self.ingestor.feed_dir],
+            settle_seconds=self.config.get("watcher.settle_seconds", 10),
+            poll_interval=self.config.get("watcher.poll_interval_seconds", 5),
+            rescan_interval=self.check_interval,
+            files_per_timestep=self.config.get("watcher.files_per_timestep", 1),
+            backend=self.config.get("watcher.backend", "auto"),
+        )
+
+    def timestep_done(self, valid_time):
+        """
+        Whether a timestep went through the whole pipeline: its ingest and
+        processing are recorded done (processing is not recorded in memory
+        mode) and a completed model task of its date covered it.
+        """
+        key = valid_time.strftime("%Y-%m-%dT%H%M")
+        if not self.state.is_done(f"ingest:{key}"):
+            return False
+        if not self.in_memory and not self.state.is_done(f"process:{key}"):
+            return False
+        if not self.enabled_sites():
+            return True
+        hour = valid_time.strftime("%H%M")
+        for name in self.state.names(f"model:{valid_time:%Y-%m-%d}[", DONE):
+            if hour in name[name.index("[") + 1:-1].split(","):
+                return True
+        return False
+
+    def unfinished_timesteps(self, watcher):
+        """
+        Complete timesteps in the feed that have not been through the pipeline:
+        data that arrived while the daemon was down and timesteps whose tasks
+        failed. Only timesteps within workflow.reconcile_days of the newest
+        one are considered, so an archive in the feed is not reprocessed.
+
+        Returns:
+            dict: date (YYYY-MM-DD) -> sorted list of valid times
+        """
+        pending = {parse_lis_time(os.path.basename(path)) for path in watcher.pending}
+        files = Counter(parse_lis_time(os.path.basename(path)) for path in watcher.known)
+        complete = [t for t, n in files.items()
+                    if t is not None and n >= watcher.files_per_timestep and t not in pending]
+        if not complete:
+            return {}
+        horizon = max(complete) - timedelta(days=self.reconcile_days)
+        unfinished = {}
+        for valid_time in sorted(complete):
+            if valid_time >= horizon and not self.timestep_done(valid_time):
+                unfinished.setdefault(valid_time.strftime("%Y-%m-%d"), []).append(valid_time)
+        return unfinished
+
+    def process_arrivals(self, arrivals):
+        """Runs the pipeline for the newly complete timesteps of each date."""
+        if not arrivals:
+            return
+        for date_str, timesteps in arrivals.items():
+            logger.info(f"{len(timesteps)} new timestep(s) for {date_str}: "
+                        f"{', '.join(t.strftime('%H:%M') for t in timesteps)}")
+        try:
+            self.run_graph(arrivals)
+        except Exception as e:
+            # Keep the daemon alive; timesteps that did not complete are
+            # requeued by the next reconciliation (see unfinished_timesteps)
+            logger.exception(f"Pipeline failed for {', '.join(arrivals)}: {e}")
+
+    def record_queues(self, watcher):
+        """Sets the queue depth gauges and exports the metrics textfile."""
+        metrics = get_registry()
+        metrics.set(QUEUE_DEPTH, len(watcher.pending), queue="arrivals_pending")
+        metrics.set(QUEUE_DEPTH, len(self.model.jobs.outstanding()), queue="slurm_jobs")
+        metrics.export()
+
+    def start_daemon(self, watcher=None):
+        """
+        Starts the workflow as a long-running daemon driven by data arrival.
+
+        At start-up and then every data_check_interval_seconds, timesteps
+        already in the feed that are not recorded done (missed while the
+        daemon was down, or failed) are run along with the new arrivals.
+        """
         logger.info("Starting Workflow Daemon...")
-        while True:
-            # Logic to determine "current" processing date or check for new data
-            # For simplicity, let's check for "today"
-            today = datetime.now().strftime("%Y-%m-%d")
-            
-            # Check availability
-            # if self.processor.check_data_availability(today):
-            #     self.run_pipeline(today)
-            
-            logger.info("Waiting for next check...")
-            time.sleep(self.check_interval)
+        watcher = watcher or self.create_watcher()
+        last_reconcile = None
+        try:
+            while True:
+                arrivals = watcher.poll()
+                if last_reconcile is None or time.monotonic() - last_reconcile >= self.check_interval:
+                    last_reconcile = time.monotonic()
+                    for date_str, timesteps in self.unfinished_timesteps(watcher).items():
+                        requeued = [t for t in timesteps if t not in arrivals.get(date_str, [])]
+                        if requeued:
+                            logger.info(f"Requeuing {len(requeued)} unfinished timestep(s) of {date_str}")
+                            arrivals[date_str] = sorted(arrivals.get(date_str, []) + requeued)
+                for timesteps in arrivals.values():
+                    for valid_time in timesteps:
+                        if valid_time in watcher.first_seen:
+                            self.arrived_at[valid_time] = watcher.first_seen.pop(valid_time)
+                self.record_queues(watcher)
+                self.process_arrivals(arrivals)
+        finally:
+            watcher.close()
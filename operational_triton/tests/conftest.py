@@ -80,3 +80,11 @@ def config_object(mock_config_data):
             return super().get(key, default)
             
     return MockConfig(mock_config_data)
+
+@pytest.fixture
+def fake_slurm(tmp_path):
+    """sbatch/squeue/sacct commands backed by tests/fake_slurm.py and a state file in tmp_path."""
+    state_dir = tmp_path / "slurm"
+    state_dir.mkdir()
+    script = os.path.join(os.path.dirname(__file__), "fake_slurm.py")
+    return {name: [sys.executable, script, name, str(state_dir)] for name in ("sbatch", "squeue", "sacct")}
@@ -0,0 +1,71 @@
+"""
+Stand-in for sbatch, squeue and sacct in tests.
+
+Usage: python fake_slurm.py <sbatch|squeue|sacct> <state dir> [args...]
+Each squeue call moves every queued job one state on
+(PENDING -> RUNNING -> finished). Scripts whose name contains 'fail'
+finish FAILED, others COMPLETED; finished jobs leave the queue and are
+only reported by sacct. While a file named 'outage' exists in the state
+dir, squeue and sacct fail as if the controller were down.
+"""
+import os
+import sys
+import json
+import fcntl
+
+def load(state_dir):
+    path = os.path.join(state_dir, "jobs.json")
+    if not os.path.exists(path):
+        return {"next_id": 1000, "jobs": {}, "calls": {}}
+    with open(path) as f:
+        return json.load(f)
+
+def save(state_dir, state):
+    with open(os.path.join(state_dir, "jobs.json"), "w") as f:
+        json.dump(state, f)
+
+def requested(args):
+    for arg in args:
+        if arg.startswith("--jobs="):
+            return arg.split("=", 1)[1].split(",")
+    return []
+
+def main():
+    command, state_dir, args = sys.argv[1], sys.argv[2], sys.argv[3:]
+    # Submissions run concurrently: serialize access to the state file
+    lock = open(os.path.join(state_dir, "lock"), "w")
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    state = load(state_dir)
+    state["calls"][command] = state["calls"].get(command, 0) + 1
+
+    if command in ("squeue", "sacct") and os.path.exists(os.path.join(state_dir, "outage")):
+        save(state_dir, state)
+        sys.exit(f"{command}: error: Unable to contact slurm controller")
+
+    if command == "sbatch":
+        script = args[-1]
+        if not os.path.exists(script):
+            save(state_dir, state)
+            sys.exit(f"sbatch: error: Unable to open file {script}")
+        job_id = str(state["next_id"])
+        state["next_id"] += 1
+        final = "FAILED" if "fail" in os.path.basename(script) else "COMPLETED"
+        state["jobs"][job_id] = {"state": "PENDING", "final": final}
+        print(job_id)
+    elif command == "squeue":
+        for job_id in requested(args):
+            job = state["jobs"].get(job_id)
+            if job is None or job["state"] not in ("PENDING", "RUNNING"):
+                continue
+            print(f"{job_id} {job['state']}")
+            job["state"] = "RUNNING" if job["state"] == "PENDING" else job["final"]
+    elif command == "sacct":
+        for job_id in requested(args):
+            job = state["jobs"].get(job_id)
+            if job is not None:
+                print(f"{job_id}|{job['state']}")
+                print(f"{job_id}.batch|{job['state']}")
+    save(state_dir, state)
+
+if __name__ == "__main__":
+    main()
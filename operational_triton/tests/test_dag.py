@@ -0,0 +1,88 @@
+import pytest
+import threading
+import time
+from src.dag import TaskGraph, StateStore, DONE, FAILED, SKIPPED, UPSTREAM_FAILED
+
+@pytest.fixture
+def state(tmp_path):
+    store = StateStore(str(tmp_path / "state" / "tasks.sqlite"))
+    yield store
+    store.close()
+
+def test_dependencies_and_failures(state):
+    calls = []
+    graph = TaskGraph(state=state)
+    a = graph.add("a", "ingest", lambda: calls.append("a"))
+    b = graph.add("b", "process", lambda: 1 / 0, deps=[a])
+    graph.add("c", "model", lambda: calls.append("c"), deps=[b])
+    graph.add("d", "model", lambda: calls.append("d"), deps=[a])
+
+    status = graph.run()
+
+    assert status == {"a": DONE, "b": FAILED, "c": UPSTREAM_FAILED, "d": DONE}
+    assert calls == ["a", "d"]
+    assert state.is_done("a")
+    assert state.status("b") == FAILED
+    assert state.status("c") is None
+
+def test_rerun_skips_completed(state):
+    calls = []
+    def build(fail):
+        graph = TaskGraph(state=state)
+        a = graph.add("a", "ingest", lambda: calls.append("a"))
+        graph.add("b", "process", (lambda: 1 / 0) if fail else (lambda: calls.append("b")), deps=[a])
+        return graph
+
+    build(fail=True).run()
+    assert build(fail=False).run() == {"a": SKIPPED, "b": DONE}
+    assert calls == ["a", "b"]
+
+def test_transient_tasks_rerun_only_for_needed_dependents(state):
+    calls = []
+    def build():
+        graph = TaskGraph(state=state)
+        a = graph.add("a", "process", lambda: calls.append("a"), persist=False)
+        graph.add("b", "model", lambda: calls.append("b"), deps=[a])
+        return graph
+
+    build().run()
+    assert build().run() == {"a": SKIPPED, "b": SKIPPED}
+    assert calls == ["a", "b"]
+
+def test_stage_limits_and_overlap():
+    lock = threading.Lock()
+    running = {"ingest": 0, "process": 0}
+    peak = {"ingest": 0, "process": 0}
+    overlap = []
+
+    def work(stage):
+        def run():
+            with lock:
+                running[stage] += 1
+                peak[stage] = max(peak[stage], running[stage])
+                if running["ingest"] and running["process"]:
+                    overlap.append(True)
+            time.sleep(0.02)
+            with lock:
+                running[stage] -= 1
+        return run
+
+    graph = TaskGraph(concurrency={"ingest": 1, "process": 2})
+    for n in range(4):
+        ingest = graph.add(f"ingest:{n}", "ingest", work("ingest"))
+        graph.add(f"process:{n}", "process", work("process"), deps=[ingest])
+
+    status = graph.run()
+
+    assert set(status.values()) == {DONE}
+    assert peak["ingest"] == 1
+    # Ingest of timestep N+1 ran while N was processed
+    assert overlap
+
+def test_add_validates_dependencies():
+    graph = TaskGraph()
+    graph.add("a", "ingest", lambda: None)
+    with pytest.raises(ValueError):
+        graph.add("a", "ingest", lambda: None)
+    with pytest.raises(ValueError):
+        graph.add("b", "process", lambda: None, deps=["missing"])
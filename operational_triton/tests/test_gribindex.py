@@ -0,0 +1,82 @@
+import pytest
+import os
+import json
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from src.gribindex import GribIndex, scan_messages
+
+def grib1(payload):
+    body = payload + b"7777"
+    length = 8 + len(body)
+    return b"GRIB" + length.to_bytes(3, "big") + bytes([1]) + body
+
+def grib2(payload):
+    body = payload + b"7777"
+    length = 16 + len(body)
+    return b"GRIB" + b"\x00\x00" + bytes([0, 2]) + length.to_bytes(8, "big") + body
+
+MESSAGES = [grib1(b"Qs_acc"), grib2(b"Qsb_acc"), grib2(b"SoilMoist")]
+NAMES = {b"Qs_acc": "Qs_acc", b"Qsb_acc": "Qsb_acc", b"SoilMoist": "SoilMoist"}
+
+def fake_fromstring(data):
+    for key, name in NAMES.items():
+        if key + b"7777" in data:
+            return SimpleNamespace(shortName=name, name=name, typeOfLevel="surface", level=0, raw=data)
+    raise ValueError("unknown message")
+
+@pytest.fixture
+def grib_file(tmp_path, monkeypatch):
+    path = tmp_path / "LIS_HIST_202307150300.d01.grb"
+    # Padding between messages is skipped by the scanner
+    path.write_bytes(MESSAGES[0] + b"\x00" * 5 + MESSAGES[1] + MESSAGES[2] + b"\x00" * 3)
+    fromstring = MagicMock(side_effect=fake_fromstring)
+    monkeypatch.setattr("src.gribindex.pygrib.fromstring", fromstring)
+    return str(path), fromstring
+
+def test_scan_messages_reads_section0_lengths(grib_file):
+    path, _ = grib_file
+    messages = scan_messages(path)
+
+    assert [m["edition"] for m in messages] == [1, 2, 2]
+    assert [m["length"] for m in messages] == [len(m) for m in MESSAGES]
+    assert messages[1]["offset"] == len(MESSAGES[0]) + 5
+    assert [m["number"] for m in messages] == [1, 2, 3]
+
+def test_scan_messages_rejects_truncated_file(tmp_path):
+    path = tmp_path / "bad.grb"
+    path.write_bytes(MESSAGES[1][:-6])
+    with pytest.raises(ValueError):
+        scan_messages(str(path))
+
+def test_index_resolves_names_and_reads_single_message(grib_file):
+    path, _ = grib_file
+    index = GribIndex(path)
+
+    assert index.resolve(2) == 2
+    assert index.resolve("Qsb_acc") == 2
+    assert index.find(short_name="SoilMoist")[0]["number"] == 3
+    assert index.read_message("Qs_acc") == MESSAGES[0]
+    assert index.decode(3).raw == MESSAGES[2]
+    with pytest.raises(KeyError):
+        index.resolve("Tair_f_inst")
+    with pytest.raises(KeyError):
+        index.resolve(4)
+
+def test_index_sidecar_is_reused_and_invalidated(grib_file, tmp_path):
+    path, fromstring = grib_file
+    cache_dir = tmp_path / "index"
+    GribIndex(path, cache_dir=str(cache_dir))
+    sidecar = cache_dir / (os.path.basename(path) + ".idx.json")
+    assert json.loads(sidecar.read_text())["messages"][1]["shortName"] == "Qsb_acc"
+    assert fromstring.call_count == 3
+
+    # An unchanged file is served from the sidecar without decoding
+    GribIndex(path, cache_dir=str(cache_dir))
+    assert fromstring.call_count == 3
+
+    # A rewritten file is re-indexed
+    with open(path, "wb") as f:
+        f.write(MESSAGES[2])
+    index = GribIndex(path, cache_dir=str(cache_dir))
+    assert fromstring.call_count == 4
+    assert index.resolve("SoilMoist") == 1
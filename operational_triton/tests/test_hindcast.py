@@ -0,0 +1,84 @@
+import pytest
+import os
+import numpy as np
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+import src.model
+from src.hindcast import run_hindcast, merge_runoff
+from src.hydrograph import generate_dates, parse_lis_time, runoff_file
+from src.sitemask import SiteMask
+
+LABELS = np.array([
+    [1, 1, 2],
+    [3, 2, 0],
+])
+SITE_TABLE = np.array([[1, 1], [2, 1], [3, 0]])
+
+@pytest.fixture
+def hindcast(config_object, tmp_path, monkeypatch):
+    """Runoff of each timestep is its hour of the hindcast, split over bands 24 and 25."""
+    config_object["global"]["work_dir"] = str(tmp_path)
+    config_object["sites"]["site_A"].update({"shapefile": "site_A.shp", "lis_grid": "LIS_UniqueId.tif"})
+    monkeypatch.setattr("src.hindcast.TritonModel", src.model.TritonModel)
+    ingestor = MagicMock()
+    ingestor.return_value.sync_data.side_effect = lambda date_str: date_str != "2023-12-03"
+    monkeypatch.setattr("src.hindcast.DataIngestor", ingestor)
+    monkeypatch.setattr("src.hindcast.DataProcessor", MagicMock())
+    load_mask = MagicMock(return_value=SiteMask("site_A", LABELS, SITE_TABLE, 0, 0, LABELS.shape))
+    monkeypatch.setattr("src.model.load_site_mask", load_mask)
+    monkeypatch.setattr("src.model.read_geotransform", MagicMock(return_value=((0, 1, 0, 0, 0, -1), LABELS.shape)))
+    start = datetime(2023, 12, 1)
+
+    def read_window(path, window, flip=False):
+        hours = (parse_lis_time(os.path.basename(path)) - start) / timedelta(hours=1)
+        return np.full(window[2:], hours / 2, dtype=np.float32)
+    monkeypatch.setattr("src.model.read_raster_window", read_window)
+
+    def make_files(interval_hours, days):
+        config_object["model"] = {"runoff_bands": [24, 25], "interval_hours": interval_hours}
+        postproc_dir = tmp_path / "02_LISpostproc"
+        postproc_dir.mkdir(exist_ok=True)
+        for date in generate_dates(start, start + timedelta(days=days, hours=-1), interval_hours):
+            for band in (24, 25):
+                open(runoff_file(str(postproc_dir), date, band), "w").close()
+    return make_files
+
+def read_hyg(tmp_path, name):
+    return np.loadtxt(tmp_path / "03_TRITON_NRT" / name, delimiter=",", skiprows=1)
+
+def test_hindcast_writes_continuous_hydrograph(hindcast, tmp_path, config_object):
+    hindcast(3, 2)
+    config_object["sites"]["site_A"]["threshold_trigger"] = 1.0
+
+    assert run_hindcast(config_object, "2023-12-01", "2023-12-02", max_workers=1) == {"site_A": True}
+
+    hyg = read_hyg(tmp_path, "site_A_20231201_20231202.hyg")
+    assert hyg.shape == (16, 5)
+    np.testing.assert_array_equal(hyg[:, 0], np.arange(3, 49, 3))
+    # ID 3 has one pixel: rate = hours since start / 3 h, continuing across midnight
+    np.testing.assert_allclose(hyg[:, 4], np.arange(0, 48, 3) / 3, atol=1e-4)
+
+def test_hindcast_aligns_uneven_intervals(hindcast, tmp_path, config_object):
+    # 5-hourly steps do not restart at midnight: 2023-12-02 starts at 01:00
+    hindcast(5, 3)
+    config_object["sites"]["site_A"]["threshold_trigger"] = 100.0
+
+    triggers = run_hindcast(config_object, "2023-12-01", "2023-12-03", max_workers=2)
+
+    assert triggers == {"site_A": False}
+    hyg = read_hyg(tmp_path, "site_A_20231201_20231203.hyg")
+    hours = np.arange(0, 72, 5)
+    assert hyg.shape[0] == len(hours)
+    expected = np.where(hours < 48, hours / 5, 0.0)
+    # 2023-12-03 failed to ingest and stays zero
+    np.testing.assert_allclose(hyg[:, 4], expected, atol=1e-4)
+
+def test_merge_runoff_skips_failed_dates():
+    grid = [datetime(2023, 12, 1, h) for h in (0, 12)] + [datetime(2023, 12, 2, h) for h in (0, 12)]
+    results = [
+        {"success": True, "dates": grid[2:], "runoff": {"a": np.ones((2, 3))}, "n_read": 2},
+        {"success": False, "dates": grid[:2], "runoff": {}, "n_read": 0},
+    ]
+    merged, n_read = merge_runoff(results, grid)
+    np.testing.assert_array_equal(merged["a"][:, 0], [0, 0, 1, 1])
+    assert n_read == {"a": 2}
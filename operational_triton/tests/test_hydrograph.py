@@ -0,0 +1,39 @@
+import pytest
+import numpy as np
+from datetime import datetime
+from src.hydrograph import LabelIndex, generate_dates, runoff_file, create_floodevent_hydrograph_runoff, save_hydrograph
+
+def test_label_index_matches_where_loop():
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, 50, size=(40, 60))
+    ids = np.array([7, 3, 42, 99, 18])
+    field = rng.random(labels.shape).astype(np.float32)
+    field[0, :5] = np.nan
+
+    index = LabelIndex(labels, ids)
+    result = index.sum(field)
+
+    # Reference: the per-ID np.where loop of the A02 script
+    clean = np.where(np.isfinite(field), field, 0.0)
+    expected = [clean[np.where(labels == i)].sum() for i in ids]
+    np.testing.assert_allclose(result, expected, rtol=1e-5)
+    assert index.pixel_counts[3] == 0
+
+def test_label_index_shape_mismatch():
+    index = LabelIndex(np.zeros((2, 2), dtype=int), [0])
+    with pytest.raises(ValueError):
+        index.sum(np.zeros((3, 3)))
+
+def test_generate_dates_and_file_names():
+    dates = generate_dates(datetime(2024, 12, 1), datetime(2024, 12, 1, 23), 3)
+    assert len(dates) == 8 and dates[-1].hour == 21
+    assert runoff_file("/pp", dates[1], 24).endswith("LIS_DD.20241201_DT.0300_DF_band_24.tif")
+
+def test_save_hydrograph(tmp_path):
+    out = create_floodevent_hydrograph_runoff(np.ones((2, 3)), np.array([3, 6]))
+    assert out.shape == (2, 5)
+    path = tmp_path / "site.hyg"
+    save_hydrograph(str(path), out)
+    lines = path.read_text().splitlines()
+    assert lines[0] == "%Time(hr) Runoff(mm/hr)"
+    assert lines[1] == "3.0000,0.0000,1.0000,1.0000,1.0000"
@@ -1,30 +1,98 @@
 import pytest
-from unittest.mock import patch, MagicMock
-from src.ingest import DataIngestor
-import subprocess
+import os
+import json
+from datetime import datetime
+from src.ingest import DataIngestor, copy_atomic
+from src.metrics import MetricsRegistry, STAGE_SECONDS, BYTES, FILES
+
+NAME = "PS.557WW_SC.U_DI.C_GP.LIS-NOAH_GR.C0P09DEG_AR.GLOBAL_PA.LIS_DD.20231201_DT.{:02d}00_DF.GR1"
+
+@pytest.fixture
+def feed(tmp_path):
+    day = tmp_path / "feed" / "2023" / "Dec" / "01" / "LIS-DD"
+    day.mkdir(parents=True)
+    for hour in (0, 3, 6):
+        (day / NAME.format(hour)).write_bytes(b"GRIB" * (hour + 1))
+    (day / ("." + NAME.format(9) + ".Xa12bc")).write_bytes(b"partial")
+    return day
 
 @pytest.fixture
-def ingestor(config_object):
+def ingestor(config_object, tmp_path, feed):
+    config_object["global"]["feed_dir"] = str(tmp_path / "feed")
+    config_object["global"]["work_dir"] = str(tmp_path / "work")
+    config_object["ingest"]["max_workers"] = 2
     return DataIngestor(config_object)
 
-def test_sync_data_success(ingestor):
-    with patch("subprocess.run") as mock_run:
-        mock_run.return_value = MagicMock(returncode=0)
-        
-        result = ingestor.sync_data("2023-12-01")
-        
-        assert result is True
-        mock_run.assert_called_once()
-        args, kwargs = mock_run.call_args
-        command = args[0]
-        assert "rsync -av --relative" in command
-        assert "2023/Dec/*/LIS-DD" in command
-        assert kwargs.get("shell") is True
-
-def test_sync_data_failure(ingestor):
-    with patch("subprocess.run") as mock_run:
-        mock_run.side_effect = subprocess.CalledProcessError(1, "rsync")
-        
-        result = ingestor.sync_data("2023-12-01")
-        
-        assert result is False
+def input_file(ingestor, hour):
+    return os.path.join(ingestor.input_dir, "2023", "Dec", "01", "LIS-DD", NAME.format(hour))
+
+def test_sync_data_copies_date(ingestor, feed):
+    assert ingestor.sync_data("2023-12-01") is True
+
+    for hour in (0, 3, 6):
+        with open(input_file(ingestor, hour), "rb") as f:
+            assert f.read() == b"GRIB" * (hour + 1)
+        assert os.stat(input_file(ingestor, hour)).st_mtime_ns == os.stat(feed / NAME.format(hour)).st_mtime_ns
+    # Partial files and temporaries are not ingested or left behind
+    assert sorted(os.listdir(os.path.dirname(input_file(ingestor, 0)))) == sorted(NAME.format(h) for h in (0, 3, 6))
+    with open(ingestor.manifest_path) as f:
+        assert len(json.load(f)["files"]) == 3
+
+def test_sync_data_is_incremental(ingestor, feed, config_object):
+    ingestor.sync_data("2023-12-01")
+    assert ingestor.pending_files("2023-12-01") == []
+
+    # A new, a rewritten and a deleted destination file are picked up, also by a new process
+    (feed / NAME.format(9)).write_bytes(b"new")
+    (feed / NAME.format(3)).write_bytes(b"rewritten")
+    os.remove(input_file(ingestor, 6))
+    ingestor = DataIngestor(config_object)
+    assert [os.path.basename(p) for p in ingestor.pending_files("2023-12-01")] == \
+        [NAME.format(3), NAME.format(6), NAME.format(9)]
+
+    assert ingestor.sync_data("2023-12-01", timesteps=[datetime(2023, 12, 1, 9)]) is True
+    assert os.path.exists(input_file(ingestor, 9))
+    assert not os.path.exists(input_file(ingestor, 6))
+
+    assert ingestor.sync_data("2023-12-01") is True
+    with open(input_file(ingestor, 3), "rb") as f:
+        assert f.read() == b"rewritten"
+    assert ingestor.pending_files("2023-12-01") == []
+
+def test_sync_data_missing_date(ingestor):
+    assert ingestor.sync_data("2023-12-02") is False
+
+def test_sync_data_copy_failure(ingestor, monkeypatch):
+    def fail(source, destination):
+        if source.endswith(NAME.format(3)):
+            raise IOError("disk full")
+        return copy_atomic(source, destination)
+    monkeypatch.setattr("src.ingest.copy_atomic", fail)
+
+    assert ingestor.sync_data("2023-12-01") is False
+    # Copied files are recorded; the failed one is retried next time
+    assert [os.path.basename(p) for p in ingestor.pending_files("2023-12-01")] == [NAME.format(3)]
+
+def test_copy_atomic_leaves_no_partial_file(tmp_path, monkeypatch):
+    source = tmp_path / "a.grb"
+    source.write_bytes(b"GRIB")
+    destination = tmp_path / "out" / "a.grb"
+
+    def broken_copy(src, dst):
+        with open(dst, "wb") as f:
+            f.write(b"GR")
+        raise IOError("interrupted")
+    monkeypatch.setattr("src.ingest.shutil.copyfile", broken_copy)
+
+    with pytest.raises(IOError):
+        copy_atomic(str(source), str(destination))
+    assert os.listdir(tmp_path / "out") == []
+
+def test_sync_data_records_metrics(ingestor, monkeypatch):
+    metrics = MetricsRegistry()
+    monkeypatch.setattr("src.ingest.get_registry", lambda: metrics)
+    ingestor.sync_data("2023-12-01")
+
+    assert metrics.get(FILES, stage="ingest", status="copied") == 3
+    assert metrics.get(BYTES, stage="ingest") == len(b"GRIB") * (1 + 4 + 7)
+    assert metrics.get(STAGE_SECONDS, stage="ingest")["count"] == 1
@@ -0,0 +1,66 @@
+import json
+import pytest
+from src.metrics import MetricsRegistry, configure_metrics, STAGE_SECONDS, BYTES, FILES, QUEUE_DEPTH
+
+def test_counters_and_gauges():
+    metrics = MetricsRegistry()
+    metrics.inc(FILES, stage="ingest", status="copied")
+    metrics.inc(FILES, 2, stage="ingest", status="copied")
+    metrics.set(QUEUE_DEPTH, 5, queue="tasks")
+    metrics.set(QUEUE_DEPTH, 1, queue="tasks")
+
+    assert metrics.get(FILES, status="copied", stage="ingest") == 3
+    assert metrics.get(QUEUE_DEPTH, queue="tasks") == 1
+    assert metrics.get(BYTES, stage="ingest") is None
+
+def test_render_prometheus_text():
+    metrics = MetricsRegistry(buckets=(1, 10))
+    metrics.inc(BYTES, 1024, stage="ingest")
+    for seconds in (0.5, 3, 30):
+        metrics.observe(STAGE_SECONDS, seconds, stage="grib_decode")
+
+    lines = metrics.render().splitlines()
+    assert f"# TYPE {BYTES} counter" in lines
+    assert f'{BYTES}{{stage="ingest"}} 1024' in lines
+    assert f"# TYPE {STAGE_SECONDS} histogram" in lines
+    # Buckets are cumulative
+    assert f'{STAGE_SECONDS}_bucket{{stage="grib_decode",le="1"}} 1' in lines
+    assert f'{STAGE_SECONDS}_bucket{{stage="grib_decode",le="10"}} 2' in lines
+    assert f'{STAGE_SECONDS}_bucket{{stage="grib_decode",le="+Inf"}} 3' in lines
+    assert f'{STAGE_SECONDS}_count{{stage="grib_decode"}} 3' in lines
+    assert f'{STAGE_SECONDS}_sum{{stage="grib_decode"}} 33.5' in lines
+
+def test_timer_records_failures():
+    metrics = MetricsRegistry()
+    with metrics.timer("ingest"):
+        pass
+    with pytest.raises(RuntimeError):
+        with metrics.timer("ingest"):
+            raise RuntimeError("boom")
+
+    assert metrics.get(STAGE_SECONDS, stage="ingest")["count"] == 2
+
+def test_export_textfile_and_jsonl(tmp_path):
+    textfile = tmp_path / "metrics" / "triton.prom"
+    jsonl = tmp_path / "metrics.jsonl"
+    metrics = MetricsRegistry(textfile=str(textfile), jsonl=str(jsonl))
+    metrics.inc(FILES, stage="grib_convert", status="ok")
+    metrics.observe(STAGE_SECONDS, 2.0, stage="hydrograph")
+    metrics.export()
+
+    assert textfile.read_text() == metrics.render()
+    # No temporary files are left next to the textfile
+    assert [p.name for p in textfile.parent.iterdir()] == ["triton.prom"]
+    records = [json.loads(line) for line in jsonl.read_text().splitlines()]
+    assert [(r["metric"], r["type"], r["value"]) for r in records] == \
+        [(FILES, "counter", 1), (STAGE_SECONDS, "histogram", 2.0)]
+    assert records[1]["labels"] == {"stage": "hydrograph"}
+
+def test_configure_metrics_defaults(config_object, tmp_path):
+    config_object["global"]["work_dir"] = str(tmp_path)
+    registry = configure_metrics(config_object)
+    try:
+        assert registry.textfile == str(tmp_path / "metrics" / "triton.prom")
+        assert registry.jsonl is None
+    finally:
+        registry.textfile = None
@@ -1,45 +1,221 @@
 import pytest
 from unittest.mock import MagicMock, patch
 import sys
+import os
+import numpy as np
+from types import SimpleNamespace
+from datetime import datetime, timedelta
 
 # Ensure mocks are in place
 # (Handled by conftest.py)
 
 from src.model import TritonModel
+from src.hydrograph import generate_dates, runoff_file, LIS_FILE_PREFIX
+from src.process import DataProcessor
+from src.sitemask import SiteMask
+
+LABELS = np.array([
+    [1, 1, 2],
+    [3, 2, 0],
+])
+SITE_TABLE = np.array([[1, 1], [2, 1], [3, 0]])
 
 @pytest.fixture
-def model(config_object):
+def model(config_object, tmp_path):
+    config_object["global"]["work_dir"] = str(tmp_path)
+    config_object["sites"]["site_A"].update({"shapefile": "site_A.shp", "lis_grid": "LIS_UniqueId.tif"})
     return TritonModel(config_object)
 
-def test_generate_hydrograph_trigger(model):
-    # The current implementation has hardcoded total_runoff = 10.0
-    # Site config in conftest has threshold 5.0
-    # So it should return True
-    
-    # We need to ensure site_config is retrieved correctly
-    # The fixture mock_config_data has "sites.site_A"
-    
+@pytest.fixture
+def runoff(model, monkeypatch):
+    """Band 24 + band 25 gives 3 mm per pixel per 3-hour step (1 mm/hr)."""
+    load_mask = MagicMock(return_value=SiteMask("site_A", LABELS, SITE_TABLE, 0, 0, LABELS.shape))
+    monkeypatch.setattr("src.model.load_site_mask", load_mask)
+    monkeypatch.setattr("src.model.read_geotransform", MagicMock(return_value=((0, 1, 0, 0, 0, -1), LABELS.shape)))
+    monkeypatch.setattr(
+        "src.model.read_raster_window",
+        lambda path, window, flip=False: np.full(window[2:], 1.5, dtype=np.float32)
+    )
+
+    os.makedirs(model.postproc_dir, exist_ok=True)
+    start = datetime(2023, 12, 1)
+    for date in generate_dates(start, start + timedelta(hours=23), 3):
+        for band in model.runoff_bands:
+            open(runoff_file(model.postproc_dir, date, band), "w").close()
+    return load_mask
+
+def test_generate_hydrograph_trigger(model, runoff, config_object):
+    # Per-ID rate is 1 mm/hr times the pixel count: 2 (ID 1), 2 (ID 2), 1 (ID 3)
+    config_object["sites"]["site_A"]["threshold_trigger"] = 1.5
+
     result = model.generate_hydrograph("2023-12-01", site_name="site_A")
     assert result is True
 
-def test_generate_hydrograph_no_trigger(model, config_object):
-    # We can modify the config object to have a high threshold
-    # But config_object is a fixture, so we should patch the get method or modify the dict if it's mutable
-    
-    # Since our MockConfig in conftest inherits from dict, we can modify it
+    hyg = np.loadtxt(os.path.join(model.output_dir, "site_A_20231201_20231201.hyg"), delimiter=",", skiprows=1)
+    assert hyg.shape == (8, 5)
+    np.testing.assert_array_equal(hyg[:, 0], np.arange(3, 25, 3))
+    np.testing.assert_allclose(hyg[0, 1:], [0.0, 2.0, 2.0, 1.0])
+
+def test_generate_hydrograph_no_trigger(model, runoff, config_object):
     config_object["sites"]["site_A"]["threshold_trigger"] = 20.0
     
     result = model.generate_hydrograph("2023-12-01", site_name="site_A")
     assert result is False
 
+def test_generate_hydrograph_reuses_label_index(model, runoff):
+    model.generate_hydrograph("2023-12-01", site_name="site_A")
+    model.generate_hydrograph("2023-12-01", site_name="site_A")
+    assert runoff.call_count == 1
+
+def test_generate_hydrograph_no_data(model, runoff):
+    assert model.generate_hydrograph("2023-12-05", site_name="site_A") is None
+
 def test_generate_hydrograph_missing_site(model):
     result = model.generate_hydrograph("2023-12-01", site_name="non_existent_site")
     assert result is None
 
-def test_submit_job(model):
-    job_id = model.submit_job("script.sh")
-    assert job_id == "12345"
+@pytest.fixture
+def slurm_model(config_object, tmp_path, fake_slurm):
+    config_object["global"]["work_dir"] = str(tmp_path)
+    # Long interval: the background monitor stays out of the way of monitor_job
+    config_object["slurm"] = {"commands": fake_slurm, "poll_interval_seconds": 60}
+    model = TritonModel(config_object)
+    yield model
+    model.jobs.close()
+
+def test_submit_job(slurm_model, tmp_path):
+    script = tmp_path / "job_afw.sbatch"
+    script.write_text("#!/bin/bash\n")
+    job_id = slurm_model.submit_job(str(script))
+    assert job_id == "1000"
+    assert slurm_model.submit_job(str(tmp_path / "missing.sbatch")) is None
+
+def test_monitor_job(slurm_model, tmp_path):
+    script = tmp_path / "job_afw.sbatch"
+    script.write_text("#!/bin/bash\n")
+    job_id = slurm_model.submit_job(str(script))
+    assert slurm_model.monitor_job(job_id) == "PENDING"
+    assert slurm_model.monitor_job(job_id) == "RUNNING"
+    assert slurm_model.monitor_job(job_id) == "COMPLETED"
+
+def test_generate_hydrograph_in_memory(model, runoff, config_object):
+    # Decoded bands on the full label grid (stored upside down like the GeoTIFFs)
+    start = datetime(2023, 12, 1)
+    band = np.flipud(np.full(LABELS.shape, 1.5, dtype=np.float32))
+    decoded = {
+        date: {b: (band, None) for b in model.runoff_bands}
+        for date in generate_dates(start, start + timedelta(hours=23), 3)
+    }
+    for f in os.listdir(model.postproc_dir):
+        os.remove(os.path.join(model.postproc_dir, f))
+    config_object["sites"]["site_A"]["threshold_trigger"] = 1.5
+
+    assert model.generate_hydrograph("2023-12-01", site_name="site_A", runoff=decoded) is True
+    hyg = np.loadtxt(os.path.join(model.output_dir, "site_A_20231201_20231201.hyg"), delimiter=",", skiprows=1)
+    np.testing.assert_allclose(hyg[:, 2:], np.tile([2.0, 2.0, 1.0], (8, 1)))
+
+def test_generate_hydrographs_reads_each_band_once(model, config_object, monkeypatch):
+    # Two sites on a 4x5 label grid; the GeoTIFFs hold the grid upside down
+    masks = {
+        "site_A": SiteMask("site_A", LABELS, SITE_TABLE, 0, 0, (4, 5)),
+        "site_B": SiteMask("site_B", np.array([[7, 8]]), np.array([[7, 1], [8, 1]]), 3, 3, (4, 5)),
+    }
+    config_object["sites"]["site_B"] = {"enabled": True, "threshold_trigger": 100.0}
+    monkeypatch.setattr("src.model.load_site_mask", lambda name, site_config, cache_dir: masks[name])
+    monkeypatch.setattr("src.model.read_geotransform", MagicMock(return_value=((0, 1, 0, 0, 0, -1), (4, 5))))
+    field = np.arange(20, dtype=np.float32).reshape(4, 5)
+    reads = []
+
+    def read_window(path, window, flip=False):
+        reads.append(window)
+        row, col, rows, cols = window
+        return np.flipud(field[row:row + rows, col:col + cols])
+    monkeypatch.setattr("src.model.read_raster_window", read_window)
+
+    os.makedirs(model.postproc_dir, exist_ok=True)
+    start = datetime(2023, 12, 1)
+    for date in generate_dates(start, start + timedelta(hours=23), 3):
+        for band in model.runoff_bands:
+            open(runoff_file(model.postproc_dir, date, band), "w").close()
+
+    results = model.generate_hydrographs("2023-12-01", ["site_A", "site_B", "site_C"])
+
+    assert results == {"site_A": True, "site_B": False, "site_C": None}
+    # One read per band and timestep, over the window covering both sites
+    assert len(reads) == 8 * len(model.runoff_bands)
+    assert set(reads) == {(0, 0, 4, 5)}
+
+    hyg_a = np.loadtxt(os.path.join(model.output_dir, "site_A_20231201_20231201.hyg"), delimiter=",", skiprows=1)
+    np.testing.assert_allclose(hyg_a[0, 2:], np.array([62.0, 56.0, 20.0]) / 3, atol=1e-4)
+    hyg_b = np.loadtxt(os.path.join(model.output_dir, "site_B_20231201_20231201.hyg"), delimiter=",", skiprows=1)
+    np.testing.assert_allclose(hyg_b[0, 2:], np.array([6.0, 8.0]) / 3, atol=1e-4)
+
+def test_crop_window_matches_site_read():
+    field = np.arange(30.0).reshape(5, 6)
+    block_window = (1, 1, 4, 4)
+    block = np.flipud(field[1:5, 1:5])
+    window = (2, 2, 2, 3)
+    np.testing.assert_array_equal(
+        TritonModel.crop_window(block, block_window, window),
+        np.flipud(field[2:4, 2:5])
+    )
+
+class NamedGribFile:
+    """pygrib file of three messages with the runoff bands at 2 and 3."""
+
+    def __init__(self, path):
+        self.messages = [
+            SimpleNamespace(messagenumber=n, shortName=name, name=name, Di=1.0, Dj=1.0,
+                            values=np.full(LABELS.shape, 1.5), latlons=lambda: (np.zeros(LABELS.shape),) * 2)
+            for n, name in [(1, "SoilMoist"), (2, "Qs_acc"), (3, "Qsb_acc")]
+        ]
+
+    def seek(self, offset):
+        pass
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def message(self, number):
+        return self.messages[number - 1]
+
+    def close(self):
+        pass
+
+@pytest.mark.parametrize("in_memory", [False, True])
+def test_generate_hydrographs_with_named_bands(config_object, tmp_path, monkeypatch, in_memory):
+    config_object["global"]["work_dir"] = str(tmp_path)
+    config_object["sites"]["site_A"]["threshold_trigger"] = 1.5
+    config_object["model"] = {"runoff_bands": ["Qs_acc", "Qsb_acc"]}
+    config_object["process"] = {"grib_index": False, "write_tiff": not in_memory}
+    model = TritonModel(config_object)
+    processor = DataProcessor(config_object)
+
+    monkeypatch.setattr("src.process.pygrib", MagicMock(open=NamedGribFile))
+    monkeypatch.setattr("src.process.write_geotiff", lambda path, *args: open(path, "w").close())
+    monkeypatch.setattr(processor, "_write_geotiff", lambda path, *args: open(path, "w").close())
+    monkeypatch.setattr("src.model.load_site_mask",
+                        MagicMock(return_value=SiteMask("site_A", LABELS, SITE_TABLE, 0, 0, LABELS.shape)))
+    monkeypatch.setattr("src.model.read_geotransform", MagicMock(return_value=((0, 1, 0, 0, 0, -1), LABELS.shape)))
+    monkeypatch.setattr("src.model.read_raster_window",
+                        lambda path, window, flip=False: np.full(window[2:], 1.5, dtype=np.float32))
+
+    day_dir = tmp_path / "01_LISinput" / "2023" / "Dec" / "01" / "LIS-DD"
+    day_dir.mkdir(parents=True)
+    start = datetime(2023, 12, 1)
+    for date in generate_dates(start, start + timedelta(hours=23), 3):
+        (day_dir / f"{LIS_FILE_PREFIX}{date:%Y%m%d_DT.%H00_DF}.GR1").write_text("")
+
+    if in_memory:
+        runoff = processor.decode_date("2023-12-01")
+        assert os.listdir(processor.postproc_dir) == []
+    else:
+        runoff = None
+        results = processor.convert_batch(processor.lis_files("2023-12-01"), max_workers=1)
+        assert all(r["success"] for r in results)
+        assert os.path.exists(runoff_file(processor.postproc_dir, start, "Qsb_acc"))
 
-def test_monitor_job(model):
-    status = model.monitor_job("12345")
-    assert status == "COMPLETED"
+    assert model.generate_hydrographs("2023-12-01", ["site_A"], runoff=runoff) == {"site_A": True}
+    hyg = np.loadtxt(os.path.join(model.output_dir, "site_A_20231201_20231201.hyg"), delimiter=",", skiprows=1)
+    assert hyg.shape == (8, 5)
+    np.testing.assert_allclose(hyg[:, 2:], np.tile([2.0, 2.0, 1.0], (8, 1)))
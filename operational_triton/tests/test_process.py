@@ -2,17 +2,25 @@ import pytest
 from unittest.mock import MagicMock, patch
 import numpy as np
 import sys
+import os
+from types import SimpleNamespace
+from datetime import datetime
 
 # Ensure mocks are in place before importing
 # (This is handled by conftest.py, but we need to access the mocks to configure them)
 
-from src.process import DataProcessor
+from src.process import DataProcessor, _PygribMessages
 
 @pytest.fixture
 def processor(config_object):
     return DataProcessor(config_object)
 
-def test_check_data_availability(processor):
+def test_check_data_availability(processor, tmp_path):
+    processor.input_dir = str(tmp_path)
+    assert processor.check_data_availability("2023-12-01") is False
+    day_dir = tmp_path / "2023" / "Dec" / "01" / "LIS-DD"
+    day_dir.mkdir(parents=True)
+    (day_dir / "PS.557WW_LIS_DD.20231201_DT.0000_DF.GR1").write_text("")
     assert processor.check_data_availability("2023-12-01") is True
 
 def test_convert_grib_to_tiff(processor):
@@ -56,3 +64,151 @@ def test_convert_grib_to_tiff_failure(processor):
     result = processor.convert_grib_to_tiff("missing.grib", "output")
     
     assert result is False
+
+@pytest.fixture
+def grib(monkeypatch):
+    mock_pygrib = MagicMock()
+    message = mock_pygrib.open.return_value.message.return_value
+    message.values = np.ma.masked_array(np.arange(6.0).reshape(2, 3), mask=[[0, 0, 1], [0, 0, 0]])
+    message.latlons.return_value = (np.array([[10.0] * 3, [11.0] * 3]), np.array([[1.0, 2.0, 3.0]] * 2))
+    message.Di = 1.0
+    message.Dj = 1.0
+    monkeypatch.setattr("src.process.pygrib", mock_pygrib)
+    # Sequential pygrib access; the offset index is covered in test_gribindex.py
+    monkeypatch.setattr("src.process.GribIndex", MagicMock(side_effect=AssertionError("index not expected")))
+    return mock_pygrib
+
+def test_decode_grib_in_memory(processor, grib, monkeypatch):
+    processor.use_index = False
+    processor.write_tiff = False
+    write = MagicMock()
+    monkeypatch.setattr(processor, "_write_geotiff", write)
+
+    bands = processor.decode_grib("lis.grb", band_indices=[24, 25])
+
+    assert set(bands) == {24, 25}
+    data, geotransform = bands[24]
+    assert data.dtype == np.float32
+    assert np.isnan(data[0, 2]) and data[1, 2] == 5.0
+    assert geotransform == [1.0, 1.0, 0, 11.0, 0, -1.0]
+    write.assert_not_called()
+
+    # GeoTIFFs as an optional side output
+    processor.write_tiff = True
+    processor.decode_grib("lis.grb", band_indices=[24])
+    assert write.call_args[0][0].endswith("lis_band_24.tif")
+
+def test_decode_grib_through_index(processor, grib, monkeypatch):
+    message = grib.open.return_value.message.return_value
+    index = MagicMock()
+    index.resolve.side_effect = lambda band: {"Qs_acc": 24, "Qsb_acc": 25}[band]
+    index.decode.return_value = message
+    monkeypatch.setattr("src.process.GribIndex", MagicMock(return_value=index))
+    write = MagicMock()
+    monkeypatch.setattr(processor, "_write_geotiff", write)
+
+    bands = processor.decode_grib("lis.grb", band_indices=["Qs_acc", "Qsb_acc"])
+
+    assert set(bands) == {"Qs_acc", "Qsb_acc"}
+    index.decode.assert_any_call(25)
+    grib.open.assert_not_called()
+    # Named after the configured band, as TritonModel looks them up
+    assert write.call_args[0][0].endswith("lis_band_Qsb_acc.tif")
+
+def test_pygrib_messages_resolve_names(grib):
+    grib.open.return_value.__iter__.return_value = [
+        SimpleNamespace(messagenumber=n, shortName=short_name, name=name)
+        for n, short_name, name in [(1, "Qs_acc", "Surface runoff"), (2, "Qsb_acc", "Subsurface runoff"),
+                                    (3, "Qsb_acc", "Subsurface runoff")]
+    ]
+    messages = _PygribMessages("lis.grb")
+
+    assert messages.resolve(24) == 24
+    assert messages.resolve("Qs_acc") == 1
+    assert messages.resolve("Surface runoff") == 1
+    with pytest.raises(KeyError):
+        messages.resolve("Qsb_acc")
+    with pytest.raises(KeyError):
+        messages.resolve("Tair_f_inst")
+
+def test_decode_date(processor, grib, tmp_path):
+    processor.input_dir = str(tmp_path)
+    processor.use_index = False
+    processor.write_tiff = False
+    day_dir = tmp_path / "2024" / "Dec" / "01" / "LIS-DD"
+    day_dir.mkdir(parents=True)
+    for hour in (0, 3):
+        (day_dir / f"PS.557WW_LIS_DD.20241201_DT.{hour:02d}00_DF.GR1").write_text("")
+    (day_dir / "README").write_text("")
+
+    runoff = processor.decode_date("2024-12-01")
+
+    assert sorted(runoff) == [datetime(2024, 12, 1, 0), datetime(2024, 12, 1, 3)]
+    assert set(runoff[datetime(2024, 12, 1, 3)]) == set(processor.band_indices)
+
+    # Only the timesteps that just arrived
+    assert list(processor.decode_date("2024-12-01", timesteps=[datetime(2024, 12, 1, 3)])) == [datetime(2024, 12, 1, 3)]
+    assert processor.check_data_availability("2024-12-01")
+    assert processor.check_data_availability("2024-12-01", [datetime(2024, 12, 1, 3)])
+    assert not processor.check_data_availability("2024-12-01", [datetime(2024, 12, 1, 6)])
+
+def test_convert_batch(processor, grib, monkeypatch):
+    written = []
+    monkeypatch.setattr("src.process.write_geotiff", lambda path, *args: written.append(path))
+    grib.open.side_effect = lambda path: (_ for _ in ()).throw(IOError("corrupt")) if "bad" in path else MagicMock(
+        message=grib.open.return_value.message
+    )
+
+    processor.use_index = False
+    results = processor.convert_batch(["a.grb", "bad.grb", "b.grb"], band_indices=[24, 25], max_workers=1)
+
+    assert [r["file"] for r in results] == ["a.grb", "bad.grb", "b.grb"]
+    assert [r["success"] for r in results] == [True, False, True]
+    assert results[1]["error"] == "corrupt"
+    assert len(results[0]["outputs"]) == 2 and results[0]["outputs"][0].endswith("a_band_24.tif")
+    assert len(written) == 4
+
+def test_convert_batch_process_pool(processor, grib, monkeypatch):
+    monkeypatch.setattr("src.process.write_geotiff", lambda *args: None)
+
+    processor.use_index = False
+    results = processor.convert_batch(["a.grb", "b.grb", "c.grb"], band_indices=[24], max_workers=2)
+
+    assert [r["success"] for r in results] == [True, True, True]
+    assert all(r["seconds"] >= 0 for r in results)
+
+def test_index_sidecars_are_not_lis_files(processor, tmp_path, monkeypatch):
+    # Default sidecar location is outside the LIS input tree
+    assert os.path.commonpath([processor.index_dir, processor.input_dir]) != processor.input_dir
+
+    def fromstring(data):
+        name = data[8:-4].decode()
+        return SimpleNamespace(shortName=name, name=name, typeOfLevel="surface", level=0,
+                               values=np.zeros((2, 3)), Di=1.0, Dj=1.0,
+                               latlons=lambda: (np.zeros((2, 3)), np.zeros((2, 3))))
+    monkeypatch.setattr("src.process.pygrib.fromstring", fromstring)
+    written = []
+    monkeypatch.setattr("src.process.write_geotiff", lambda path, *args: written.append(path))
+
+    # Worst case: sidecars written next to the GRIB files
+    processor.input_dir = str(tmp_path)
+    processor.index_dir = None
+    day_dir = tmp_path / "2024" / "Dec" / "01" / "LIS-DD"
+    day_dir.mkdir(parents=True)
+    grib_files = []
+    for hour in (0, 3):
+        path = day_dir / f"PS.557WW_LIS_DD.20241201_DT.{hour:02d}00_DF.GR1"
+        message = b"GRIB" + (8 + 10).to_bytes(3, "big") + bytes([1]) + b"Qs_acc" + b"7777"
+        path.write_bytes(message)
+        grib_files.append(str(path))
+    (day_dir / f".PS.557WW_LIS_DD.20241201_DT.0600_DF.GR1.Ab12Cd").write_text("")
+
+    for _ in range(2):
+        files = processor.lis_files("2024-12-01")
+        assert files == grib_files
+        results = processor.convert_batch(files, band_indices=["Qs_acc"], max_workers=1)
+        assert [r["success"] for r in results] == [True, True]
+
+    assert sorted(p.name for p in day_dir.iterdir() if p.name.endswith(".idx.json")) == \
+        [os.path.basename(f) + ".idx.json" for f in grib_files]
+    assert len(written) == 4
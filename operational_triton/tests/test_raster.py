@@ -0,0 +1,44 @@
+import pytest
+import numpy as np
+from unittest.mock import MagicMock
+from src import raster
+from src.raster import site_window, read_raster, read_raster_window
+
+FULL = np.arange(60, dtype=np.float32).reshape(6, 10)
+FULL[4, 3] = 9999
+
+@pytest.fixture
+def gdal(monkeypatch):
+    mock_gdal = MagicMock()
+    band = mock_gdal.Open.return_value.GetRasterBand.return_value
+    band.ReadAsArray.side_effect = (
+        lambda xoff=0, yoff=0, xsize=None, ysize=None:
+        FULL.copy() if xsize is None else FULL[yoff:yoff + ysize, xoff:xoff + xsize].copy()
+    )
+    monkeypatch.setattr(raster, "gdal", mock_gdal)
+    return band
+
+def test_site_window_same_grid():
+    gt = (100.0, 0.5, 0, 50.0, 0, -0.5)
+    assert site_window(gt, (1, 2, 3, 4), gt, (6, 10)) == (1, 2, 3, 4)
+    # Flipped rasters are read from the mirrored rows
+    assert site_window(gt, (1, 2, 3, 4), gt, (6, 10), flip=True) == (2, 2, 3, 4)
+
+def test_site_window_offset_grid():
+    label_gt = (100.0, 0.5, 0, 50.0, 0, -0.5)
+    runoff_gt = (99.0, 0.5, 0, 51.0, 0, -0.5)
+    assert site_window(label_gt, (0, 0, 2, 2), runoff_gt, (6, 10)) == (2, 2, 2, 2)
+    with pytest.raises(ValueError):
+        site_window(label_gt, (4, 0, 2, 2), runoff_gt, (6, 10))
+
+def test_windowed_read_matches_full_read(gdal):
+    gt = (0.0, 1.0, 0, 0.0, 0, -1.0)
+    label_window = (1, 2, 4, 3)
+    window = site_window(gt, label_window, gt, FULL.shape, flip=True)
+
+    windowed = read_raster_window("band_24.tif", window, flip=True)
+    full = read_raster("band_24.tif", flip=True)
+
+    np.testing.assert_array_equal(windowed, full[1:5, 2:5])
+    assert np.isnan(windowed).sum() == 1
+    gdal.ReadAsArray.assert_any_call(2, 1, 3, 4)
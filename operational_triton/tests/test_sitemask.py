@@ -0,0 +1,65 @@
+import pytest
+import os
+import numpy as np
+from unittest.mock import MagicMock
+from src.sitemask import SiteMask, build_site_mask, load_site_mask
+
+LABELS = np.array([
+    [0, 0, 0, 0, 0],
+    [0, 5, 7, 0, 0],
+    [0, 0, 2147483000, 7, 0],
+    [0, 0, 0, 0, 9],
+])
+TABLE = np.array([[5, 1], [7, 1], [2147483000, 0]])
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    shp = tmp_path / "site.shp"
+    grid = tmp_path / "LIS_UniqueId.tif"
+    for path in (shp, tmp_path / "site.dbf", grid):
+        path.write_text("x")
+    read_labels = MagicMock(return_value=LABELS)
+    monkeypatch.setattr("src.sitemask.read_labels", read_labels)
+    monkeypatch.setattr("src.sitemask.read_site_table", MagicMock(return_value=TABLE))
+    monkeypatch.setattr("src.sitemask.read_geotransform", MagicMock(return_value=((120.0, 0.09, 0, 40.0, 0, -0.09), LABELS.shape)))
+    return {"shapefile": str(shp), "lis_grid": str(grid), "read_labels": read_labels}
+
+def test_build_site_mask_crops_to_ids(sources):
+    mask = build_site_mask("osan", sources["shapefile"], sources["lis_grid"])
+
+    assert mask.window == (1, 1, 2, 3)
+    assert mask.labels.dtype == np.int32
+    np.testing.assert_array_equal(mask.labels, [[5, 7, 0], [0, 2147483000, 7]])
+    # IDs beyond float32 precision survive intact
+    assert mask.labels[1, 1] == 2147483000
+
+    field = np.arange(20.0).reshape(4, 5)
+    np.testing.assert_array_equal(mask.crop(field), field[1:3, 1:4])
+    with pytest.raises(ValueError):
+        mask.crop(np.zeros((2, 2)))
+
+def test_load_site_mask_cache_and_invalidation(sources, tmp_path):
+    cache_dir = str(tmp_path / "masks")
+    site_config = {"shapefile": sources["shapefile"], "lis_grid": sources["lis_grid"]}
+
+    first = load_site_mask("osan", site_config, cache_dir)
+    second = load_site_mask("osan", site_config, cache_dir)
+
+    assert sources["read_labels"].call_count == 1
+    assert isinstance(second.labels, np.memmap)
+    np.testing.assert_array_equal(second.labels, first.labels)
+    assert second.window == first.window
+    np.testing.assert_array_equal(second.table, TABLE)
+    assert second.geotransform == (120.0, 0.09, 0, 40.0, 0, -0.09)
+
+    # Touching a shapefile sidecar invalidates the artifact
+    dbf = tmp_path / "site.dbf"
+    st = os.stat(dbf)
+    os.utime(dbf, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    load_site_mask("osan", site_config, cache_dir)
+    assert sources["read_labels"].call_count == 2
+
+def test_build_site_mask_without_ids(sources, monkeypatch):
+    monkeypatch.setattr("src.sitemask.read_site_table", MagicMock(return_value=np.array([[42, 1]])))
+    with pytest.raises(ValueError):
+        build_site_mask("osan", sources["shapefile"], sources["lis_grid"])
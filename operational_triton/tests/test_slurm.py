@@ -0,0 +1,129 @@
+import pytest
+import asyncio
+import json
+from src.slurm import SlurmJobManager, SlurmJob, parse_job_id, parse_states
+
+def test_parse_sbatch_and_queue_output():
+    assert parse_job_id("12345\n") == "12345"
+    assert parse_job_id("12345;cyclone\n") == "12345"
+    assert parse_job_id("Submitted batch job 678\n") == "678"
+    with pytest.raises(RuntimeError):
+        parse_job_id("sbatch: error: invalid partition")
+    assert parse_states("1 RUNNING\n2 PENDING\n") == {"1": "RUNNING", "2": "PENDING"}
+    assert parse_states("3|CANCELLED by 42\n3.batch|CANCELLED\n") == {"3": "CANCELLED"}
+
+def scripts(tmp_path, names):
+    paths = []
+    for name in names:
+        path = tmp_path / name
+        path.write_text("#!/bin/bash\n")
+        paths.append(str(path))
+    return paths
+
+def calls(fake_slurm):
+    with open(fake_slurm["squeue"][-1] + "/jobs.json") as f:
+        return json.load(f)["calls"]
+
+def test_jobs_tracked_with_batched_queries(tmp_path, fake_slurm):
+    finished = []
+
+    async def on_complete(job_id, state):
+        finished.append((job_id, state))
+
+    async def run():
+        # Interval long enough for all submissions to land before the first query
+        manager = SlurmJobManager(commands=fake_slurm, poll_interval=0.2)
+        job_scripts = scripts(tmp_path, ["osan.sbatch", "kunsan_fail.sbatch", "pyeongtaek.sbatch"])
+        submitted = await manager.submit_many(job_scripts + [str(tmp_path / "missing.sbatch")],
+                                              callbacks=[on_complete])
+        assert isinstance(submitted[str(tmp_path / "missing.sbatch")], RuntimeError)
+        return submitted, await manager.wait()
+
+    submitted, states = asyncio.run(run())
+
+    assert sorted(states.values()) == ["COMPLETED", "COMPLETED", "FAILED"]
+    assert states[submitted[str(tmp_path / "kunsan_fail.sbatch")]] == "FAILED"
+    assert sorted(finished) == sorted(states.items())
+    # Three jobs, one status query per interval: PENDING, RUNNING, finished
+    assert calls(fake_slurm)["squeue"] == 3
+
+def test_background_use_from_sync_code(tmp_path, fake_slurm):
+    manager = SlurmJobManager(commands=fake_slurm, poll_interval=0.01)
+    finished = []
+    try:
+        submitted = manager.run(manager.submit_many(scripts(tmp_path, ["a.sbatch", "b.sbatch"]),
+                                                    callbacks=[lambda j, s: finished.append(s)])).result()
+        states = manager.run(manager.wait(submitted.values())).result(timeout=10)
+    finally:
+        manager.close()
+    assert set(states.values()) == {"COMPLETED"}
+    assert finished == ["COMPLETED", "COMPLETED"]
+
+def test_outstanding_from_another_thread_while_jobs_are_added():
+    manager = SlurmJobManager()
+
+    async def add_jobs(n):
+        # As submit() does, on the manager's loop thread
+        for i in range(n):
+            manager.jobs[str(i)] = SlurmJob(str(i), "job.sbatch", ())
+            if i % 50 == 0:
+                await asyncio.sleep(0)
+
+    try:
+        adding = manager.run(add_jobs(20000))
+        while not adding.done():
+            manager.outstanding()
+        adding.result()
+    finally:
+        manager.close()
+    assert len(manager.outstanding()) == 20000
+
+def test_query_falls_back_to_sacct(tmp_path, fake_slurm):
+    commands = dict(fake_slurm, squeue=["false"])
+
+    async def run():
+        manager = SlurmJobManager(commands=commands, poll_interval=60)
+        job_id = await manager.submit(scripts(tmp_path, ["a.sbatch"])[0])
+        states = await manager.query([job_id, "999"])
+        manager._monitor.cancel()
+        return job_id, states
+
+    job_id, states = asyncio.run(run())
+    assert states == {job_id: "PENDING", "999": "UNKNOWN"}
+
+def test_scheduler_outage_keeps_jobs_outstanding(tmp_path, fake_slurm):
+    outage = tmp_path / "slurm" / "outage"
+    finished = []
+
+    async def run():
+        manager = SlurmJobManager(commands=fake_slurm, poll_interval=0.05, max_unknown_polls=2)
+        outage.write_text("")
+        job_id = await manager.submit(scripts(tmp_path, ["a.sbatch"])[0], callbacks=[lambda j, s: finished.append(s)])
+        with pytest.raises(RuntimeError):
+            await manager.query([job_id])
+        # Several failed polls: the job is neither finished nor reported
+        await asyncio.sleep(0.5)
+        assert manager.outstanding() == [job_id]
+        assert finished == []
+        outage.unlink()
+        return await asyncio.wait_for(manager.wait(), timeout=10)
+
+    assert list(asyncio.run(run()).values()) == ["COMPLETED"]
+    assert finished == ["COMPLETED"]
+
+def test_unreported_job_finished_after_bounded_polls(tmp_path, fake_slurm):
+    async def run():
+        manager = SlurmJobManager(commands=fake_slurm, poll_interval=0.01, max_unknown_polls=3)
+        job_id = await manager.submit(scripts(tmp_path, ["a.sbatch"])[0])
+        # Forget the job in the fake scheduler: squeue and sacct both stop reporting it
+        with open(fake_slurm["squeue"][-1] + "/jobs.json") as f:
+            state = json.load(f)
+        state["jobs"].clear()
+        with open(fake_slurm["squeue"][-1] + "/jobs.json", "w") as f:
+            json.dump(state, f)
+        states = await asyncio.wait_for(manager.wait(), timeout=10)
+        return states, calls(fake_slurm)
+
+    states, counts = asyncio.run(run())
+    assert list(states.values()) == ["UNKNOWN"]
+    assert counts["sacct"] == 3
@@ -0,0 +1,83 @@
+import pytest
+import os
+import sys
+import time
+from datetime import datetime
+from src.watcher import ArrivalWatcher, scan_tree, is_partial
+
+NAME = "PS.557WW_SC.U_DI.C_GP.LIS-NOAH_GR.C0P09DEG_AR.GLOBAL_PA.LIS_DD.20231201_DT.{:02d}00_DF.GR1"
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def feed(tmp_path):
+    day = tmp_path / "2023" / "Dec" / "01" / "LIS-DD"
+    day.mkdir(parents=True)
+    return day
+
+def write(path, data=b"GRIB"):
+    with open(path, "ab") as f:
+        f.write(data)
+
+def test_scan_tree_skips_partial_files(feed):
+    write(feed / NAME.format(0))
+    write(feed / ("." + NAME.format(3) + ".Xa12bc"))
+    write(feed / "README")
+    files = scan_tree([str(feed.parents[2])])
+    assert list(files) == [str(feed / NAME.format(0))]
+    assert is_partial(NAME.format(0) + ".tmp")
+
+def test_poll_reports_timestep_after_settling(feed):
+    write(feed / NAME.format(0))
+    clock = Clock()
+    watcher = ArrivalWatcher([str(feed.parents[2])], settle_seconds=10, backend="poll", clock=clock)
+    # Files present at start-up are not reported
+    assert watcher.poll(timeout=0) == {}
+
+    path = feed / NAME.format(3)
+    write(path)
+    assert watcher.poll(timeout=0) == {}
+
+    # Still being written: the quiet period restarts
+    clock.now += 8
+    write(path, b"more")
+    assert watcher.poll(timeout=0) == {}
+    clock.now += 8
+    assert watcher.poll(timeout=0) == {}
+
+    clock.now += 3
+    assert watcher.poll(timeout=0) == {"2023-12-01": [datetime(2023, 12, 1, 3)]}
+    # Reported once
+    clock.now += 20
+    assert watcher.poll(timeout=0) == {}
+    watcher.close()
+
+def test_timestep_waits_for_all_files(feed):
+    clock = Clock()
+    watcher = ArrivalWatcher([str(feed.parents[2])], settle_seconds=0, files_per_timestep=2,
+                             backend="poll", clock=clock)
+    write(feed / NAME.format(6))
+    assert watcher.poll(timeout=0) == {}
+    write(feed / NAME.format(6).replace(".GR1", ".GR2"))
+    assert watcher.poll(timeout=0) == {"2023-12-01": [datetime(2023, 12, 1, 6)]}
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only")
+def test_inotify_sees_new_directories(tmp_path):
+    watcher = ArrivalWatcher([str(tmp_path)], settle_seconds=0, backend="inotify")
+    assert watcher.backend == "inotify"
+
+    day = tmp_path / "2023" / "Dec" / "01" / "LIS-DD"
+    day.mkdir(parents=True)
+    write(day / NAME.format(9))
+
+    arrivals = {}
+    deadline = time.monotonic() + 5
+    while not arrivals and time.monotonic() < deadline:
+        arrivals = watcher.poll(timeout=0.2)
+    assert arrivals == {"2023-12-01": [datetime(2023, 12, 1, 9)]}
+    watcher.close()
@@ -1,6 +1,10 @@
+import time
 import pytest
 from unittest.mock import MagicMock, patch
+from datetime import datetime
 from src.workflow import WorkflowEngine
+from src.watcher import ArrivalWatcher
+from src.metrics import MetricsRegistry, ARRIVAL_TO_DECISION, QUEUE_DEPTH
 
 @pytest.fixture
 def mock_components():
@@ -33,13 +37,13 @@ def test_run_pipeline_success(config_object, mock_components):
     
     # Setup mocks
     mock_components["ingestor"].sync_data.return_value = True
-    mock_components["model"].generate_hydrograph.return_value = True
+    mock_components["model"].generate_hydrographs.return_value = {"site_A": True}
     
     engine.run_pipeline("2023-12-01")
     
     mock_components["ingestor"].sync_data.assert_called_with("2023-12-01")
     # Verify model is called for enabled sites (site_A is enabled in mock_config_data)
-    mock_components["model"].generate_hydrograph.assert_called_with("2023-12-01", "site_A")
+    mock_components["model"].generate_hydrographs.assert_called_once_with("2023-12-01", ["site_A"])
 
 def test_run_pipeline_ingest_fail(config_object, mock_components):
     engine = WorkflowEngine(config_object)
@@ -50,4 +54,175 @@ def test_run_pipeline_ingest_fail(config_object, mock_components):
     
     mock_components["ingestor"].sync_data.assert_called_with("2023-12-01")
     # Model should not be called if ingest fails
-    mock_components["model"].generate_hydrograph.assert_not_called()
+    mock_components["model"].generate_hydrographs.assert_not_called()
+
+def test_run_pipeline_in_memory(config_object, mock_components):
+    config_object["process"] = {"in_memory": True}
+    engine = WorkflowEngine(config_object)
+    mock_components["ingestor"].sync_data.return_value = True
+    decoded = {"2023-12-01 00": {}}
+    mock_components["processor"].decode_date.return_value = decoded
+
+    engine.run_pipeline("2023-12-01")
+
+    mock_components["processor"].decode_date.assert_called_with("2023-12-01")
+    mock_components["model"].generate_hydrographs.assert_called_with("2023-12-01", ["site_A"], runoff=decoded)
+
+def test_run_pipeline_new_timesteps(config_object, mock_components):
+    engine = WorkflowEngine(config_object)
+    mock_components["ingestor"].sync_data.return_value = True
+    mock_components["processor"].lis_files.return_value = ["a.grb"]
+    timesteps = [datetime(2023, 12, 1, 3)]
+
+    engine.run_pipeline("2023-12-01", timesteps)
+
+    mock_components["processor"].lis_files.assert_called_with("2023-12-01", timesteps)
+    mock_components["processor"].convert_batch.assert_called_with(["a.grb"])
+    mock_components["model"].generate_hydrographs.assert_called_once_with("2023-12-01", ["site_A"])
+
+def test_start_daemon_runs_arrivals(config_object, mock_components, tmp_path):
+    config_object["workflow"]["state_db"] = str(tmp_path / "state.sqlite")
+    engine = WorkflowEngine(config_object)
+    watcher = MagicMock()
+    arrivals = {"2023-12-01": [datetime(2023, 12, 1, 3)]}
+    # Stop the loop after the second poll
+    watcher.poll.side_effect = [arrivals, KeyboardInterrupt]
+
+    with patch.object(engine, "run_graph", side_effect=RuntimeError("boom")) as run:
+        with pytest.raises(KeyboardInterrupt):
+            engine.start_daemon(watcher)
+
+    run.assert_called_once_with(arrivals)
+    watcher.close.assert_called_once()
+
+def test_arrival_to_decision_latency(graph_engine, monkeypatch):
+    metrics = MetricsRegistry()
+    monkeypatch.setattr("src.workflow.get_registry", lambda: metrics)
+    arrived = datetime(2023, 12, 1, 3)
+    graph_engine.arrived_at[arrived] = time.time() - 42
+
+    assert graph_engine.run_graph({"2023-12-01": [arrived]}) is True
+
+    latency = metrics.get(ARRIVAL_TO_DECISION)
+    assert latency["count"] == 1 and latency["sum"] >= 42
+    assert graph_engine.arrived_at == {}
+    assert metrics.get(QUEUE_DEPTH, queue="tasks") == 0
+
+@pytest.fixture
+def graph_engine(config_object, mock_components, tmp_path):
+    config_object["workflow"]["state_db"] = str(tmp_path / "state.sqlite")
+    engine = WorkflowEngine(config_object)
+    mock_components["ingestor"].feed_timesteps.return_value = [datetime(2023, 12, 1, 0), datetime(2023, 12, 1, 3)]
+    mock_components["ingestor"].sync_data.return_value = True
+    mock_components["processor"].lis_files.side_effect = lambda date_str, timesteps: [f"{timesteps[0]:%H}.grb"]
+    mock_components["processor"].convert_batch.side_effect = lambda files: [{"file": f, "success": True} for f in files]
+    mock_components["model"].generate_hydrographs.return_value = {"site_A": False}
+    yield engine
+    engine.state.close()
+
+def test_run_graph_runs_each_timestep(graph_engine, mock_components):
+    assert graph_engine.run_graph({"2023-12-01": None}) is True
+
+    assert mock_components["ingestor"].sync_data.call_count == 2
+    mock_components["ingestor"].sync_data.assert_any_call("2023-12-01", [datetime(2023, 12, 1, 3)])
+    assert mock_components["processor"].convert_batch.call_count == 2
+    mock_components["model"].generate_hydrographs.assert_called_once_with("2023-12-01", ["site_A"])
+
+def test_run_graph_rerun_repeats_only_failures(graph_engine, mock_components):
+    # Ingest of 03:00 fails: its processing and the date's hydrographs wait for the rerun
+    mock_components["ingestor"].sync_data.side_effect = lambda date_str, timesteps: timesteps[0].hour != 3
+    assert graph_engine.run_graph({"2023-12-01": None}) is False
+    mock_components["model"].generate_hydrographs.assert_not_called()
+    assert mock_components["processor"].convert_batch.call_count == 1
+
+    mock_components["ingestor"].sync_data.side_effect = None
+    mock_components["ingestor"].sync_data.reset_mock()
+    assert graph_engine.run_graph({"2023-12-01": None}) is True
+    mock_components["ingestor"].sync_data.assert_called_once_with("2023-12-01", [datetime(2023, 12, 1, 3)])
+    assert mock_components["processor"].convert_batch.call_count == 2
+    mock_components["model"].generate_hydrographs.assert_called_once()
+
+    # Nothing left to do
+    assert graph_engine.run_graph({"2023-12-01": None}) is True
+    mock_components["model"].generate_hydrographs.assert_called_once()
+
+def test_run_graph_in_memory_shares_decoded_bands(graph_engine, mock_components):
+    graph_engine.in_memory = True
+    mock_components["processor"].decode_date.side_effect = lambda date_str, timesteps: {t: {24: None} for t in timesteps}
+
+    assert graph_engine.run_graph({"2023-12-01": None}) is True
+
+    args, kwargs = mock_components["model"].generate_hydrographs.call_args
+    assert sorted(kwargs["runoff"]) == [datetime(2023, 12, 1, 0), datetime(2023, 12, 1, 3)]
+    # Each timestep decoded once, by its process task
+    assert mock_components["processor"].decode_date.call_count == 2
+
+@pytest.mark.parametrize("restart", [False, True])
+def test_in_memory_arrivals_keep_earlier_timesteps(graph_engine, mock_components, restart):
+    graph_engine.in_memory = True
+    decoded = []
+    def decode_date(date_str, timesteps):
+        decoded.extend(timesteps)
+        return {t: {24: None} for t in timesteps}
+    mock_components["processor"].decode_date.side_effect = decode_date
+    first, second = datetime(2023, 12, 1, 0), datetime(2023, 12, 1, 3)
+    mock_components["ingestor"].feed_timesteps.return_value = [first]
+
+    assert graph_engine.run_graph({"2023-12-01": [first]}) is True
+    if restart:
+        # Decoded bands are lost; the earlier timestep is decoded again from 01_LISinput
+        graph_engine._runoff.clear()
+    mock_components["ingestor"].feed_timesteps.return_value = [first, second]
+    assert graph_engine.run_graph({"2023-12-01": [second]}) is True
+
+    args, kwargs = mock_components["model"].generate_hydrographs.call_args
+    # The second hydrograph of the date still covers the first arrival
+    assert sorted(kwargs["runoff"]) == [first, second]
+    assert decoded == ([first, second, first] if restart else [first, second])
+
+def test_triggered_sites_submit_jobs(config_object, mock_components):
+    config_object["sites"]["site_A"]["job_script"] = "/work/osan/job_afw.sbatch"
+    config_object["sites"]["site_B"]["job_script"] = "/work/site_B/job_afw.sbatch"
+    engine = WorkflowEngine(config_object)
+
+    engine.submit_triggered({"site_A": True, "site_B": False})
+
+    mock_components["model"].submit_jobs.assert_called_once_with(
+        ["/work/osan/job_afw.sbatch"], on_complete=engine.job_finished
+    )
+
+NAME = "PS.557WW_SC.U_DI.C_GP.LIS-NOAH_GR.C0P09DEG_AR.GLOBAL_PA.LIS_DD.20231201_DT.{:02d}00_DF.GR1"
+
+def test_daemon_retries_failed_and_missed_timesteps(graph_engine, mock_components, tmp_path):
+    # Both timesteps were delivered while the daemon was down
+    day = tmp_path / "feed" / "2023" / "Dec" / "01" / "LIS-DD"
+    day.mkdir(parents=True)
+    for hour in (0, 3):
+        (day / NAME.format(hour)).write_bytes(b"GRIB")
+    watcher = ArrivalWatcher([str(tmp_path / "feed")], settle_seconds=0, backend="poll")
+    graph_engine.check_interval = 0
+
+    # Ingest of 03:00 fails on the first pass only
+    attempts = []
+    def sync_data(date_str, timesteps):
+        attempts.append(timesteps[0])
+        return not (timesteps[0].hour == 3 and attempts.count(timesteps[0]) == 1)
+    mock_components["ingestor"].sync_data.side_effect = sync_data
+
+    polls = []
+    def poll():
+        polls.append(1)
+        if len(polls) > 3:
+            raise KeyboardInterrupt
+        return {}
+
+    with patch.object(watcher, "poll", side_effect=poll):
+        with pytest.raises(KeyboardInterrupt):
+            graph_engine.start_daemon(watcher)
+
+    at = lambda hour: datetime(2023, 12, 1, hour)
+    assert attempts == [at(0), at(3), at(3)]
+    assert graph_engine.timestep_done(at(0)) and graph_engine.timestep_done(at(3))
+    # Hydrographs regenerated once the failed timestep went through, then nothing left to do
+    assert mock_components["model"].generate_hydrographs.call_count == 1
+    assert graph_engine.unfinished_timesteps(watcher) == {}